@@ -0,0 +1,24 @@
+"""
+The program entry point. Forwards the command to the daemon, if it is running,
+or executes it in-process otherwise. Only imports the CLI (and, with it, the
+file system implementations) when the command is executed in-process, to keep
+the start-up fast when the daemon is running.
+"""
+
+import sys
+
+from .daemon import forward
+
+
+def main():
+    exit_code = forward(sys.argv[1:])
+    if exit_code is not None:
+        sys.exit(exit_code)
+
+    from .cli.main import cli
+
+    cli()
+
+
+if __name__ == "__main__":
+    main()
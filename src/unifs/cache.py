@@ -0,0 +1,140 @@
+"""
+Persistent metadata cache, shared between the program invocations. Caches the
+directory listings and the file details, so that repeatedly browsing the same
+directories doesn't issue the same requests again and again. Entries expire
+after a configured time (TTL), and the least recently used entries are evicted
+once the cache is full. Entries are invalidated when the file system is
+modified (see FileSystemProxy).
+
+The cache is stored in an SQLite database next to the configuration file, and
+is disabled by default.
+"""
+
+import os
+import pickle
+import posixpath
+import sqlite3
+import threading
+import time
+from typing import Any, List, Optional
+
+from . import config
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    fs TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    path TEXT NOT NULL,
+    value BLOB NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL,
+    PRIMARY KEY (fs, kind, path)
+)
+"""
+
+
+class MetadataCache:
+    """Cache of the metadata of any number of file systems. Values are keyed
+    by a file system name, a kind of the value (e.g., a method name), and a
+    path. Safe to use from multiple threads."""
+
+    def __init__(self, path: str, ttl: int, max_entries: int):
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        with self._db:
+            self._db.execute(_SCHEMA)
+
+    def get(self, fs_name: str, kind: str, path: str) -> Optional[Any]:
+        """Get a cached value, or None if there is no (unexpired) value"""
+        now = time.time()
+        key = (fs_name, kind, path)
+        with self._lock, self._db:
+            row = self._db.execute(
+                "SELECT value, created FROM entries WHERE fs=? AND kind=? AND path=?",
+                key,
+            ).fetchone()
+            if row is None:
+                return None
+            value, created = row
+            if now - created > self._ttl:
+                self._db.execute(
+                    "DELETE FROM entries WHERE fs=? AND kind=? AND path=?", key
+                )
+                return None
+            self._db.execute(
+                "UPDATE entries SET accessed=? WHERE fs=? AND kind=? AND path=?",
+                (now,) + key,
+            )
+        return pickle.loads(value)
+
+    def put(self, fs_name: str, kind: str, path: str, value: Any):
+        """Cache a value, evicting the least recently used values if the cache
+        is full"""
+        try:
+            data = pickle.dumps(value)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            # some implementations may return values that can't be cached
+            return
+
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                (fs_name, kind, path, data, now, now),
+            )
+            (count,) = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()
+            if count > self._max_entries:
+                self._db.execute(
+                    "DELETE FROM entries WHERE rowid IN "
+                    "(SELECT rowid FROM entries ORDER BY accessed LIMIT ?)",
+                    (count - self._max_entries,),
+                )
+
+    def invalidate(self, fs_name: str, path: str):
+        """Invalidate the cached values for a path, its subtree, and its parent
+        directories (as their listings may change too)"""
+        path = path.rstrip("/")
+        affected = _ancestors(path) + [path]
+        placeholders = ",".join("?" * len(affected))
+        with self._lock, self._db:
+            self._db.execute(
+                f"DELETE FROM entries WHERE fs=? AND (path IN ({placeholders}) "
+                "OR substr(path, 1, ?) = ?)",
+                [fs_name] + affected + [len(path) + 1, path + "/"],
+            )
+
+    def clear(self):
+        """Remove all cached values"""
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM entries")
+
+
+def _ancestors(path: str) -> List[str]:
+    """All parent directories of a path, e.g. ['/', '/foo'] for '/foo/bar'"""
+    result = []
+    while True:
+        parent = posixpath.dirname(path)
+        if parent == path:
+            break
+        result.append(parent)
+        path = parent
+    if result and result[-1] == "":
+        # relative paths (e.g., "bucket/key"): root listing has an empty path
+        result[-1:] = ["", "/"]
+    return result
+
+
+def cache_file_path() -> str:
+    """Location of the cache database: next to the configuration file"""
+    return os.path.join(os.path.dirname(config.site_config_file_path()), "cache.db")
+
+
+def get_metadata_cache() -> Optional[MetadataCache]:
+    """Get the metadata cache according to the user configuration, or None if
+    the cache is disabled"""
+    cache_conf = config.get().cache
+    if not cache_conf.enabled:
+        return None
+    return MetadataCache(cache_file_path(), cache_conf.ttl, cache_conf.max_entries)
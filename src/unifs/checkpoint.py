@@ -0,0 +1,183 @@
+"""
+Checkpoints allow to resume interrupted transfers. A checkpoint is a manifest
+file stored next to the configuration file, which records the progress of a
+transfer: which files are completely transferred, and which byte ranges of the
+partially transferred files are. Every file is recorded with a fingerprint of
+its source (size, mtime, etag), so that the progress is discarded if the
+source file changes between the attempts.
+
+The manifest is a journal: one JSON object per line, appended as the transfer
+progresses. This keeps the updates cheap and safe, even if the program is
+interrupted at any moment.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import config
+from .file_system import get_mtime
+from .util import get_first_match
+
+Fingerprint = Dict[str, Any]
+
+
+def checkpoint_path(source: str, destination: str) -> str:
+    """Path of the checkpoint manifest of a transfer from a source to a
+    destination. Manifests are stored next to the configuration file, so that
+    neither the source nor the destination directory is written to."""
+    transfer_id = hashlib.sha256(f"{source}\n{destination}".encode()).hexdigest()
+    config_dir = os.path.dirname(config.site_config_file_path())
+    return os.path.join(config_dir, "checkpoints", transfer_id[:32] + ".jsonl")
+
+
+def remote_fingerprint(file_info: Dict[str, Any]) -> Fingerprint:
+    """Fingerprint of a file in a file system, based on its details"""
+    mtime = get_mtime(file_info)
+    etag = get_first_match(file_info, "ETag", "etag", "md5Hash", "md5")
+    return {
+        "size": file_info.get("size"),
+        "mtime": mtime.isoformat() if mtime is not None else None,
+        "etag": str(etag) if etag is not None else None,
+    }
+
+
+def local_fingerprint(stat: os.stat_result) -> Fingerprint:
+    """Fingerprint of a file in the native local file system"""
+    return {
+        "size": stat.st_size,
+        "mtime": datetime.fromtimestamp(stat.st_mtime).isoformat(),
+        "etag": None,
+    }
+
+
+class Checkpoint:
+    """Progress of a transfer from a source to a destination, persisted to a
+    manifest file. If `path` is None, the progress is not persisted. If
+    `resume` is False, or if the existing manifest is for another transfer,
+    the transfer starts over.
+
+    Files are identified by a key (e.g., a path relative to the transfer
+    root). Safe to use from multiple threads. Use as a context manager: the
+    manifest is removed when the transfer is complete, and is kept if it is
+    interrupted by an error."""
+
+    def __init__(
+        self, path: Optional[str], source: str, destination: str, resume: bool
+    ):
+        self._path = path
+        self._header = {"source": source, "destination": destination}
+        self._lock = threading.Lock()
+        self._fingerprints: Dict[str, Fingerprint] = {}
+        self._ranges: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        self._done = set()
+        self._journal = None
+
+        if path is None:
+            return
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        resumed = resume and os.path.isfile(path) and self._replay(path)
+        # (re)write the manifest from scratch, also to compact it on resume
+        self._journal = open(path, "w")
+        self._append(self._header)
+        if resumed:
+            for key, fingerprint in self._fingerprints.items():
+                self._append({"key": key, "fingerprint": fingerprint})
+                for start, end in self._ranges.get(key, []):
+                    self._append({"key": key, "range": [start, end]})
+                if key in self._done:
+                    self._append({"key": key, "done": True})
+
+    @property
+    def persistent(self) -> bool:
+        """Whether the progress is recorded to a manifest"""
+        return self._path is not None
+
+    def __enter__(self) -> "Checkpoint":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._journal is not None:
+            self._journal.close()
+            if exc_type is None:
+                os.remove(self._path)
+
+    def begin(self, key: str, fingerprint: Fingerprint) -> bool:
+        """Start (or resume) the transfer of a file. Returns True if the file
+        is already transferred, False otherwise. Discards the progress of a
+        file that changed since the previous attempt."""
+        with self._lock:
+            if self._fingerprints.get(key) == fingerprint:
+                return key in self._done
+            self._reset(key, fingerprint)
+            return False
+
+    def reset(self, key: str, fingerprint: Fingerprint):
+        """Discard any progress of the file, and start over"""
+        with self._lock:
+            self._reset(key, fingerprint)
+
+    def resume_offset(self, key: str, start: int = 0) -> int:
+        """Offset from which to continue the transfer of a byte range of a
+        file that starts at `start`, given the ranges already transferred"""
+        offset = start
+        with self._lock:
+            for range_start, range_end in sorted(self._ranges[key]):
+                if range_start <= offset < range_end:
+                    offset = range_end
+        return offset
+
+    def add_range(self, key: str, start: int, end: int):
+        """Record that a byte range of a file is transferred"""
+        with self._lock:
+            self._ranges[key].append((start, end))
+            self._append({"key": key, "range": [start, end]})
+
+    def mark_done(self, key: str):
+        """Record that a file is completely transferred"""
+        with self._lock:
+            self._done.add(key)
+            self._append({"key": key, "done": True})
+
+    def _reset(self, key: str, fingerprint: Fingerprint):
+        self._fingerprints[key] = fingerprint
+        self._ranges.pop(key, None)
+        self._done.discard(key)
+        self._append({"key": key, "fingerprint": fingerprint})
+
+    def _append(self, record: Dict[str, Any]):
+        if self._journal is not None:
+            self._journal.write(json.dumps(record) + "\n")
+            self._journal.flush()
+
+    def _replay(self, path: str) -> bool:
+        """Restore the progress from an existing manifest. Returns False if
+        the manifest is for another transfer, or can't be read."""
+        try:
+            with open(path, "r") as f:
+                lines = f.read().split("\n")
+            # the last line is incomplete if the program was interrupted while
+            # writing it (and is empty otherwise)
+            records = [json.loads(line) for line in lines[:-1]]
+        except (OSError, ValueError):
+            return False
+
+        if not records or records[0] != self._header:
+            return False
+
+        for record in records[1:]:
+            key = record["key"]
+            if "fingerprint" in record:
+                self._fingerprints[key] = record["fingerprint"]
+                self._ranges.pop(key, None)
+                self._done.discard(key)
+            elif "range" in record:
+                self._ranges[key].append(tuple(record["range"]))
+            elif record.get("done"):
+                self._done.add(key)
+        return True
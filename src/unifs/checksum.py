@@ -0,0 +1,166 @@
+"""
+Checksums of the file content. Many file systems report a checksum of the
+files in their details (e.g., an MD5 of a file in GCS, or an ETag of a file
+uploaded to S3 in a single part), in which case the content doesn't need to
+be read. Otherwise, the content is streamed and hashed block by block, and
+many files are hashed in a pool of processes to use all CPU cores.
+
+An ETag of S3 is only an MD5 of the content if the object is not encrypted,
+or encrypted with SSE-S3. It is not trusted if the details of a file report
+another encryption (SSE-KMS, SSE-C). Some file systems don't report the
+encryption at all (e.g., s3fs), in which case the ETag of an object encrypted
+with SSE-KMS is mistaken for its MD5, and doesn't match the content.
+"""
+
+import base64
+import hashlib
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import fsspec
+
+from .exceptions import FatalError
+from .file_system import FileSystemProxy, iter_blocks
+from .util import parallel_map
+
+ALGORITHMS = ["md5", "sha256", "crc32c"]
+
+# Keys of the file details that contain a checksum reported by the file
+# system, per algorithm, and the encoding of the value
+SERVER_CHECKSUM_KEYS = {
+    "md5": [
+        ("md5Hash", "base64"),
+        ("ContentMD5", "base64"),
+        ("md5", "hex"),
+        ("ETag", "etag"),
+        ("etag", "etag"),
+    ],
+    "sha256": [("ChecksumSHA256", "base64"), ("sha256", "hex")],
+    "crc32c": [("crc32c", "base64"), ("ChecksumCRC32C", "base64")],
+}
+
+# Server-side encryptions of S3 (as reported in the details of a file) that
+# keep the ETag an MD5 of the content: none, or SSE-S3
+MD5_ETAG_ENCRYPTIONS = {None, "AES256"}
+
+
+class _Crc32cHasher:
+    """CRC32C with the same interface as the hashlib hashers. Requires the
+    optional google-crc32c package."""
+
+    def __init__(self):
+        try:
+            import google_crc32c
+        except ImportError:
+            raise FatalError(
+                "crc32c requires an additional package: pip install google-crc32c"
+            )
+        self._checksum = google_crc32c.Checksum()
+
+    def update(self, data: bytes):
+        self._checksum.update(data)
+
+    def hexdigest(self) -> str:
+        return self._checksum.digest().hex()
+
+
+def new_hasher(algorithm: str):
+    """Create a hasher for one of the ALGORITHMS"""
+    if algorithm == "crc32c":
+        return _Crc32cHasher()
+    return hashlib.new(algorithm)
+
+
+def is_available(algorithm: str) -> bool:
+    """Whether the checksums of an algorithm can be computed (e.g., crc32c
+    requires an optional package)"""
+    try:
+        new_hasher(algorithm)
+    except FatalError:
+        return False
+    return True
+
+
+def server_checksum(file_info: Dict[str, Any], algorithm: str) -> Optional[str]:
+    """Get the checksum of a file reported by the file system in its details,
+    as a hex string, or None if there is none for the algorithm"""
+    for key, encoding in SERVER_CHECKSUM_KEYS[algorithm]:
+        value = file_info.get(key)
+        if not value:
+            continue
+        if encoding == "base64":
+            try:
+                return base64.b64decode(value).hex()
+            except ValueError:
+                continue
+        value = str(value).strip('"').lower()
+        # ETags of the files uploaded in multiple parts are not MD5 checksums
+        # of the content (e.g., "<md5 of md5s>-<number of parts>")
+        if encoding == "etag" and not (
+            re.fullmatch("[0-9a-f]{32}", value) and _etag_is_md5(file_info)
+        ):
+            continue
+        return value
+    return None
+
+
+def _etag_is_md5(file_info: Dict[str, Any]) -> bool:
+    """Whether the ETag of a file is computed from the MD5 of the content (or
+    of its parts), which depends on the encryption of the file in S3"""
+    encryption = file_info.get("ServerSideEncryption")
+    return encryption in MD5_ETAG_ENCRYPTIONS and not file_info.get(
+        "SSECustomerAlgorithm"
+    )
+
+
+def multipart_etag(part_digests: List[bytes]) -> str:
+    """ETag that S3 reports for a file uploaded in parts with the given MD5
+    digests: the MD5 of the digests, and the number of parts"""
+    return f"{hashlib.md5(b''.join(part_digests)).hexdigest()}-{len(part_digests)}"
+
+
+def server_multipart_etag(file_info: Dict[str, Any]) -> Optional[str]:
+    """Get the ETag of a file uploaded in multiple parts reported by the file
+    system in its details (see `multipart_etag`), or None if there is none"""
+    if not _etag_is_md5(file_info):
+        return None
+    for key in ("ETag", "etag"):
+        value = str(file_info.get(key) or "").strip('"').lower()
+        if re.fullmatch("[0-9a-f]{32}-[0-9]+", value):
+            return value
+    return None
+
+
+def checksums(
+    fs: FileSystemProxy, files: List[Dict[str, Any]], algorithm: str, jobs: int
+) -> Iterator[Tuple[str, str]]:
+    """Yield the paths and the checksums of the files with the given
+    details, in order. Files that have no checksum reported by the file system
+    are hashed, in up to `jobs` processes concurrently."""
+    new_hasher(algorithm)  # fail early if the algorithm is not available
+    to_hash = [
+        (fs._fs, file_info["name"], file_info.get("size"), algorithm)
+        for file_info in files
+        if server_checksum(file_info, algorithm) is None
+    ]
+    if len(to_hash) > 1 and jobs > 1:
+        hashes = parallel_map(_hash_file, to_hash, jobs, ProcessPoolExecutor)
+    else:
+        hashes = map(_hash_file, to_hash)
+
+    for file_info in files:
+        checksum = server_checksum(file_info, algorithm)
+        if checksum is None:
+            checksum = next(hashes)
+        yield file_info["name"], checksum
+
+
+def _hash_file(item: Tuple[fsspec.AbstractFileSystem, str, Optional[int], str]) -> str:
+    """Hash the content of a file. Executed in a separate process, and thus
+    receives the raw file system implementation (which can be pickled)."""
+    fs_impl, path, size, algorithm = item
+    hasher = new_hasher(algorithm)
+    for block in iter_blocks(FileSystemProxy(fs_impl), path, end=size):
+        hasher.update(block)
+    return hasher.hexdigest()
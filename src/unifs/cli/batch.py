@@ -0,0 +1,191 @@
+import glob
+import importlib
+import json
+import posixpath
+import shlex
+import sys
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import click
+
+from .. import file_system
+from ..exceptions import FatalError, RecoverableError
+from ..logging import log_exception
+from ..transfer import TransferStats
+from ..tui import errorhandler
+from ..util import parallel_map
+from .main import cli
+
+# Commands that may be used in a batch. Commands that prompt the user (rm
+# without -f) or print to the output are not allowed.
+BATCH_COMMANDS = {"cp", "mv", "rm", "mkdir", "touch"}
+
+# Functions that execute the commands which print a summary (cp -r between
+# two file systems), instead of their callbacks: the functions return the
+# transfer statistics instead of printing them to the output, which only has
+# the results of the commands. Given as "MODULE:ATTRIBUTE", with the modules
+# relative to this package (see cli.main.COMMANDS).
+BATCH_FUNCTIONS = {"cp": "fs:copy"}
+
+
+@dataclass
+class BatchLine:
+    """A single command of a batch script, ready to be executed"""
+
+    number: int
+    text: str
+    command: click.Command
+    function: Callable[..., Any]  # executes the command (see BATCH_FUNCTIONS)
+    params: Dict[str, Any]
+    paths: List[str]
+    depends_on: List["BatchLine"] = field(default_factory=list)
+    done: threading.Event = field(default_factory=threading.Event)
+
+
+@click.command(
+    help="Execute the cp, mv, rm -f, mkdir and touch commands listed in a file "
+    "(or in the standard input, if FILE is '-'), one command per line. "
+    "Independent commands are executed concurrently. Prints the result of "
+    "every command as a JSON object per line."
+)
+@click.option(
+    "-j",
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=8,
+    show_default=True,
+    help="Execute at most this number of commands concurrently",
+)
+@click.argument("script", type=click.File("r"))
+@errorhandler
+def batch(jobs, script):
+    # parse the whole script first: nothing is executed if it has errors
+    lines = list(_parse_script(script))
+    file_system.get_current()  # connect once, before executing the commands
+
+    failed = 0
+    for result in parallel_map(_execute, _schedule(lines), jobs):
+        click.echo(json.dumps(result))
+        if result["status"] != "ok":
+            failed += 1
+
+    if failed:
+        click.echo(f"{failed} of {len(lines)} commands failed", err=True)
+        sys.exit(1)
+
+
+def _parse_script(script) -> Iterator[BatchLine]:
+    """Parse the lines of a batch script into the commands. Empty lines and
+    comments (starting with #) are skipped."""
+    for number, text in enumerate(script, start=1):
+        text = text.strip()
+        try:
+            args = shlex.split(text, comments=True)
+        except ValueError as err:
+            raise FatalError(f"Line {number}: {err}")
+        if not args:
+            continue
+        yield _parse_line(number, text, args)
+
+
+def _parse_line(number: int, text: str, args: List[str]) -> BatchLine:
+    name, args = args[0], args[1:]
+    if name not in BATCH_COMMANDS:
+        supported = ", ".join(sorted(BATCH_COMMANDS))
+        raise FatalError(
+            f"Line {number}: '{name}' can't be used in a batch (use {supported})"
+        )
+
+    command = cli.load_command(name)
+    try:
+        with command.make_context(name, args) as ctx:
+            params = ctx.params
+    except click.exceptions.Exit:
+        raise FatalError(f"Line {number}: options like --help can't be used")
+    except click.ClickException as err:
+        raise FatalError(f"Line {number}: {err.format_message()}")
+
+    if name == "rm" and not params["force"]:
+        raise FatalError(f"Line {number}: rm can only be used with -f in a batch")
+
+    paths = [
+        _normalize_path(value) for value in params.values() if isinstance(value, str)
+    ]
+    return BatchLine(number, text, command, _function(name, command), params, paths)
+
+
+def _function(name: str, command: click.Command) -> Callable[..., Any]:
+    """Function that executes a command in a batch: the undecorated callback
+    of the command, so that errors are reported in the result instead of
+    exiting the program, unless there is one in BATCH_FUNCTIONS"""
+    if name in BATCH_FUNCTIONS:
+        module_name, attribute = BATCH_FUNCTIONS[name].split(":")
+        module = importlib.import_module(f".{module_name}", __package__)
+        return getattr(module, attribute)
+    return command.callback.__wrapped__
+
+
+def _normalize_path(path: str) -> str:
+    """Normalize a path to find the commands that affect the same paths. Globs
+    are reduced to the directory in which the matches are searched for."""
+    if glob.escape(path) != path:
+        path = file_system.glob_root(path)
+    return posixpath.normpath(path) if path else ""
+
+
+def _paths_overlap(a: str, b: str) -> bool:
+    """Whether two paths are the same, or one is a parent of the other.
+    Relative paths (e.g., a glob root "") are assumed to overlap with any
+    path."""
+    if not a or not b:
+        return True
+    a, b = a.rstrip("/") + "/", b.rstrip("/") + "/"
+    return a.startswith(b) or b.startswith(a)
+
+
+def _schedule(lines: List[BatchLine]) -> Iterator[BatchLine]:
+    """Yield the lines to execute, each one depending on the preceding lines
+    still in progress that affect the same paths. Such lines are executed in
+    the order they appear in the script."""
+    in_progress: List[BatchLine] = []
+    for line in lines:
+        in_progress = [other for other in in_progress if not other.done.is_set()]
+        line.depends_on = [
+            other
+            for other in in_progress
+            if any(_paths_overlap(a, b) for a in line.paths for b in other.paths)
+        ]
+        in_progress.append(line)
+        yield line
+
+
+def _execute(line: BatchLine) -> Dict[str, Any]:
+    """Execute a line once the lines it depends on are complete. Returns the
+    result to print out."""
+    # The lines are executed in a thread pool in the order they are submitted,
+    # and thus the lines this one depends on are already being executed
+    for other in line.depends_on:
+        other.done.wait()
+
+    error: Optional[str] = None
+    try:
+        stats = line.function(**line.params)
+        if isinstance(stats, TransferStats):
+            stats.raise_if_failed()
+    except (FatalError, RecoverableError) as err:
+        error = str(err)
+    except Exception as ex:
+        log_exception("Unhandled exception in a batch command")
+        error = f"An unexpected error ocurred: {str(ex)}"
+    finally:
+        line.done.set()
+
+    result: Dict[str, Any] = {"line": line.number, "command": line.text}
+    if error is None:
+        result["status"] = "ok"
+    else:
+        result["status"] = "error"
+        result["error"] = error
+    return result
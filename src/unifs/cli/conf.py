@@ -2,10 +2,9 @@ import click
 
 from .. import config
 from ..tui import errorhandler, format_table
-from .main import cli
 
 
-@cli.group
+@click.group
 def conf():
     """Change the application configuration settings"""
     pass
@@ -0,0 +1,74 @@
+import subprocess
+import sys
+import time
+
+import click
+
+from .. import daemon as unifs_daemon
+from ..exceptions import FatalError, RecoverableError
+from ..tui import errorhandler
+
+# How long to wait for the daemon to start accepting commands, in seconds
+START_TIMEOUT = 10
+
+
+@click.group
+def daemon():
+    """Manage a background process that keeps the file systems connected
+    between the commands, to make them start faster"""
+    pass
+
+
+def _ensure_supported():
+    if not unifs_daemon.is_supported():
+        raise FatalError("The daemon is not supported on this platform")
+
+
+@daemon.command(help="Start the daemon in the background")
+@errorhandler
+def start():
+    _ensure_supported()
+    if unifs_daemon.is_running():
+        raise RecoverableError("The daemon is already running")
+
+    subprocess.Popen(
+        [sys.executable, "-m", "unifs.daemon"],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+    deadline = time.monotonic() + START_TIMEOUT
+    while not unifs_daemon.is_running():
+        if time.monotonic() > deadline:
+            raise FatalError("The daemon didn't start in time")
+        time.sleep(0.05)
+    click.echo("The daemon is running")
+
+
+@daemon.command(help="Run the daemon in the foreground")
+@errorhandler
+def run():
+    _ensure_supported()
+    if unifs_daemon.is_running():
+        raise RecoverableError("The daemon is already running")
+    unifs_daemon.serve()
+
+
+@daemon.command(help="Stop the daemon")
+@errorhandler
+def stop():
+    if not unifs_daemon.is_running():
+        raise RecoverableError("The daemon is not running")
+    unifs_daemon.stop()
+    click.echo("The daemon is stopped")
+
+
+@daemon.command(help="Show whether the daemon is running")
+@errorhandler
+def status():
+    if unifs_daemon.is_running():
+        click.echo(f"The daemon is running: {unifs_daemon.socket_path()}")
+    else:
+        click.echo("The daemon is not running")
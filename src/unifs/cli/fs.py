@@ -1,14 +1,24 @@
+import fnmatch
 import glob
+import itertools
 import os
-from typing import Any, Dict
+import posixpath
+import re
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
 import click
 
-from .. import file_system
+from .. import checksum, config, deletion, file_system
+from .. import sync as unifs_sync
+from .. import transfer
+from ..checkpoint import Checkpoint, checkpoint_path
 from ..exceptions import FatalError
 from ..tui import errorhandler
 from ..util import humanize_bytes, is_binary_string
-from .main import cli
+
+# Size of the blocks in which the file content is streamed to the output
+CAT_BLOCK_SIZE = 64 * 1024
 
 
 def format_long(file_info: Dict[str, Any]) -> str:
@@ -39,7 +49,7 @@ def format_short(file_info: Dict[str, Any]) -> str:
     return name
 
 
-@cli.command(help="List files in a directory, and optionally their details")
+@click.command(help="List files in a directory, and optionally their details")
 @click.option(
     "-l",
     "--long",
@@ -48,100 +58,296 @@ def format_short(file_info: Dict[str, Any]) -> str:
     default=False,
     help="Use long output format (provides more details)",
 )
+@click.option(
+    "--limit",
+    type=click.IntRange(min=1),
+    default=None,
+    help="List at most this number of files",
+)
 @click.argument("path", default=".")
 @errorhandler
-def ls(path, long):
-    _ls(path, long)
+def ls(path, long, limit):
+    _ls(path, long, limit)
 
 
-@cli.command(help="List files in a directory in a long format (same as ls -l)")
+@click.command(help="List files in a directory in a long format (same as ls -l)")
+@click.option(
+    "--limit",
+    type=click.IntRange(min=1),
+    default=None,
+    help="List at most this number of files",
+)
 @click.argument("path", default=".")
 @errorhandler
-def ll(path):
-    _ls(path, long=True)
+def ll(path, limit):
+    _ls(path, long=True, limit=limit)
 
 
-def _ls(path, long):
+def _ls(path, long, limit=None):
     """Undecorated version of the ls"""
     fs = file_system.get_current()
     is_glob = glob.escape(path) != path
     if is_glob:
-        return _glob(fs, path, long)
+        items = _glob(fs, path, long)
     else:
-        return _list(fs, path, long)
+        items = _list(fs, path, long)
+    # items are printed out as they are fetched, if the file system allows
+    for item in itertools.islice(items, limit):
+        click.echo(item)
 
 
-def _list(fs, path, long):
+def _list(fs, path, long) -> Iterator[str]:
     """List a single path: a single directory content, or a single file"""
     fmt_fn = format_long if long else format_short
-    # This implementation always issues two requests to list a directory or
-    # file. An alternative would be to try to list a directory, and fallback to
-    # listing a file in case of an exception. But which exception? Can we trust
-    # implementations to always use the same base exception class?
-    if fs.isdir(path):
-        for item in fs.ls(path, detail=True):
-            click.echo(fmt_fn(item))
-    else:
-        click.echo(fmt_fn(fs.info(path)))
+    return map(fmt_fn, fs.iter_ls_or_info(path))
 
 
-def _glob(fs, globstr, long):
+def _glob(fs, globstr, long) -> Iterator[str]:
     """List paths matching a glob"""
-    if long and not click.confirm(
-        "Long output for a glob search may be slow and issue many requests. Continue?"
-    ):
-        return
-
     if long:
-        for item in fs.glob(globstr):
-            node_info = fs.info(item)
-            click.echo(format_long(node_info))
+        return map(format_long, file_system.glob_details(fs, globstr))
+    matches = file_system.iter_glob(fs, globstr)
+    if matches is not None:
+        return (file_info["name"] for file_info in matches)
+    return iter(fs.glob(globstr))
+
+
+Filter = Callable[[Dict[str, Any]], bool]
+
+SIZE_UNITS = {"": 1, "k": 1024, "m": 1024**2, "g": 1024**3, "t": 1024**4}
+
+
+def _compare(sign: str, actual: Optional[float], expected: float) -> bool:
+    """Compare the values as find(1) does: '+' for greater than, '-' for less
+    than, and no sign for equal"""
+    if actual is None:
+        return False
+    elif sign == "+":
+        return actual > expected
+    elif sign == "-":
+        return actual < expected
     else:
-        for item in fs.glob(globstr):
-            click.echo(item)
+        return actual == expected
+
+
+def _name_filter(ctx, param, value) -> Optional[Filter]:
+    if value is None:
+        return None
+    return lambda info: fnmatch.fnmatchcase(
+        posixpath.basename(info.get("name", "").rstrip("/")), value
+    )
+
+
+def _size_filter(ctx, param, value) -> Optional[Filter]:
+    if value is None:
+        return None
+    match = re.fullmatch(r"([+-]?)(\d+)([kmgt]?)", value, re.IGNORECASE)
+    if match is None:
+        raise click.BadParameter("expected [+|-]N[K|M|G|T], e.g. +10M")
+    sign, number, unit = match.groups()
+    size = int(number) * SIZE_UNITS[unit.lower()]
+    return lambda info: _compare(sign, info.get("size"), size)
+
 
+def _mtime_filter(ctx, param, value) -> Optional[Filter]:
+    if value is None:
+        return None
+    match = re.fullmatch(r"([+-]?)(\d+)", value)
+    if match is None:
+        raise click.BadParameter("expected [+|-]N, e.g. -7")
+    sign, days = match.group(1), int(match.group(2))
 
-# @cli.command
-# @errorhandler
-# def find():
-#     click.echo("Not yet implemented")
+    def mtime_filter(info):
+        mtime = file_system.get_mtime(info)
+        if mtime is None:
+            return False
+        age = datetime.now(mtime.tzinfo) - mtime
+        return _compare(sign, age // timedelta(days=1), days)
+
+    return mtime_filter
+
+
+def _type_filter(ctx, param, value) -> Optional[Filter]:
+    if value is None:
+        return None
+    node_type = "directory" if value == "d" else "file"
+    return lambda info: info.get("type") == node_type
+
+
+@click.command(help="Find files and directories under a path that match all filters")
+@click.option(
+    "-name",
+    "name_filter",
+    callback=_name_filter,
+    help="Base name matches the glob pattern (e.g., '*.csv')",
+)
+@click.option(
+    "-size",
+    "size_filter",
+    callback=_size_filter,
+    help="Size is more than (+N), less than (-N), or exactly (N) N bytes. "
+    "N may have a K, M, G, or T suffix (e.g., +10M)",
+)
+@click.option(
+    "-mtime",
+    "mtime_filter",
+    callback=_mtime_filter,
+    help="Modified more than (+N), less than (-N), or exactly (N) N days ago",
+)
+@click.option(
+    "-type",
+    "type_filter",
+    type=click.Choice(["f", "d"]),
+    callback=_type_filter,
+    help="Is a file (f), or a directory (d)",
+)
+@click.option(
+    "-maxdepth",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Descend at most this number of levels below the path",
+)
+@click.option(
+    "-j",
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=file_system.DEFAULT_WALK_JOBS,
+    show_default=True,
+    help="List at most this number of directories concurrently",
+)
+@click.argument("path", default=".")
+@errorhandler
+def find(name_filter, size_filter, mtime_filter, type_filter, maxdepth, jobs, path):
+    fs = file_system.get_current()
+    filters = [f for f in (name_filter, type_filter, size_filter, mtime_filter) if f]
+    # matches are printed out as they are found
+    for item in file_system.iter_tree(fs, path, maxdepth, jobs):
+        if all(f(item) for f in filters):
+            click.echo(format_short(item))
 
 
-def _cat_validate(fs, path):
-    """Validate that the content of the given file can be printed out.
-    Interactive. Returns True if the file can be printed, False otherwise."""
+@click.command(help="Summarize the size and the number of files of a directory tree")
+@click.option(
+    "-s",
+    "--summarize",
+    is_flag=True,
+    show_default=False,
+    default=False,
+    help="Only show the total for the path (same as -d 0)",
+)
+@click.option(
+    "-d",
+    "--max-depth",
+    type=click.IntRange(min=0),
+    default=None,
+    help="Show the totals of the directories at most this number of levels "
+    "below the path",
+)
+@click.option(
+    "-j",
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=file_system.DEFAULT_WALK_JOBS,
+    show_default=True,
+    help="List at most this number of directories concurrently",
+)
+@click.argument("path", default=".")
+@errorhandler
+def du(summarize, max_depth, jobs, path):
+    if summarize and max_depth is not None:
+        raise FatalError("-s and -d can't be used together")
+    depth = 0 if summarize else max_depth
 
-    if not fs.isfile(path):
+    fs = file_system.get_current()
+    totals = _disk_usage(fs, path, depth, jobs)
+
+    root = path.rstrip("/") or "/"
+    # subdirectories are printed before their parent directory, as du(1) does
+    for parts in sorted(totals, key=lambda parts: parts + ("\U0010ffff",)):
+        size, files = totals[parts]
+        dir_path = posixpath.join(root, *parts)
+        click.echo(f"{humanize_bytes(size):>10} {files:>8} {dir_path}")
+
+
+def _disk_usage(fs, path, depth, jobs) -> Dict[Tuple[str, ...], List[int]]:
+    """Total size and number of files of a path and of its subdirectories up
+    to `depth` levels below (or all, if depth is None), keyed by the
+    subdirectory path components. Only the totals are kept in memory, so
+    that large trees can be summarized."""
+    root = fs._strip_protocol(path).rstrip("/")
+    root_length = len(root)
+    totals: Dict[Tuple[str, ...], List[int]] = {(): [0, 0]}
+    for item in file_system.iter_tree(fs, path, jobs=jobs):
+        name = item.get("name", "").rstrip("/")
+        parts = tuple(p for p in name[root_length:].split("/") if p)
+        if item.get("type") == "directory":
+            if depth is None or len(parts) <= depth:
+                totals.setdefault(parts, [0, 0])
+            continue
+
+        # count the file in the totals of its parent directories
+        dir_parts = parts[:-1] if name != root else ()
+        if depth is not None:
+            dir_parts = dir_parts[:depth]
+        for i in range(len(dir_parts) + 1):
+            total = totals.setdefault(dir_parts[:i], [0, 0])
+            total[0] += item.get("size") or 0
+            total[1] += 1
+    return totals
+
+
+def _cat_info(fs, path) -> Optional[Dict[str, Any]]:
+    """Get the details of a file which content is to be printed out, in a
+    single request. Returns None if the path is not a file."""
+    file_info = fs.try_info(path, refresh=True)
+    if file_info is None or file_info.get("type") != "file":
         click.echo("No such file")
-        return False
+        return None
+    return file_info
 
-    head = fs.head(path)
-    if is_binary_string(head) and not click.confirm(
-        "The file appears to be binary. Continue?"
-    ):
-        return False
 
-    return True
+def _cat_confirm_binary(block: bytes) -> bool:
+    """Validate that the content of the file, judging by the given block of
+    it, can be printed out. Interactive. Returns True if the file can be
+    printed, False otherwise."""
+    return not is_binary_string(block) or click.confirm(
+        "The file appears to be binary. Continue?"
+    )
 
 
-@cli.command(help="Print file content")
+@click.command(help="Print file content")
 @click.argument("path")
 @errorhandler
 def cat(path):
     fs = file_system.get_current()
-    if not _cat_validate(fs, path):
+    file_info = _cat_info(fs, path)
+    if file_info is None:
+        return
+
+    # the first block is used both to detect binary files and for the output
+    first_block = fs.cat_file(path, start=0, end=CAT_BLOCK_SIZE)
+    if not _cat_confirm_binary(first_block):
         return
 
-    size = fs.size(path)
-    if size >= 10 * 1024 and not click.confirm(
-        f"The file is {humanize_bytes(size)} long. Are you sure?"
+    size = file_info.get("size")
+    if (
+        size is not None
+        and size >= 10 * 1024
+        and not click.confirm(f"The file is {humanize_bytes(size)} long. Are you sure?")
     ):
         return
 
-    click.echo(fs.cat(path))
+    # stream the rest of the content block by block to keep memory usage
+    # constant, and to stop reading as soon as the downstream pipe is closed
+    # (see errorhandler)
+    click.echo(first_block, nl=False)
+    if len(first_block) == CAT_BLOCK_SIZE:
+        for block in file_system.iter_blocks(fs, path, start=CAT_BLOCK_SIZE, end=size):
+            click.echo(block, nl=False)
+    click.echo(b"")
 
 
-@cli.command(help="Print first bytes of the file content")
+@click.command(help="Print first bytes of the file content")
 @click.option(
     "-c",
     "--bytes",
@@ -155,11 +361,15 @@ def cat(path):
 @errorhandler
 def head(path, bytes_count):
     fs = file_system.get_current()
-    if _cat_validate(fs, path):
-        click.echo(fs.head(path, bytes_count))
+    if _cat_info(fs, path) is None:
+        return
+
+    block = fs.cat_file(path, start=0, end=bytes_count)
+    if _cat_confirm_binary(block):
+        click.echo(block)
 
 
-@cli.command(help="Print last bytes of the file content")
+@click.command(help="Print last bytes of the file content")
 @click.option(
     "-c",
     "--bytes",
@@ -173,12 +383,22 @@ def head(path, bytes_count):
 @errorhandler
 def tail(path, bytes_count):
     fs = file_system.get_current()
-    if _cat_validate(fs, path):
-        click.echo(fs.tail(path, bytes_count))
+    file_info = _cat_info(fs, path)
+    if file_info is None:
+        return
+
+    size = file_info.get("size")
+    if size is None:
+        block = fs.tail(path, bytes_count)
+    else:
+        block = fs.cat_file(path, start=max(0, size - bytes_count), end=size)
+    if _cat_confirm_binary(block):
+        click.echo(block)
 
 
-@cli.command(
-    help="Copy files and directories within a file system. "
+@click.command(
+    help="Copy files and directories within a file system, or between two "
+    "file systems, given as [FSNAME:]PATH (see sync). "
     "Overwrites target files, if they exist."
 )
 @click.option(
@@ -189,15 +409,54 @@ def tail(path, bytes_count):
     default=False,
     help="Copy matching directories and their subtrees",
 )
+@click.option(
+    "-j",
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=8,
+    show_default=True,
+    help="Copy at most this number of files concurrently between file systems",
+)
 @click.argument("src")
 @click.argument("dst")
 @errorhandler
-def cp(recursive, src, dst):
-    fs = file_system.get_current()
-    fs.cp(src, dst, recursive=recursive)
-
-
-@cli.command(
+def cp(recursive, jobs, src, dst):
+    stats = copy(recursive, jobs, src, dst)
+    if stats is not None:
+        click.echo(stats.summary("Copied"))
+        stats.raise_if_failed()
+
+
+def copy(
+    recursive: bool, jobs: int, src: str, dst: str
+) -> Optional[transfer.TransferStats]:
+    """Same as cp, but returns the statistics of a recursive copy between two
+    file systems instead of printing them (e.g., in a batch)"""
+    src_fs, src_path = file_system.resolve(src)
+    dst_fs, dst_path = file_system.resolve(dst)
+    if src_fs is dst_fs:
+        src_fs.cp(src_path, dst_path, recursive=recursive)
+        return None
+
+    if glob.escape(src_path) != src_path:
+        raise FatalError("Globs can only be used to copy within a file system")
+
+    if recursive:
+        if not src_fs.isdir(src_path):
+            raise FatalError(f"Directory not found: {src}")
+        return transfer.copy_tree(src_fs, src_path, dst_fs, dst_path, jobs)
+
+    file_info = src_fs.info(src_path, refresh=True)
+    if file_info.get("type") == "directory":
+        raise FatalError(f"{src} is a directory (not copied, use -r)")
+    dst_info = dst_fs.try_info(dst_path)
+    if dst_path.endswith("/") or (dst_info or {}).get("type") == "directory":
+        dst_path = posixpath.join(dst_path, posixpath.basename(src_path))
+    transfer.copy_file(src_fs, src_path, dst_fs, dst_path, file_info.get("size"))
+    return None
+
+
+@click.command(
     help="Move files and directories within a file system. "
     "Overwrites target files, if they exist."
 )
@@ -217,7 +476,7 @@ def mv(recursive, src, dst):
     fs.mv(src, dst, recursive=recursive)
 
 
-@cli.command(help="Remove files and directories")
+@click.command(help="Remove files and directories")
 @click.option(
     "-r",
     "recursive",
@@ -234,23 +493,45 @@ def mv(recursive, src, dst):
     default=False,
     help="Remove all matching files and directories without prompting for confirmation",
 )
+@click.option(
+    "-j",
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=deletion.DEFAULT_DELETE_JOBS,
+    show_default=True,
+    help="Remove at most this number of batches of files concurrently",
+)
 @click.argument("path")
 @errorhandler
-def rm(recursive, force, path):
+def rm(recursive, force, jobs, path):
     fs = file_system.get_current()
+    if force and not recursive:
+        fs.rm(path)
+        return
+
+    # the details of the paths are fetched along with the expansion, so that
+    # no requests are needed between or after the confirmations
+    entries = deletion.expand(fs, path, recursive=recursive)
     if not force:
-        paths = reversed(fs.expand_path(path, recursive=recursive))
-        for p in paths:
-            if click.confirm(f"Remove {p}?"):
-                if fs.isdir(p):
-                    fs.rmdir(p)
-                else:
-                    fs.rm(p)
-    else:
-        fs.rm(path, recursive=recursive)
+        entries = [
+            entry
+            for entry in sorted(entries, key=lambda e: e["name"], reverse=True)
+            if click.confirm(f"Remove {entry['name']}?")
+        ]
+
+    batch_size = deletion.DELETE_BATCH_SIZE
+    stats = deletion.delete(fs, entries, jobs, batch_size, _rm_progress)
+    if stats.batches > 1:
+        click.echo("", err=True)  # end the progress line
+    if stats.failed:
+        raise FatalError(f"{stats.summary()}: {stats.errors[0]}")
+
 
+def _rm_progress(stats: deletion.DeletionStats):
+    click.echo(f"\r{stats.summary()}", nl=False, err=True)
 
-@cli.command(help="Create a file or update its modifiction time")
+
+@click.command(help="Create a file or update its modifiction time")
 @click.argument("path")
 @errorhandler
 def touch(path):
@@ -262,33 +543,274 @@ def touch(path):
     fs.touch(path, truncate=False)
 
 
-@cli.command(help="Get (download) a single file to a native local file system")
-@click.argument("remote_file_path")
-@click.argument("local_file_or_dir_path")
-@errorhandler
-def get(remote_file_path, local_file_or_dir_path):
-    fs = file_system.get_current()
+def _checkpoint(remote_path, local_path, resume, upload=False) -> Checkpoint:
+    """Checkpoint of a transfer between the current file system and a native
+    local file system. The progress is only recorded with --resume."""
+    remote = f"{config.get().current_fs_name}:{remote_path}"
+    local = os.path.abspath(local_path)
+    source, destination = (local, remote) if upload else (remote, local)
+    path = checkpoint_path(source, destination) if resume else None
+    return Checkpoint(path, source, destination, resume)
 
-    if not fs.isfile(remote_file_path):
-        raise FatalError(f"File not found: {remote_file_path}")
 
-    fs.get(remote_file_path, local_file_or_dir_path)
+@click.command(
+    help="Get (download) a single file, or a directory content with -r, "
+    "to a native local file system"
+)
+@click.option(
+    "-r",
+    "recursive",
+    is_flag=True,
+    show_default=False,
+    default=False,
+    help="Download the content of a directory and its subtree",
+)
+@click.option(
+    "-j",
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=8,
+    show_default=True,
+    help="Download at most this number of files concurrently",
+)
+@click.option(
+    "--segments",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Download a single file in this number of concurrent byte ranges",
+)
+@click.option(
+    "--resume",
+    is_flag=True,
+    show_default=False,
+    default=False,
+    help="Record the progress of the download, and resume a download "
+    "interrupted previously (if it was also started with --resume), skipping "
+    "the data downloaded already",
+)
+@click.option(
+    "--verify",
+    is_flag=True,
+    show_default=False,
+    default=False,
+    help="Verify the checksums of the files, computed as they are downloaded, "
+    "against the ones reported by the file system, and download the files that "
+    "don't match again",
+)
+@click.argument("remote_path")
+@click.argument("local_path")
+@errorhandler
+def get(recursive, jobs, segments, resume, verify, remote_path, local_path):
+    fs = file_system.get_current()
 
+    if recursive and segments is not None:
+        raise FatalError("--segments can only be used to download a single file")
+    if verify and segments is not None:
+        # segments are downloaded out of order, and can't be hashed as a whole
+        raise FatalError("--verify can't be used with --segments")
+
+    if recursive:
+        if not fs.isdir(remote_path):
+            raise FatalError(f"Directory not found: {remote_path}")
+        with _checkpoint(remote_path, local_path, resume) as checkpoint:
+            stats = transfer.download_tree(
+                fs, remote_path, local_path, jobs, checkpoint, verify
+            )
+            click.echo(stats.summary("Downloaded"))
+            stats.raise_if_failed()
+        return
 
-@cli.command(help="Put (upload) a single file from a native local file system")
-@click.argument("local_file_path")
-@click.argument("remote_file_or_dir_path")
+    if not fs.isfile(remote_path):
+        raise FatalError(f"File not found: {remote_path}")
+
+    local_path = transfer.local_file_path(remote_path, local_path)
+    with _checkpoint(remote_path, local_path, resume) as checkpoint:
+        if segments is not None:
+            stats = transfer.download_segmented(
+                fs, remote_path, local_path, segments, checkpoint
+            )
+            click.echo(stats.summary("Downloaded"))
+        else:
+            stats = transfer.download_file(
+                fs, remote_path, local_path, checkpoint, verify
+            )
+            if stats.unverified:
+                click.echo(f"Not verified: {remote_path} has no checksum", err=True)
+
+
+@click.command(
+    help="Put (upload) a single file, or a directory content with -r, "
+    "from a native local file system"
+)
+@click.option(
+    "-r",
+    "recursive",
+    is_flag=True,
+    show_default=False,
+    default=False,
+    help="Upload the content of a directory and its subtree",
+)
+@click.option(
+    "-j",
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=8,
+    show_default=True,
+    help="Upload at most this number of files concurrently, and of parts of "
+    "a file, if the file system supports concurrent multipart uploads",
+)
+@click.option(
+    "--part-size",
+    type=click.IntRange(min=5),
+    default=64,
+    show_default=True,
+    help="Upload files larger than this (in MB) in parts of this size",
+)
+@click.option(
+    "--resume",
+    is_flag=True,
+    show_default=False,
+    default=False,
+    help="Record the progress of the upload, and resume an upload interrupted "
+    "previously (if it was also started with --resume), skipping the files "
+    "uploaded already",
+)
+@click.option(
+    "--verify",
+    is_flag=True,
+    show_default=False,
+    default=False,
+    help="Verify the checksums of the files, computed as they are uploaded, "
+    "against the ones reported by the file system (part by part for the files "
+    "uploaded to S3 in multiple parts), and upload the files that don't match "
+    "again",
+)
+@click.argument("local_path")
+@click.argument("remote_path")
 @errorhandler
-def put(local_file_path, remote_file_or_dir_path):
+def put(recursive, jobs, part_size, resume, verify, local_path, remote_path):
     fs = file_system.get_current()
+    part_size = part_size * 1024 * 1024
+
+    if recursive:
+        if not os.path.isdir(local_path):
+            raise FatalError(f"Directory not found: {local_path}")
+        with _checkpoint(remote_path, local_path, resume, upload=True) as checkpoint:
+            stats = transfer.upload_tree(
+                fs, local_path, remote_path, jobs, part_size, checkpoint, verify
+            )
+            click.echo(stats.summary("Uploaded"))
+            stats.raise_if_failed()
+        return
 
-    if not os.path.isfile(local_file_path):
-        raise FatalError(f"File not found: {remote_file_or_dir_path}")
+    if not os.path.isfile(local_path):
+        raise FatalError(f"File not found: {remote_path}")
+
+    if fs.isdir(remote_path):
+        remote_path = posixpath.join(remote_path, os.path.basename(local_path))
+    with _checkpoint(remote_path, local_path, resume, upload=True) as checkpoint:
+        stats = transfer.upload_file(
+            fs, local_path, remote_path, part_size, checkpoint, verify, jobs
+        )
+    if stats.skipped:
+        click.echo(f"Skipped {local_path}: uploaded previously")
+    if stats.unverified:
+        click.echo(f"Not verified: {remote_path} has no checksum", err=True)
+
+
+@click.command(
+    help="Synchronize a directory to another one: copy the files that are "
+    "missing or changed in the destination. Directories are given as "
+    "[FSNAME:]PATH, where FSNAME is a configured file system, or 'local' for "
+    "the native local file system; the current file system is used by default."
+)
+@click.option(
+    "-j",
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=8,
+    show_default=True,
+    help="Copy at most this number of files concurrently",
+)
+@click.option(
+    "--delete",
+    is_flag=True,
+    show_default=False,
+    default=False,
+    help="Delete the files in the destination that are missing in the source",
+)
+@click.argument("src")
+@click.argument("dst")
+@errorhandler
+def sync(jobs, delete, src, dst):
+    src_fs, src_path = file_system.resolve(src)
+    dst_fs, dst_path = file_system.resolve(dst)
+    if not src_fs.isdir(src_path):
+        raise FatalError(f"Directory not found: {src}")
+
+    stats, deletion_stats = unifs_sync.sync_tree(
+        src_fs, src_path, dst_fs, dst_path, jobs, delete
+    )
+    click.echo(stats.summary("Copied"))
+    if deletion_stats is not None:
+        click.echo(deletion_stats.summary())
+        if deletion_stats.failed:
+            raise FatalError(deletion_stats.errors[0])
+    stats.raise_if_failed()
+
+
+@click.command(
+    name="hash",
+    help="Print the checksums of files. Checksums reported by the file system "
+    "(e.g., MD5 of the files in GCS) are used when available, otherwise the file "
+    "content is read and hashed.",
+)
+@click.option(
+    "-r",
+    "recursive",
+    is_flag=True,
+    show_default=False,
+    default=False,
+    help="Print the checksums of all files in a directory tree",
+)
+@click.option(
+    "--algo",
+    "algorithm",
+    type=click.Choice(checksum.ALGORITHMS),
+    default="md5",
+    show_default=True,
+    help="Checksum algorithm",
+)
+@click.option(
+    "-j",
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=os.cpu_count() or 1,
+    show_default=True,
+    help="Hash at most this number of files concurrently, in separate processes",
+)
+@click.argument("path")
+@errorhandler
+def hash_(recursive, algorithm, jobs, path):
+    fs = file_system.get_current()
+    file_info = fs.info(path, refresh=True)
+    if file_info.get("type") == "directory":
+        if not recursive:
+            raise FatalError(f"{path} is a directory (use -r to hash its files)")
+        files = [
+            entry
+            for entry in file_system.iter_tree(fs, file_info["name"], refresh=True)
+            if entry.get("type") != "directory"
+        ]
+        files.sort(key=lambda entry: entry["name"])
+    else:
+        files = [file_info]
 
-    fs.put(local_file_path, remote_file_or_dir_path)
+    for name, file_checksum in checksum.checksums(fs, files, algorithm, jobs):
+        click.echo(f"{file_checksum}  {name}")
 
 
-@cli.command(help="Creare directories")
+@click.command(help="Creare directories")
 @click.option(
     "-p",
     "mkdirs",
@@ -6,7 +6,6 @@ from fsspec.registry import get_filesystem_class, known_implementations
 
 from ..exceptions import RecoverableError
 from ..tui import errorhandler, format_table
-from .main import cli
 
 IGNORED_IMPLEMENTATIONS = [
     "memory",
@@ -19,7 +18,7 @@ IGNORED_IMPLEMENTATIONS = [
 ]
 
 
-@cli.group
+@click.group
 def impl():
     """Get information about known file system implementations"""
     pass
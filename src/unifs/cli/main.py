@@ -1,10 +1,18 @@
+import importlib
+import json
 import sys
+import threading
+from typing import List, Optional
 
 import click
 
-from .. import config
+from .. import config, profiling
 from ..config import ensure_config, site_config_file_path
-from ..tui import errorhandler
+from ..exceptions import FatalError
+from ..instrumentation import CallStats, add_recorder, remove_recorder
+from ..logging import TraceWriter
+from ..tui import errorhandler, format_table
+from ..util import humanize_bytes
 
 TERMS_PROMPT = """
 User is responsible for the operations performed by this program.
@@ -17,12 +25,221 @@ Do you agree?
 """.strip()
 
 
-@click.group
+# Commands of the CLI, and where they are defined: "MODULE:ATTRIBUTE", with the
+# modules relative to this package. Modules are imported only when their
+# commands are used, because most of them import the file system
+# implementations (fsspec), which takes much longer than executing the
+# simple commands.
+COMMANDS = {
+    "batch": "batch:batch",
+    "cat": "fs:cat",
+    "conf": "conf:conf",
+    "cp": "fs:cp",
+    "daemon": "daemon:daemon",
+    "du": "fs:du",
+    "find": "fs:find",
+    "get": "fs:get",
+    "hash": "fs:hash_",
+    "head": "fs:head",
+    "impl": "impl:impl",
+    "ll": "fs:ll",
+    "ls": "fs:ls",
+    "mkdir": "fs:mkdir",
+    "mv": "fs:mv",
+    "put": "fs:put",
+    "rm": "fs:rm",
+    "sync": "fs:sync",
+    "tail": "fs:tail",
+    "touch": "fs:touch",
+}
+
+# Commands that use the current file system, which may be created ahead
+WARMUP_COMMANDS = {
+    name for name, target in COMMANDS.items() if target.startswith(("fs:", "batch:"))
+}
+
+
+class LazyGroup(click.Group):
+    """A group of the commands listed in COMMANDS, which imports the module of
+    a command only when the command is used"""
+
+    def list_commands(self, ctx: click.Context) -> List[str]:
+        return sorted(set(super().list_commands(ctx)).union(COMMANDS))
+
+    def resolve_command(self, ctx: click.Context, args: List[str]):
+        # the profile is started before the warm-up, to measure the creation
+        # of the file system in the background too
+        if ctx.params.get("profile"):
+            collect_profile(ctx, ctx.params.get("profile_output"))
+        if args and args[0] in WARMUP_COMMANDS:
+            warm_up()
+        return super().resolve_command(ctx, args)
+
+    def get_command(self, ctx: click.Context, name: str) -> Optional[click.Command]:
+        if name in COMMANDS:
+            return self.load_command(name)
+        return super().get_command(ctx, name)
+
+    def load_command(self, name: str) -> click.Command:
+        """Import the command with a given name"""
+        module_name, attribute = COMMANDS[name].split(":")
+        module = importlib.import_module(f".{module_name}", __package__)
+        return getattr(module, attribute)
+
+
+def warm_up() -> Optional[threading.Thread]:
+    """If enabled in the configuration, start creating the current file
+    system in a background thread, so that importing its implementation and
+    connecting to it overlaps with loading and parsing the command. The
+    command then gets the instance created in the background (see
+    file_system.get). Returns the started thread, if any."""
+    try:
+        with profiling.phase("config load"):
+            if not config.get().warmup:
+                return None
+    except (FatalError, OSError):
+        return None  # reported when the command is executed
+
+    thread = threading.Thread(target=_create_current_fs, daemon=True)
+    thread.start()
+    return thread
+
+
+def _create_current_fs():
+    try:
+        from .. import file_system
+
+        file_system.get_current()
+    except Exception:
+        pass  # the command fails the same way when it gets the file system
+
+
+@click.group(cls=LazyGroup)
+@click.option(
+    "--stats",
+    is_flag=True,
+    show_default=False,
+    default=False,
+    help="Print the statistics of the calls to the file system to stderr at exit",
+)
+@click.option(
+    "--stats-format",
+    type=click.Choice(["table", "json"]),
+    default="table",
+    show_default=True,
+    help="Format of the statistics printed with --stats",
+)
+@click.option(
+    "--trace",
+    "trace_path",
+    type=click.Path(dir_okay=False, writable=True),
+    envvar="UNIFS_TRACE",
+    default=None,
+    help="Write the calls to the file system to this file, in the Chrome "
+    "trace event format (also set with the UNIFS_TRACE environment variable)",
+)
+@click.option(
+    "--profile",
+    is_flag=True,
+    show_default=False,
+    default=False,
+    help="Profile the command, and print the time of its phases and the "
+    "functions that take the most time to stderr at exit",
+)
+@click.option(
+    "--profile-output",
+    type=click.Path(dir_okay=False, writable=True),
+    default=None,
+    help="Save the profile to this file (in the pstats format) with --profile",
+)
 @errorhandler
-def cli():
+def cli(stats, stats_format, trace_path, profile, profile_output):
     """This is the CLI entry point"""
-    ensure_config(site_config_file_path())
-    prompt_accept_terms()
+    ctx = click.get_current_context()
+    # the profile is collected from the resolution of the command (see
+    # LazyGroup.resolve_command)
+    with profiling.phase("config load"):
+        ensure_config(site_config_file_path())
+        prompt_accept_terms()
+    if stats:
+        collect_stats(ctx, stats_format)
+    if trace_path is not None:
+        collect_trace(ctx, trace_path)
+
+
+def collect_profile(ctx: click.Context, output_path: Optional[str]):
+    """Profile the command, and print the report when the command
+    completes"""
+    profile = profiling.start()
+    add_recorder(profile)
+
+    def print_profile():
+        remove_recorder(profile)
+        try:
+            click.echo(profiling.stop(output_path), err=True)
+        except OSError as err:
+            click.echo(f"Can't save the profile: {err}", err=True)
+
+    ctx.call_on_close(print_profile)
+
+
+def collect_stats(ctx: click.Context, stats_format: str):
+    """Record the calls to the file system made by the command, and print
+    their statistics when the command completes"""
+    stats = CallStats()
+    add_recorder(stats)
+
+    def print_stats():
+        remove_recorder(stats)
+        click.echo(format_stats(stats, stats_format), err=True)
+
+    ctx.call_on_close(print_stats)
+
+
+def collect_trace(ctx: click.Context, trace_path: str):
+    """Write the calls to the file system made by the command to a trace
+    file"""
+    try:
+        trace = TraceWriter(trace_path)
+    except OSError as err:
+        raise FatalError(f"Can't write the trace: {err}")
+    add_recorder(trace)
+
+    def close_trace():
+        remove_recorder(trace)
+        trace.close()
+
+    ctx.call_on_close(close_trace)
+
+
+def format_stats(stats: CallStats, stats_format: str) -> str:
+    data = stats.to_dict()
+    if stats_format == "json":
+        return json.dumps(data)
+
+    header = ["METHOD", "CALLS", "ERRORS", "TOTAL", "P50", "P95", "MAX"]
+    header += ["READ", "WRITTEN"]
+    widths = [16, 8, 8, 12, 10, 10, 10, 10, 10]
+    rows = [
+        [
+            method,
+            method_stats["calls"],
+            method_stats["errors"],
+            f"{method_stats['total_ms']:.1f}ms",
+            f"{method_stats['p50_ms']:.1f}ms",
+            f"{method_stats['p95_ms']:.1f}ms",
+            f"{method_stats['max_ms']:.1f}ms",
+            _format_bytes(method_stats["bytes_read"]),
+            _format_bytes(method_stats["bytes_written"]),
+        ]
+        for method, method_stats in data.items()
+    ]
+    return format_table(header, widths, rows)
+
+
+def _format_bytes(size: Optional[int]) -> str:
+    """Human-readable size, or '-' if the bytes are not counted"""
+    return "-" if size is None else humanize_bytes(size)
 
 
 def prompt_accept_terms():
@@ -38,6 +255,3 @@ def prompt_accept_terms():
 
     new_conf = config.get().set_accepted_usage_terms()
     config.save_site_config(new_conf)
-
-
-from . import conf, fs, impl  # noqa: F401, E402
@@ -1,5 +1,5 @@
 import os
-from dataclasses import asdict, dataclass, replace
+from dataclasses import asdict, dataclass, field, replace
 from functools import lru_cache
 from typing import Dict, List, Union
 
@@ -18,11 +18,24 @@ except ModuleNotFoundError:
 PrimitiveType = Union[str, int, float, bool]
 
 
+@dataclass(frozen=True)
+class CacheConfig:
+    """Persistent metadata cache settings (see the `cache` module)"""
+
+    enabled: bool = False
+    ttl: int = 60  # seconds
+    max_entries: int = 10000
+
+
 @dataclass(frozen=True)
 class Config:
     current: str
     activated: bool
     fs: Dict[str, Dict[str, PrimitiveType]]
+    cache: CacheConfig = field(default_factory=CacheConfig)
+    # create the current file system in the background, while the command
+    # is being parsed (see cli.main.warm_up)
+    warmup: bool = False
 
     @property
     def current_fs_name(self) -> str:
@@ -0,0 +1,331 @@
+"""
+An optional background process (daemon) that executes the commands on behalf
+of the CLI. The daemon keeps the file system instances, and thus their
+connections, between the commands, which saves the start-up time of every
+command: imports, configuration loading, authentication and connection to the
+back-ends.
+
+The CLI forwards the commands to the daemon if it is running, through a Unix
+socket located next to the configuration file. The client sends a JSON header
+line with the command line arguments, the working directory, and the
+environment variables that apply to the commands (FORWARDED_ENV_VARS), then
+streams its standard input. The daemon streams back the command output in frames: a
+frame kind (stdout, stderr, or exit code), followed by the payload length and
+the payload. The daemon executes one command at a time, and interrupts a
+command if its client disconnects (e.g., when the user presses Ctrl-C).
+
+This module only uses the standard library at the top level, to keep the
+client start-up fast.
+"""
+
+import io
+import json
+import os
+import select
+import socket
+import socketserver
+import struct
+import sys
+import threading
+from contextlib import contextmanager
+from typing import BinaryIO, Dict, List, Optional
+
+from . import config
+
+# Set this environment variable to disable forwarding the commands to a daemon
+NO_DAEMON_ENV_VAR = "UNIFS_NO_DAEMON"
+
+# Environment variables of the client that apply to the commands executed by
+# the daemon, instead of the ones of the daemon itself. Relative paths are
+# resolved against the working directory of the client.
+FORWARDED_ENV_VARS = ("UNIFS_TRACE",)
+
+_STDOUT = b"o"
+_STDERR = b"e"
+_EXIT = b"x"
+_FRAME_HEADER = struct.Struct("!cI")
+
+
+def socket_path() -> str:
+    """Location of the daemon socket: next to the configuration file"""
+    return os.path.join(os.path.dirname(config.site_config_file_path()), "daemon.sock")
+
+
+def is_supported() -> bool:
+    return hasattr(socket, "AF_UNIX")
+
+
+def _connect() -> Optional[socket.socket]:
+    """Connect to the daemon, or return None if it is not running"""
+    if not is_supported() or not os.path.exists(socket_path()):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path())
+    except OSError:
+        # e.g., a socket file remaining after the daemon was killed
+        sock.close()
+        return None
+    return sock
+
+
+def is_running() -> bool:
+    sock = _connect()
+    if sock is None:
+        return False
+    sock.close()
+    return True
+
+
+def forward(
+    argv: List[str],
+    stdin: Optional[BinaryIO] = None,
+    stdout: Optional[BinaryIO] = None,
+    stderr: Optional[BinaryIO] = None,
+) -> Optional[int]:
+    """Execute a command in the daemon, if it is running. Returns the exit
+    code of the command, or None if the daemon is not running (and then the
+    command should be executed in-process)."""
+    if os.environ.get(NO_DAEMON_ENV_VAR) or (argv and argv[0] == "daemon"):
+        return None
+
+    sock = _connect()
+    if sock is None:
+        return None
+
+    stdin = stdin or sys.stdin.buffer
+    stdout = stdout or sys.stdout.buffer
+    stderr = stderr or sys.stderr.buffer
+
+    with sock:
+        header = {"argv": argv, "cwd": os.getcwd(), "env": _forwarded_env()}
+        sock.sendall(json.dumps(header).encode("utf-8") + b"\n")
+        threading.Thread(target=_pump_stdin, args=(stdin, sock), daemon=True).start()
+
+        frames = sock.makefile("rb")
+        while True:
+            kind, payload = _read_frame(frames)
+            if kind == _STDOUT:
+                try:
+                    stdout.write(payload)
+                    stdout.flush()
+                except BrokenPipeError:
+                    # closing the connection makes the command stop as well
+                    return 1
+            elif kind == _STDERR:
+                stderr.write(payload)
+                stderr.flush()
+            elif kind == _EXIT:
+                return int(payload)
+            else:
+                stderr.write(b"Lost the connection to the unifs daemon\n")
+                return 2
+
+
+def stop():
+    """Ask the daemon to stop, and wait until it stops"""
+    sock = _connect()
+    if sock is not None:
+        with sock:
+            sock.sendall(json.dumps({"control": "stop"}).encode("utf-8") + b"\n")
+            # the connection is closed once the daemon stops
+            while sock.recv(1024):
+                pass
+
+
+def _forwarded_env() -> Dict[str, str]:
+    return {name: os.environ[name] for name in FORWARDED_ENV_VARS if name in os.environ}
+
+
+def _pump_stdin(stdin: BinaryIO, sock: socket.socket):
+    """Forward the standard input of the client to the daemon"""
+    # read from an unbuffered stream, if available: this thread may still be
+    # blocked on reading when the program exits, and must not hold the lock
+    # of a buffered stream then
+    reader = getattr(stdin, "raw", stdin)
+    try:
+        for chunk in iter(lambda: reader.read(64 * 1024), b""):
+            sock.sendall(chunk)
+        sock.shutdown(socket.SHUT_WR)
+    except (OSError, ValueError):
+        # the command is complete, and the connection is closed
+        pass
+
+
+def _read_frame(frames: BinaryIO):
+    header = frames.read(_FRAME_HEADER.size)
+    if len(header) < _FRAME_HEADER.size:
+        return None, b""
+    kind, length = _FRAME_HEADER.unpack(header)
+    return kind, frames.read(length)
+
+
+def _write_frame(sock: socket.socket, kind: bytes, payload: bytes):
+    sock.sendall(_FRAME_HEADER.pack(kind, len(payload)) + payload)
+
+
+class _FrameWriter(io.RawIOBase):
+    """Writable binary stream that sends the data to the client in frames"""
+
+    def __init__(self, sock: socket.socket, kind: bytes):
+        self._sock = sock
+        self._kind = kind
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        if data:
+            _write_frame(self._sock, self._kind, data)
+        return len(data)
+
+
+def _text_stream(binary: BinaryIO, **kwargs) -> io.TextIOWrapper:
+    return io.TextIOWrapper(binary, encoding="utf-8", errors="replace", **kwargs)
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    # commands change the process-wide state (standard streams, working
+    # directory), and thus are executed one at a time
+    _lock = threading.Lock()
+
+    def handle(self):
+        header = self.rfile.readline()
+        if not header:
+            # a connection only to check that the daemon is running
+            return
+        request = json.loads(header)
+        if request.get("control") == "stop":
+            # the connection is closed when the daemon is stopped
+            self.server.shutdown()
+            return
+
+        try:
+            with _RequestHandler._lock:
+                exit_code = self._execute(
+                    request["argv"], request["cwd"], request.get("env", {})
+                )
+        except OSError:
+            # the client is gone, and the output of the command can't be
+            # written anymore
+            return
+        try:
+            _write_frame(self.connection, _EXIT, str(exit_code).encode("ascii"))
+        except OSError:
+            # the client is gone
+            pass
+
+    def _execute(self, argv: List[str], cwd: str, env: Dict[str, str]) -> int:
+        from .cli.main import cli
+
+        stdout = _text_stream(
+            io.BufferedWriter(_FrameWriter(self.connection, _STDOUT)),
+            write_through=True,
+        )
+        stderr = _text_stream(
+            io.BufferedWriter(_FrameWriter(self.connection, _STDERR)),
+            write_through=True,
+        )
+        stdin = _text_stream(self.rfile)
+
+        saved = sys.stdin, sys.stdout, sys.stderr
+        saved_env = {name: os.environ.get(name) for name in FORWARDED_ENV_VARS}
+        sys.stdin, sys.stdout, sys.stderr = stdin, stdout, stderr
+        try:
+            os.chdir(cwd)
+            _set_env({name: env.get(name) for name in FORWARDED_ENV_VARS})
+            # the configuration may have changed since the last command
+            config.get.cache_clear()
+            with _interrupted_on_disconnect(self.connection):
+                cli.main(args=argv, prog_name="unifs")
+            return 0
+        except SystemExit as err:
+            if err.code is None:
+                return 0
+            return err.code if isinstance(err.code, int) else 1
+        except KeyboardInterrupt:
+            # interrupted after the command has completed
+            return 130
+        finally:
+            for stream in (stdout, stderr):
+                try:
+                    stream.flush()
+                except OSError:
+                    pass
+            sys.stdin, sys.stdout, sys.stderr = saved
+            _set_env(saved_env)
+
+
+def _set_env(env: Dict[str, Optional[str]]):
+    """Set the environment variables, or unset the ones which value is None"""
+    for name, value in env.items():
+        if value is None:
+            os.environ.pop(name, None)
+        else:
+            os.environ[name] = value
+
+
+@contextmanager
+def _interrupted_on_disconnect(sock: socket.socket):
+    """Interrupt the current thread with a KeyboardInterrupt, as Ctrl-C
+    would, if the client closes the connection. A thread blocked in a call
+    that doesn't execute Python code (e.g., waiting for a back-end) is only
+    interrupted once the call returns."""
+    import ctypes
+
+    thread_id = threading.get_ident()
+    lock = threading.Lock()
+    done = threading.Event()
+
+    def watch():
+        poller = select.poll()
+        # a hang-up is reported once the client closes the connection, but
+        # not when it only closes its side (at the end of the standard input)
+        poller.register(sock, select.POLLHUP)
+        while not done.is_set():
+            if poller.poll(100):
+                with lock:
+                    if not done.is_set():
+                        ctypes.pythonapi.PyThreadState_SetAsyncExc(
+                            ctypes.c_ulong(thread_id),
+                            ctypes.py_object(KeyboardInterrupt),
+                        )
+                return
+
+    watcher = threading.Thread(target=watch, daemon=True)
+    watcher.start()
+    try:
+        yield
+    finally:
+        with lock:
+            done.set()
+        watcher.join()
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve():
+    """Run the daemon in the foreground, until it is stopped"""
+    path = socket_path()
+    if os.path.exists(path):
+        os.remove(path)
+
+    old_umask = os.umask(0o077)  # the socket is accessible to the user only
+    try:
+        server = _Server(path, _RequestHandler)
+    finally:
+        os.umask(old_umask)
+
+    with server:
+        try:
+            server.serve_forever()
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+if __name__ == "__main__":
+    serve()
@@ -0,0 +1,165 @@
+"""
+Bulk deletion of files and directory trees. The paths to delete are expanded
+with their details, and the files are deleted in batches as they are listed:
+file systems that support deleting multiple files in a single request (e.g.,
+S3 deletes up to 1000 objects at once) delete a batch in one request, and the
+batches are deleted concurrently. Only the paths of the directories are held
+in memory, and the directories are removed last, bottom-up, except for the
+directories of the object stores that only exist as the prefixes of the files
+(see file_system.SYNTHESIZED_KEY).
+
+Deleting multiple files at once expands the paths as globs, so the files with
+the glob special characters in their names (e.g., "x[1].txt") are deleted one
+by one, or the deletion would remove the files they match instead.
+"""
+
+import glob
+from dataclasses import dataclass, field
+from itertools import groupby
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .exceptions import FatalError
+from .file_system import SYNTHESIZED_KEY, FileSystemProxy, glob_details, iter_tree
+from .util import parallel_map
+
+# Number of files deleted in a single call to the file system
+DELETE_BATCH_SIZE = 1000
+
+# Default number of batches deleted concurrently
+DEFAULT_DELETE_JOBS = 8
+
+
+@dataclass
+class DeletionStats:
+    """Progress of a deletion"""
+
+    total: int = 0  # of the files and directories found so far
+    deleted: int = 0
+    failed: int = 0
+    batches: int = 0  # of files
+    errors: List[str] = field(default_factory=list)
+
+    def add(self, count: int, error: Optional[str]):
+        """Count a deleted batch of files or directories, or a failed one if
+        there is an error"""
+        if error is None:
+            self.deleted += count
+        else:
+            self.failed += count
+            self.errors.append(error)
+
+    def summary(self) -> str:
+        summary = f"Removed {self.deleted} of {self.total} files and directories"
+        if self.failed:
+            summary += f", failed to remove {self.failed}"
+        return summary
+
+
+def expand(fs: FileSystemProxy, path: str, recursive: bool) -> Iterator[Dict[str, Any]]:
+    """Yield the details of a path, or of the paths matching a glob, and of
+    all the content of the matching directories if recursive, as they are
+    listed"""
+    if glob.escape(path) != path:
+        matches: Iterable[Dict[str, Any]] = glob_details(fs, path)
+    else:
+        matches = [fs.info(path, refresh=True)]
+
+    for match in matches:
+        yield match
+        if recursive and match.get("type") == "directory":
+            yield from iter_tree(fs, match["name"], refresh=True)
+
+
+def delete(
+    fs: FileSystemProxy,
+    entries: Iterable[Dict[str, Any]],
+    jobs: int = DEFAULT_DELETE_JOBS,
+    batch_size: int = DELETE_BATCH_SIZE,
+    on_progress: Optional[Callable[[DeletionStats], None]] = None,
+) -> DeletionStats:
+    """Delete the files and directories with the given details. Files are
+    deleted in batches of batch_size as the entries are iterated, up to
+    `jobs` batches at a time. Then the directories are removed, the deepest
+    ones first. Failed batches are counted, and don't stop the deletion.
+    Calls on_progress after every batch of files, if there is more than
+    one."""
+    stats = DeletionStats()
+    dirs: List[str] = []
+
+    def batches() -> Iterator[List[str]]:
+        batch: List[str] = []
+        for entry in entries:
+            stats.total += 1
+            if entry.get("type") != "directory":
+                batch.append(entry["name"])
+            elif entry.get(SYNTHESIZED_KEY):
+                # ceases to exist with the files
+                stats.add(1, None)
+            else:
+                dirs.append(entry["name"])
+            if len(batch) == batch_size:
+                stats.batches += 1
+                yield batch
+                batch = []
+        if batch:
+            stats.batches += 1
+            yield batch
+
+    # the next batches are listed while the previous ones are deleted, and
+    # the batches are counted (in this thread) ahead of the results
+    results = parallel_map(lambda batch: _delete_files(fs, batch), batches(), jobs)
+    for outcomes in results:
+        for count, error in outcomes:
+            stats.add(count, error)
+        if on_progress is not None and stats.batches > 1:
+            on_progress(stats)
+
+    # directories of the same depth are removed concurrently
+    dirs.sort(key=_depth, reverse=True)
+    for _, same_depth_dirs in groupby(dirs, key=_depth):
+        same_depth_dirs = list(same_depth_dirs)
+        errors = parallel_map(lambda d: _remove_dir(fs, d), same_depth_dirs, jobs)
+        for error in errors:
+            stats.add(1, error)
+
+    return stats
+
+
+def _depth(path: str) -> int:
+    return path.rstrip("/").count("/")
+
+
+def _delete_files(
+    fs: FileSystemProxy, paths: List[str]
+) -> List[Tuple[int, Optional[str]]]:
+    """Delete a batch of files. The files which names are not globs are
+    deleted in a single request, and the others one by one. Returns the
+    number of files of every request, and an error message if it failed."""
+    names = [path for path in paths if glob.escape(path) == path]
+    globs = [path for path in paths if glob.escape(path) != path]
+    outcomes = []
+    if names:
+        outcomes.append((len(names), _call(fs.rm, names)))
+    for path in globs:
+        outcomes.append((1, _call(fs.rm_file, path)))
+    return outcomes
+
+
+def _call(fn, *args) -> Optional[str]:
+    """Call a function. Returns an error message if it fails."""
+    try:
+        fn(*args)
+        return None
+    except FatalError as err:
+        return str(err)
+
+
+def _remove_dir(fs: FileSystemProxy, path: str) -> Optional[str]:
+    """Remove an empty directory. Returns an error message if it fails."""
+    try:
+        fs.rmdir(path)
+        return None
+    except FatalError as err:
+        # directories of some file systems (e.g., blob storages) are only
+        # the prefixes of the files, and cease to exist with them
+        return str(err) if fs.try_info(path, refresh=True) is not None else None
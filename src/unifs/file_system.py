@@ -1,31 +1,113 @@
+import fnmatch
+import glob
 import inspect
+import os
+import posixpath
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
-from functools import wraps
-from typing import Any, Dict, Optional
+from functools import lru_cache, wraps
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple, Type
 
 import fsspec
+import fsspec.asyn
 
-from . import config
+from . import config, profiling
+from .cache import MetadataCache, get_metadata_cache
 from .exceptions import FatalError
-from .util import dtfromisoformat, get_first_match
+from .instrumentation import instrumented, instrumented_iter
+from .util import dtfromisoformat, get_first_match, parallel_map
 
-_fs_cache: Dict[str, fsspec.AbstractFileSystem] = {}
+_fs_cache: Dict[str, "FileSystemProxy"] = {}
+# configurations the cached instances were created with: an instance is
+# created again if its configuration changes (e.g., in a daemon)
+_fs_cache_configs: Dict[str, Any] = {}
+# file systems may be created in the background (see cli.main.warm_up)
+_fs_cache_lock = threading.Lock()
+
+# Name that refers to the native local file system in the paths in a
+# `[FSNAME:]PATH` form (see `resolve`)
+NATIVE_FS_NAME = "local"
+
+# Default size of the blocks read from the files when streaming their content
+DEFAULT_BLOCK_SIZE = 4 * 1024 * 1024
+
+# Default number of directories listed concurrently when walking a tree
+DEFAULT_WALK_JOBS = 8
+
+# Number of concurrent requests for the details of the paths matching a glob,
+# if the file system doesn't return them along with the matches
+GLOB_INFO_JOBS = 16
+
+# Protocols which `find` lists all the content under a path (prefix) in a
+# single paginated request, instead of listing the directories one by one
+FLAT_LISTING_PROTOCOLS = {"s3", "s3a", "gcs", "gs", "abfs", "az", "adl"}
+
+# Methods that modify the file system, and thus invalidate the cached metadata
+# of the paths they are called with
+MUTATING_METHODS = {
+    "cp",
+    "copy",
+    "cp_file",
+    "mv",
+    "move",
+    "rename",
+    "rm",
+    "rm_file",
+    "rmdir",
+    "delete",
+    "put",
+    "put_file",
+    "upload",
+    "pipe",
+    "pipe_file",
+    "touch",
+    "mkdir",
+    "makedirs",
+    "mkdirs",
+    "open",
+}
+
+# Errors raised by the `ls` of a file system when it is called with a path of a
+# file, per protocol. Many implementations (e.g., blob storages) list a file as
+# a single entry instead. Errors that may also mean that the path doesn't
+# exist are fine: `info` is called then, and raises the appropriate error.
+NOT_A_DIRECTORY_ERRORS: Dict[str, Tuple[Type[Exception], ...]] = {
+    "file": (NotADirectoryError,),
+    "local": (NotADirectoryError,),
+    "ftp": (FileNotFoundError,),
+    "sftp": (FileNotFoundError, NotADirectoryError),
+    "ssh": (FileNotFoundError, NotADirectoryError),
+    "smb": (NotADirectoryError,),
+}
+DEFAULT_NOT_A_DIRECTORY_ERRORS: Tuple[Type[Exception], ...] = (NotADirectoryError,)
 
 
 class FileSystemProxy:
     """Wraps raw file system implementations to add generic features. In
-    particular, adds error handling."""
+    particular, adds error handling, and caches the metadata if the cache is
+    enabled."""
 
     # FIXME: normalize file_info here? (in list, info, and even glob?)
 
-    def __init__(self, fs: fsspec.AbstractFileSystem):
+    def __init__(
+        self,
+        fs: fsspec.AbstractFileSystem,
+        name: str = "",
+        cache: Optional[MetadataCache] = None,
+    ):
         self._fs = fs
+        self._name = name
+        self._cache = cache
 
     @classmethod
-    def _with_error_handling(cls, fn):
+    def _with_error_handling(cls, fn, instrument: bool = True):
         """Wraps a function to handle the commonly-seen excpetions that may be
         raised by fsspec implementation, in order to handle them consistently
-        between the implementations."""
+        between the implementations. Also instruments the function, unless
+        disabled (see the instrumentation module)."""
+        if instrument:
+            fn = instrumented(fn)
 
         @wraps(fn)
         def wrapper(*args, **kwargs):
@@ -65,24 +147,577 @@ class FileSystemProxy:
         msg = str(err)
         return msg if cue in msg.lower() else f"{prefix}: {msg}"
 
+    def try_info(self, path: str, refresh: bool = False) -> Optional[Dict[str, Any]]:
+        """Same as info, but returns None if the path doesn't exist instead of
+        raising an error. Allows to check that a file exists and get its
+        details in a single request."""
+
+        cached_info = self._with_cache(self._fs.info, refresh)
+
+        @wraps(self._fs.info)
+        def info(path):
+            try:
+                return cached_info(path)
+            except FileNotFoundError:
+                return None
+
+        return FileSystemProxy._with_error_handling(info, False)(path)
+
+    def ls_or_info(self, path: str, refresh: bool = False) -> List[Dict[str, Any]]:
+        """Get the details of the directory content, or of a file if the path
+        is a file, in a single request if possible: lists the path first, and
+        only gets the file details if the file system fails to list a file
+        (see NOT_A_DIRECTORY_ERRORS)."""
+
+        cached_ls = self._with_cache(self._fs.ls, refresh)
+        cached_info = self._with_cache(self._fs.info, refresh)
+        not_a_directory_errors = self._not_a_directory_errors()
+
+        @wraps(self._fs.ls)
+        def ls_or_info(path):
+            try:
+                return cached_ls(path, detail=True)
+            except not_a_directory_errors:
+                return [cached_info(path)]
+
+        return FileSystemProxy._with_error_handling(ls_or_info, False)(path)
+
+    def iter_ls_or_info(self, path: str) -> Iterator[Dict[str, Any]]:
+        """Same as ls_or_info, but yields the details of the directory
+        content as they are fetched, if the file system supports listing
+        directories lazily (see LAZY_LISTERS). This allows to start printing
+        out large directories right away, and to stop listing them early."""
+        lister = self._lister(LAZY_LISTERS)
+        if lister is None or self._cache is not None:
+            yield from self.ls_or_info(path)
+            return
+
+        yield from self._iter_lister("ls", lister, path)
+
+    def iter_prefix(self, path: str) -> Optional[Iterator[Dict[str, Any]]]:
+        """Get an iterator over the details of all the files under a path
+        (prefix), fetched page by page, if the file system can list them
+        lazily (see PREFIX_LISTERS), or None otherwise. Directories are not
+        listed, except for the directory markers of some file systems."""
+        lister = self._lister(PREFIX_LISTERS)
+        if lister is None:
+            return None
+        return self._iter_lister("find", lister, path)
+
+    def _iter_lister(
+        self, method: str, lister: "Lister", path: str
+    ) -> Iterator[Dict[str, Any]]:
+        # a lazy listing is instrumented as a single call, rather than a call
+        # per entry
+        entries = instrumented_iter(
+            method,
+            [path],
+            lambda: FileSystemProxy._with_error_handling(lister, False)(self._fs, path),
+        )
+        next_entry = FileSystemProxy._with_error_handling(next, False)
+        while True:
+            try:
+                yield next_entry(entries)
+            except StopIteration:
+                return
+
+    def _lister(self, listers: Dict[str, "Lister"]) -> Optional["Lister"]:
+        for protocol in self._protocols():
+            if protocol in listers:
+                return listers[protocol]
+        return None
+
+    def _protocols(self) -> Tuple[str, ...]:
+        protocols = self._fs.protocol
+        return (protocols,) if isinstance(protocols, str) else tuple(protocols)
+
+    def _not_a_directory_errors(self) -> Tuple[Type[Exception], ...]:
+        for protocol in self._protocols():
+            if protocol in NOT_A_DIRECTORY_ERRORS:
+                return NOT_A_DIRECTORY_ERRORS[protocol]
+        return DEFAULT_NOT_A_DIRECTORY_ERRORS
+
+    def ls(self, path: str, *args, refresh: bool = False, **kwargs):
+        """Same as ls of the file system, but may return a cached listing,
+        unless refreshed (see _with_cache)"""
+        ls = self._with_cache(self._fs.ls, refresh)
+        return FileSystemProxy._with_error_handling(ls, False)(path, *args, **kwargs)
+
+    def info(self, path: str, *args, refresh: bool = False, **kwargs):
+        """Same as info of the file system, but may return cached details,
+        unless refreshed (see _with_cache)"""
+        info = self._with_cache(self._fs.info, refresh)
+        return FileSystemProxy._with_error_handling(info, False)(path, *args, **kwargs)
+
+    def _with_cache(self, fn, refresh: bool = False):
+        """Wraps a function that accepts a path, to cache its results in the
+        metadata cache, if the cache is enabled. The cache is meant for
+        browsing: the callers that read or write the content of the files
+        (e.g., use the size of a file to read it) refresh the cached results,
+        so that they never use stale details. Only the calls to the file
+        system are instrumented, and not the cache hits."""
+        call = instrumented(fn)
+        if self._cache is None:
+            return call
+
+        @wraps(fn)
+        def wrapper(path, *args, **kwargs):
+            kind = fn.__name__ + repr(list(args) + sorted(kwargs.items()))
+            key = self._fs._strip_protocol(path)
+            result = None if refresh else self._cache.get(self._name, kind, key)
+            if result is None:
+                result = call(path, *args, **kwargs)
+                self._cache.put(self._name, kind, key, result)
+            return result
+
+        return wrapper
+
+    def _with_invalidation(self, fn):
+        """Wraps a function that modifies the file system, to invalidate the
+        cached metadata of the paths it is called with."""
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                for path in _mutated_paths(fn.__name__, args, kwargs):
+                    key = self._fs._strip_protocol(path)
+                    self._cache.invalidate(self._name, key)
+
+        return wrapper
+
     def __getattr__(self, name: str):
         """Applies the error handling wrapper to all methods. See
-        _with_error_handling."""
+        _with_error_handling. Private methods (e.g., _strip_protocol) are not
+        instrumented: they don't call the back-end."""
         attr = getattr(self._fs, name)
         if inspect.ismethod(attr) or inspect.isfunction(attr):
-            return FileSystemProxy._with_error_handling(attr)
+            if self._cache is not None and name in MUTATING_METHODS:
+                attr = self._with_invalidation(attr)
+            instrument = not name.startswith("_")
+            return FileSystemProxy._with_error_handling(attr, instrument)
         else:
             return attr
 
 
+Lister = Callable[[fsspec.AbstractFileSystem, str], Iterator[Dict[str, Any]]]
+
+
+def _scandir_lister(
+    fs: fsspec.AbstractFileSystem, path: str
+) -> Iterator[Dict[str, Any]]:
+    """Lazy lister of the local file system. Lists a file as a single entry."""
+    path = fs._strip_protocol(path)
+    try:
+        entries = os.scandir(path)
+    except NotADirectoryError:
+        return iter([fs.info(path)])
+    return _iter_scandir(fs, entries)
+
+
+def _iter_scandir(fs: fsspec.AbstractFileSystem, entries) -> Iterator[Dict[str, Any]]:
+    with entries:
+        for entry in entries:
+            yield fs.info(entry)
+
+
+def _s3_lister(fs: fsspec.AbstractFileSystem, path: str) -> Iterator[Dict[str, Any]]:
+    """Lazy lister of S3, which lists a directory (prefix) page by page.
+    Requires a version of s3fs that can iterate over a prefix (_iterdir)."""
+    path = fs._strip_protocol(path).rstrip("/")
+    bucket, key, _ = fs.split_path(path)
+    if not bucket or not hasattr(fs, "_iterdir"):
+        return iter(fs.ls(path, detail=True))
+    prefix = key + "/" if key else ""
+    pages = _batched(fs._iterdir(bucket, prefix=prefix), LISTING_PAGE_SIZE)
+    return _listed_or_ls(fs, path, _iter_async(fs, pages))
+
+
+def _s3_prefix_lister(
+    fs: fsspec.AbstractFileSystem, path: str
+) -> Iterator[Dict[str, Any]]:
+    """Lazy lister of all the files under a prefix of S3, page by page (see
+    _s3_lister)"""
+    path = fs._strip_protocol(path).rstrip("/")
+    bucket, key, _ = fs.split_path(path)
+    if not bucket or not hasattr(fs, "_iterdir"):
+        return iter(fs.find(path, withdirs=True, detail=True).values())
+    prefix = key + "/" if key else ""
+    objects = fs._iterdir(bucket, prefix=prefix, delimiter="")
+    return _iter_async(fs, _batched(objects, LISTING_PAGE_SIZE))
+
+
+def _gcs_lister(fs: fsspec.AbstractFileSystem, path: str) -> Iterator[Dict[str, Any]]:
+    """Lazy lister of GCS, which lists a directory (prefix) page by page,
+    requesting the pages the same way gcsfs does when it lists a directory at
+    once"""
+    path = fs._strip_protocol(path).rstrip("/")
+    bucket, key = fs.split_path(path)[:2]
+    if not bucket:
+        return iter(fs.ls(path, detail=True))
+    prefix = key + "/" if key else ""
+    return _listed_or_ls(fs, path, _iter_async(fs, _gcs_pages(fs, bucket, prefix)))
+
+
+def _gcs_prefix_lister(
+    fs: fsspec.AbstractFileSystem, path: str
+) -> Iterator[Dict[str, Any]]:
+    """Lazy lister of all the files under a prefix of GCS, page by page (see
+    _gcs_lister)"""
+    path = fs._strip_protocol(path).rstrip("/")
+    bucket, key = fs.split_path(path)[:2]
+    if not bucket:
+        return iter(fs.find(path, withdirs=True, detail=True).values())
+    prefix = key + "/" if key else ""
+    return _iter_async(fs, _gcs_pages(fs, bucket, prefix, delimiter=None))
+
+
+async def _gcs_pages(fs, bucket: str, prefix: str, delimiter: Optional[str] = "/"):
+    page_token = None
+    while True:
+        page = await fs._call(
+            "GET",
+            "b/{}/o",
+            bucket,
+            delimiter=delimiter,
+            prefix=prefix or None,
+            maxResults=LISTING_PAGE_SIZE,
+            pageToken=page_token,
+            json_out=True,
+        )
+        entries = [
+            {
+                "name": f"{bucket}/{dir_prefix.rstrip('/')}",
+                "size": 0,
+                "type": "directory",
+            }
+            for dir_prefix in page.get("prefixes", [])
+        ]
+        entries.extend(
+            fs._process_object(bucket, item) for item in page.get("items", [])
+        )
+        yield entries
+        page_token = page.get("nextPageToken")
+        if page_token is None:
+            return
+
+
+async def _batched(items, size: int):
+    """Group the items of an async iterator into lists of up to `size`"""
+    batch = []
+    async for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _iter_async(fs: fsspec.AbstractFileSystem, pages) -> Iterator[Dict[str, Any]]:
+    """Yield the items of the pages produced by an async generator of an async
+    file system implementation, fetching the next page only when the items of
+    the current one are consumed"""
+    try:
+        while True:
+            try:
+                page = fsspec.asyn.sync(fs.loop, pages.__anext__)
+            except StopAsyncIteration:
+                return
+            yield from page
+    finally:
+        fsspec.asyn.sync(fs.loop, pages.aclose)
+
+
+def _listed_or_ls(
+    fs: fsspec.AbstractFileSystem, path: str, entries: Iterator[Dict[str, Any]]
+) -> Iterator[Dict[str, Any]]:
+    """Yield the entries listed under a prefix, except for the directory marker
+    of the prefix itself. If there are none, the path is a file, an empty
+    directory, or doesn't exist, and `ls` tells which."""
+    listed = False
+    for entry in entries:
+        listed = True
+        if entry["name"].rstrip("/") != path:
+            yield entry
+    if not listed:
+        yield from fs.ls(path, detail=True)
+
+
+# Key of the details of the directories that the file system doesn't list,
+# which are synthesized from the paths of the files (see _with_parent_dirs):
+# such directories don't exist on their own, and cease to exist with their
+# files
+SYNTHESIZED_KEY = "synthesized"
+
+# Number of the entries listed in a single request by the lazy listers
+LISTING_PAGE_SIZE = 1000
+
+# Listers that yield the details of the directory content as they are fetched,
+# per protocol, used instead of `ls` that returns the complete listing at once.
+# Listers raise an error when they are called, or when the first entry is
+# requested, if the path doesn't exist.
+LAZY_LISTERS: Dict[str, Lister] = {
+    "file": _scandir_lister,
+    "local": _scandir_lister,
+    "s3": _s3_lister,
+    "s3a": _s3_lister,
+    "gcs": _gcs_lister,
+    "gs": _gcs_lister,
+}
+
+# Listers that yield the details of all the files under a path (prefix) as
+# they are fetched, per protocol, used instead of `find` that returns the
+# complete listing at once (see FLAT_LISTING_PROTOCOLS)
+PREFIX_LISTERS: Dict[str, Lister] = {
+    "s3": _s3_prefix_lister,
+    "s3a": _s3_prefix_lister,
+    "gcs": _gcs_prefix_lister,
+    "gs": _gcs_prefix_lister,
+}
+
+
+def _mutated_paths(method: str, args, kwargs) -> List[str]:
+    """Guess the paths modified by a call to one of the MUTATING_METHODS, from
+    the arguments of the call. Globs are reduced to the directory in which
+    the matches are searched for."""
+    if method == "open":
+        mode = args[1] if len(args) > 1 else kwargs.get("mode", "rb")
+        if "r" in mode and "+" not in mode:
+            return []
+        args = args[:1]
+
+    paths = []
+    for arg in args[:2]:
+        for path in arg if isinstance(arg, list) else [arg]:
+            if isinstance(path, str):
+                paths.append(glob_root(path) if glob.escape(path) != path else path)
+    return paths
+
+
+def glob_root(globstr: str) -> str:
+    """Directory in which the glob matches are searched for"""
+    first_special_char = min(i for i in map(globstr.find, "*?[") if i >= 0)
+    return posixpath.dirname(globstr[:first_special_char])
+
+
 def get_current() -> FileSystemProxy:
     """Get the file system instance that corresponds to the currently active
     user configuration."""
-    fs_name = config.get().current_fs_name
-    if fs_name not in _fs_cache:
-        fs_impl = fsspec.filesystem(**config.get().current_fs_conf)
-        _fs_cache[fs_name] = FileSystemProxy(fs_impl)
-    return _fs_cache[fs_name]
+    return get(config.get().current_fs_name)
+
+
+def get(fs_name: str) -> FileSystemProxy:
+    """Get the instance of a configured file system, by its name. Waits for
+    the instance being created in another thread, if any."""
+    conf = config.get()
+    if fs_name not in conf.fs:
+        raise FatalError(f"'{fs_name}' is not a configured file system")
+    fs_config = (dict(conf.fs[fs_name]), conf.cache)
+    with _fs_cache_lock:
+        if fs_name not in _fs_cache or _fs_cache_configs.get(fs_name) != fs_config:
+            with profiling.phase("file system construction"):
+                fs_impl = fsspec.filesystem(**conf.fs[fs_name])
+            _fs_cache[fs_name] = FileSystemProxy(fs_impl, fs_name, get_metadata_cache())
+            _fs_cache_configs[fs_name] = fs_config
+        return _fs_cache[fs_name]
+
+
+@lru_cache(maxsize=1)
+def get_native() -> FileSystemProxy:
+    """Get the instance of the native local file system"""
+    return FileSystemProxy(fsspec.filesystem("file"), NATIVE_FS_NAME)
+
+
+def resolve(path_spec: str) -> Tuple[FileSystemProxy, str]:
+    """Resolve a path in a `[FSNAME:]PATH` form to a file system instance and
+    a path in it. FSNAME is the name of a configured file system, or 'local'
+    for the native local file system (unless a file system with this name is
+    configured). Paths without FSNAME are in the current file system."""
+    fs_name, sep, path = path_spec.partition(":")
+    if sep:
+        if fs_name in config.get().fs:
+            return get(fs_name), path
+        elif fs_name == NATIVE_FS_NAME:
+            return get_native(), path
+    return get_current(), path_spec
+
+
+def is_native(fs: FileSystemProxy) -> bool:
+    """Whether a file system is a native local file system"""
+    return bool({"file", "local"}.intersection(fs._protocols()))
+
+
+def iter_blocks(
+    fs: FileSystemProxy,
+    path: str,
+    start: int = 0,
+    end: Optional[int] = None,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+) -> Iterator[bytes]:
+    """Read the file content between start and end (or until the end of the
+    file, if end is None) with ranged reads, one block at a time. Unlike
+    opening a file, doesn't require an additional request to get its size."""
+    offset = start
+    while end is None or offset < end:
+        block_end = offset + block_size
+        if end is not None:
+            block_end = min(block_end, end)
+        block = fs.cat_file(path, start=offset, end=block_end)
+        if not block:
+            break
+        yield block
+        offset += len(block)
+
+
+def glob_details(fs: FileSystemProxy, globstr: str) -> Iterator[Dict[str, Any]]:
+    """Get the details of the paths matching a glob, in order. Most file
+    systems return the details along with the matches. Otherwise, the details
+    are requested concurrently for every match. Globs that match the names in
+    a single directory are matched as the directory is listed, if it can be
+    listed lazily (see iter_glob)."""
+    matches = iter_glob(fs, globstr)
+    if matches is not None:
+        return matches
+
+    try:
+        matches = fs.glob(globstr, detail=True)
+    except TypeError:
+        # some implementations don't accept the detail argument
+        matches = fs.glob(globstr)
+
+    if isinstance(matches, dict):
+        return iter(matches.values())
+    return parallel_map(fs.info, matches, GLOB_INFO_JOBS)
+
+
+def iter_glob(fs: FileSystemProxy, globstr: str) -> Optional[Iterator[Dict[str, Any]]]:
+    """Yield the details of the paths matching a glob as they are listed, if
+    the glob only has wildcards in its last component (e.g., /dir/*.txt), and
+    the file system can list the directory lazily (see LAZY_LISTERS). Returns
+    None otherwise."""
+    root = glob_root(fs._strip_protocol(globstr))
+    root_length = len(root)
+    pattern = fs._strip_protocol(globstr)[root_length:].lstrip("/")
+    if (
+        not root
+        or "/" in pattern
+        or "**" in pattern
+        or fs._lister(LAZY_LISTERS) is None
+    ):
+        return None
+
+    def matches() -> Iterator[Dict[str, Any]]:
+        try:
+            for entry in fs.iter_ls_or_info(root):
+                name = entry["name"].rstrip("/")
+                if posixpath.dirname(name) == root.rstrip("/") and fnmatch.fnmatchcase(
+                    posixpath.basename(name), pattern
+                ):
+                    yield entry
+        except FatalError:
+            # same as glob: no matches in a directory that doesn't exist
+            if fs.try_info(root) is not None:
+                raise
+
+    return matches()
+
+
+def iter_tree(
+    fs: FileSystemProxy,
+    path: str,
+    maxdepth: Optional[int] = None,
+    jobs: int = DEFAULT_WALK_JOBS,
+    refresh: bool = False,
+) -> Iterator[Dict[str, Any]]:
+    """Yield the details of all files and directories under a path (or of the
+    path itself, if it is a file), up to maxdepth levels deep, as they are
+    found. Directories are listed concurrently, in up to `jobs` requests at a
+    time, unless the file system can list all the content of a path at once
+    (see FLAT_LISTING_PROTOCOLS), in which case the content is listed page by
+    page if possible (see PREFIX_LISTERS), and otherwise `find` fetches the
+    whole listing before the first entry is yielded. With maxdepth, the
+    directories are always listed one by one, so that the content deeper
+    than maxdepth is not listed. The order of the entries is not defined.
+    With `refresh`, the cached metadata is not used (see
+    FileSystemProxy._with_cache)."""
+    root = fs._strip_protocol(path)
+    if maxdepth is None and FLAT_LISTING_PROTOCOLS.intersection(fs._protocols()):
+        files = fs.iter_prefix(root)
+        if files is not None:
+            yield from _with_parent_dirs(fs, root, files)
+        else:
+            yield from fs.find(root, withdirs=True, detail=True).values()
+        return
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        # directories to list, listed depth-first to bound the memory usage
+        pending = [(root, 1)]
+        running = {}
+        try:
+            while pending or running:
+                while pending and len(running) < jobs:
+                    dir_path, depth = pending.pop()
+                    future = executor.submit(fs.ls_or_info, dir_path, refresh)
+                    running[future] = (dir_path, depth)
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    dir_path, depth = running.pop(future)
+                    for entry in future.result():
+                        is_dir = entry.get("type") == "directory"
+                        if is_dir and entry["name"].rstrip("/") == dir_path.rstrip("/"):
+                            # some implementations list the directory itself
+                            continue
+                        yield entry
+                        if is_dir and (maxdepth is None or depth < maxdepth):
+                            pending.append((entry["name"], depth + 1))
+        finally:
+            for future in running:
+                future.cancel()
+
+
+def _with_parent_dirs(
+    fs: FileSystemProxy, root: str, files: Iterator[Dict[str, Any]]
+) -> Iterator[Dict[str, Any]]:
+    """Yield the files listed under a root, each preceded by the directories
+    it is in that are not yielded yet, which the object stores don't list
+    (same as `find` with `withdirs`), unless there is a directory marker.
+    Such directories are marked with SYNTHESIZED_KEY. Only the paths of the
+    directories are held in memory. If nothing is listed, the root is a file,
+    an empty directory, or doesn't exist, and `find` tells which."""
+    root = root.rstrip("/")
+    root_length = len(root) + 1 if root else 0
+    seen_dirs: Set[str] = set()
+    listed = False
+    for file_info in files:
+        listed = True
+        name = file_info["name"].rstrip("/")
+        if name == root:
+            continue
+        # directory markers are listed as files with a trailing slash, and
+        # before the content of their directories
+        is_dir = file_info.get("type") == "directory" or file_info["name"].endswith("/")
+        relparts = name[root_length:].split("/")
+        for depth in range(1, len(relparts)):
+            dir_path = posixpath.join(root, *relparts[:depth])
+            if dir_path not in seen_dirs:
+                seen_dirs.add(dir_path)
+                yield {
+                    "name": dir_path,
+                    "size": 0,
+                    "type": "directory",
+                    SYNTHESIZED_KEY: True,
+                }
+        if not is_dir:
+            yield file_info
+        elif name not in seen_dirs:
+            seen_dirs.add(name)
+            yield {**file_info, "name": name, "type": "directory"}
+
+    if not listed:
+        yield from fs.find(root, withdirs=True, detail=True).values()
 
 
 def get_mtime(file_info: Dict[str, Any]) -> Optional[datetime]:
@@ -0,0 +1,306 @@
+"""
+Instrumentation of the calls to the file system implementations. Every call
+made through a FileSystemProxy is timed and reported to the registered
+recorders (e.g., CallStats, which aggregates the statistics of the calls made
+by a command). Calls are only instrumented while there are recorders, and
+cost nothing otherwise.
+
+The bytes read and written are only counted for the BYTES_COUNTED_METHODS. A
+call to `open` is reported once the file is closed, with the bytes read from
+or written to the file, and the time spent doing so.
+"""
+
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from functools import wraps
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# Methods which calls are counted with the bytes they read or write: the
+# content returned or passed (cat_file, pipe_file), the size of the local file
+# (get_file, put_file), or the bytes read from or written to an opened file
+BYTES_COUNTED_METHODS = {
+    "cat",
+    "cat_file",
+    "pipe",
+    "pipe_file",
+    "get_file",
+    "put_file",
+    "open",
+}
+
+
+@dataclass
+class Call:
+    """A completed call to a file system implementation"""
+
+    method: str
+    paths: List[str]
+    thread_id: int
+    start: float  # seconds since the epoch
+    duration: float  # seconds
+    bytes_read: int = 0  # only counted for the BYTES_COUNTED_METHODS
+    bytes_written: int = 0
+    error: Optional[str] = None  # the class name of the raised exception
+
+
+Recorder = Callable[[Call], None]
+
+_recorders: List[Recorder] = []
+
+
+def add_recorder(recorder: Recorder):
+    """Report the calls made from now on to a recorder"""
+    _recorders.append(recorder)
+
+
+def remove_recorder(recorder: Recorder):
+    _recorders.remove(recorder)
+
+
+def instrumented(fn):
+    """Wraps a function of a file system implementation, to report its calls
+    to the recorders. Returns the function itself if there are no
+    recorders."""
+    if not _recorders:
+        return fn
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        call = Call(
+            method=fn.__name__,
+            paths=_paths(args, kwargs),
+            thread_id=threading.get_ident(),
+            start=time.time(),
+            duration=0.0,
+        )
+        started = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as err:
+            call.duration = time.perf_counter() - started
+            call.error = type(err).__name__
+            _report(call)
+            raise
+        call.duration = time.perf_counter() - started
+
+        if call.method == "open":
+            return _InstrumentedFile(result, call)
+        call.bytes_read, call.bytes_written = _transferred_bytes(
+            call.method, args, kwargs, result
+        )
+        _report(call)
+        return result
+
+    return wrapper
+
+
+class _InstrumentedFile:
+    """Wraps a file returned by `open`, to count the bytes read from or
+    written to it, and the time spent doing so (including flushing the writes
+    when the file is closed). The call to `open` is reported once the file is
+    closed."""
+
+    def __init__(self, file, call: Call):
+        self._file = file
+        self._call = call
+        self._reported = False
+
+    def __getattr__(self, name: str):
+        return getattr(self._file, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __iter__(self):
+        while True:
+            line = self.readline()
+            if not line:
+                return
+            yield line
+
+    def read(self, *args, **kwargs):
+        data = self._timed(self._file.read, *args, **kwargs)
+        self._call.bytes_read += len(data)
+        return data
+
+    def readline(self, *args, **kwargs):
+        line = self._timed(self._file.readline, *args, **kwargs)
+        self._call.bytes_read += len(line)
+        return line
+
+    def readinto(self, buffer):
+        count = self._timed(self._file.readinto, buffer)
+        self._call.bytes_read += count or 0
+        return count
+
+    def write(self, data):
+        count = self._timed(self._file.write, data)
+        self._call.bytes_written += len(data)
+        return count
+
+    def close(self):
+        try:
+            self._timed(self._file.close)
+        finally:
+            if not self._reported:
+                self._reported = True
+                _report(self._call)
+
+    def _timed(self, fn, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        except BaseException as err:
+            self._call.error = self._call.error or type(err).__name__
+            raise
+        finally:
+            self._call.duration += time.perf_counter() - started
+
+
+def instrumented_iter(
+    method: str, paths: List[str], fn: Callable[[], Iterator[T]]
+) -> Iterator[T]:
+    """Instruments a call that yields its results lazily (e.g., a lazy
+    listing of a directory) as a single call, which lasts as long as it takes
+    to produce the items (but not to consume them)"""
+    if not _recorders:
+        yield from fn()
+        return
+
+    start = time.time()
+    duration = 0.0
+    error = None
+    items: Optional[Iterator[T]] = None
+    try:
+        while True:
+            started = time.perf_counter()
+            try:
+                if items is None:
+                    items = fn()
+                item = next(items)
+            except StopIteration:
+                return
+            except BaseException as err:
+                error = type(err).__name__
+                raise
+            finally:
+                duration += time.perf_counter() - started
+            yield item
+    finally:
+        thread_id = threading.get_ident()
+        _report(Call(method, paths, thread_id, start, duration, error=error))
+
+
+def _report(call: Call):
+    for recorder in list(_recorders):
+        recorder(call)
+
+
+def _paths(args, kwargs) -> List[str]:
+    """Guess the paths a function is called with, from its arguments"""
+    paths = []
+    for value in list(args) + list(kwargs.values()):
+        if isinstance(value, str):
+            paths.append(value)
+        elif isinstance(value, (list, tuple)):
+            paths.extend(item for item in value if isinstance(item, str))
+    return paths
+
+
+def _transferred_bytes(method: str, args, kwargs, result: Any) -> Tuple[int, int]:
+    """Bytes read and written by a call, or 0 if they are not counted for the
+    method (see BYTES_COUNTED_METHODS)"""
+    if method not in BYTES_COUNTED_METHODS:
+        return 0, 0
+    if method == "get_file":
+        return _local_size(kwargs.get("lpath", args[1] if len(args) > 1 else None)), 0
+    if method == "put_file":
+        return 0, _local_size(kwargs.get("lpath", args[0] if args else None))
+    written = sum(_content_size(arg) for arg in list(args) + list(kwargs.values()))
+    return _content_size(result), written
+
+
+def _local_size(path: Any) -> int:
+    try:
+        return os.path.getsize(path)
+    except (OSError, TypeError):
+        return 0
+
+
+def _content_size(value: Any) -> int:
+    """Size of the file content returned by, or passed to a function (e.g.,
+    cat_file, pipe_file), or 0 if the value is not the file content"""
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(len(v) for v in value.values() if isinstance(v, bytes))
+    return 0
+
+
+@dataclass
+class MethodStats:
+    """Statistics of the calls to one method"""
+
+    calls: int = 0
+    errors: int = 0
+    bytes_read: int = 0
+    bytes_written: int = 0
+    durations: List[float] = field(default_factory=list)
+
+    @property
+    def total(self) -> float:
+        return sum(self.durations)
+
+    def percentile(self, p: int) -> float:
+        """Duration that p% of the calls don't exceed (nearest rank)"""
+        durations = sorted(self.durations)
+        rank = max(-(-len(durations) * p // 100), 1)  # ceil division
+        return durations[rank - 1]
+
+
+class CallStats:
+    """A recorder that aggregates the statistics of the calls, per method"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.methods: Dict[str, MethodStats] = {}
+
+    def __call__(self, call: Call):
+        with self._lock:
+            stats = self.methods.setdefault(call.method, MethodStats())
+            stats.calls += 1
+            stats.errors += call.error is not None
+            stats.bytes_read += call.bytes_read
+            stats.bytes_written += call.bytes_written
+            stats.durations.append(call.duration)
+
+    def to_dict(self) -> Dict[str, Dict[str, Any]]:
+        """Statistics per method, with the durations in milliseconds, the
+        slowest methods first. The bytes are None for the methods they are
+        not counted for (see BYTES_COUNTED_METHODS)."""
+        with self._lock:
+            methods = sorted(self.methods.items(), key=lambda item: -item[1].total)
+            return {
+                method: {
+                    "calls": stats.calls,
+                    "errors": stats.errors,
+                    "total_ms": round(stats.total * 1000, 3),
+                    "p50_ms": round(stats.percentile(50) * 1000, 3),
+                    "p95_ms": round(stats.percentile(95) * 1000, 3),
+                    "max_ms": round(max(stats.durations) * 1000, 3),
+                    "bytes_read": _counted(method, stats.bytes_read),
+                    "bytes_written": _counted(method, stats.bytes_written),
+                }
+                for method, stats in methods
+            }
+
+
+def _counted(method: str, size: int) -> Optional[int]:
+    return size if method in BYTES_COUNTED_METHODS else None
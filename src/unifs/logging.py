@@ -1,16 +1,20 @@
 """
 Although this is a command-line application, it may need to log to files in
-some special cases (e.g., an unexpected exception), even if not in a
-traditional sense of logging. This module provides means of logging for such
-situations.
+some special cases (e.g., an unexpected exception, or a trace of the calls to
+the file system), even if not in a traditional sense of logging. This module
+provides means of logging for such situations.
 """
 
+import json
 import os
+import threading
 import traceback
 from datetime import datetime
 
 from appdirs import user_data_dir
 
+from .instrumentation import BYTES_COUNTED_METHODS, Call
+
 
 def log_exception(comment: str):
     """Log the exception that is currently being handled to the "error.log"
@@ -32,3 +36,39 @@ def _log_exception(comment: str, log_file_path: str):
         # using 'traceback' because configuring 'logigng' seems to be an overkill
         traceback.print_exc(file=log_file)
         log_file.write("-- END OF THE ERROR MESSAGE --\n")
+
+
+class TraceWriter:
+    """A recorder of the calls to the file system (see instrumentation) that
+    writes every call to a file as a trace event, one per line. The file is
+    in the Chrome trace event format (JSON array format, where the closing
+    bracket is optional), and can be opened with chrome://tracing or
+    Perfetto to see the concurrent calls on a timeline."""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._file = open(path, "w")
+        self._file.write("[\n")
+
+    def __call__(self, call: Call):
+        event = {
+            "name": call.method,
+            "cat": "fs",
+            "ph": "X",  # a complete event, with a duration
+            "ts": round(call.start * 1e6),  # microseconds
+            "dur": round(call.duration * 1e6),
+            "pid": os.getpid(),
+            "tid": call.thread_id,
+            "args": {"paths": call.paths, "outcome": call.error or "ok"},
+        }
+        if call.method in BYTES_COUNTED_METHODS:
+            event["args"]["bytes_read"] = call.bytes_read
+            event["args"]["bytes_written"] = call.bytes_written
+        line = json.dumps(event)
+        with self._lock:
+            self._file.write(line + ",\n")
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
@@ -0,0 +1,106 @@
+"""
+Profiling of the commands (see the --profile option). A command is executed
+under cProfile, and the wall-clock time of its phases is measured too (see
+`phase`): loading the configuration, creating the file system, and calling
+the file system, while the rest is spent processing and rendering the output.
+The phases help to interpret the profile of the commands that wait for the
+back-end, most of which cProfile doesn't see: it only profiles the main
+thread, and only counts the CPU time of the functions.
+"""
+
+import cProfile
+import io
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from .instrumentation import Call
+
+# Number of the functions with the most cumulative time printed in a report
+TOP_FUNCTIONS = 20
+
+# Phase of a command made of the calls to the file system
+BACKEND_PHASE = "backend I/O (all threads)"
+
+
+class Profile:
+    """Profile of a command. Also a recorder of the calls to the file system
+    (see instrumentation), which are counted in the BACKEND_PHASE."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._profiler = cProfile.Profile()
+        self._started = time.perf_counter()
+        self.phases: Dict[str, float] = {}  # seconds
+
+    def start(self):
+        self._profiler.enable()
+
+    def add_phase(self, name: str, duration: float):
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + duration
+
+    def __call__(self, call: Call):
+        self.add_phase(BACKEND_PHASE, call.duration)
+
+    def stop(self, output_path: Optional[str] = None) -> str:
+        """Stop profiling, and save the profile to a file in the pstats format,
+        if a path is given. Returns a report of the phases and of the
+        functions with the most cumulative time."""
+        self._profiler.disable()
+        total = time.perf_counter() - self._started
+        if output_path is not None:
+            self._profiler.dump_stats(output_path)
+
+        with self._lock:
+            phases = dict(self.phases)
+        # the calls to the file system may be concurrent, and take longer
+        # than the command itself
+        other = max(total - sum(phases.values()), 0.0)
+        lines = ["Phases (wall-clock time):"]
+        for name, duration in phases.items():
+            lines.append(f"  {name}: {duration * 1000:.1f}ms")
+        lines.append(f"  other (processing, rendering): {other * 1000:.1f}ms")
+        lines.append(f"  total: {total * 1000:.1f}ms")
+
+        stream = io.StringIO()
+        stats = pstats.Stats(self._profiler, stream=stream)
+        stats.sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+        return "\n".join(lines) + "\n" + stream.getvalue()
+
+
+_active: Optional[Profile] = None
+
+
+def start() -> Profile:
+    """Start profiling the current command"""
+    global _active
+    _active = Profile()
+    _active.start()
+    return _active
+
+
+def stop(output_path: Optional[str] = None) -> str:
+    """Stop profiling the current command. See Profile.stop."""
+    global _active
+    profile, _active = _active, None
+    if profile is None:
+        return ""
+    return profile.stop(output_path)
+
+
+@contextmanager
+def phase(name: str):
+    """Measure the wall-clock time of a phase of the command, if profiling"""
+    profile = _active
+    if profile is None:
+        yield
+        return
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add_phase(name, time.perf_counter() - started)
@@ -0,0 +1,216 @@
+"""
+Incremental synchronization of a directory tree to another one, possibly in
+another file system. Both trees are listed in the same order, and the listings
+are merged as they are fetched, so that only the files that are missing or
+changed in the destination are copied, without holding the listings in memory.
+"""
+
+import posixpath
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from . import checksum, deletion, transfer
+from .file_system import FileSystemProxy, get_mtime
+from .transfer import TransferStats
+from .util import parallel_map
+
+# Path of a file relative to the synchronized directory, as a tuple of the
+# path components: tuples sort the same way as the directories are walked
+RelPath = Tuple[str, ...]
+
+FileEntry = Tuple[RelPath, Dict[str, Any]]
+
+
+def sync_tree(
+    src_fs: FileSystemProxy,
+    src_dir: str,
+    dst_fs: FileSystemProxy,
+    dst_dir: str,
+    jobs: int,
+    delete: bool = False,
+) -> Tuple[TransferStats, Optional[deletion.DeletionStats]]:
+    """Copy the files of the source directory that are missing in the
+    destination directory or differ from its files (see `is_changed`), with
+    up to `jobs` concurrent copies. With `delete`, also delete the files of
+    the destination that are missing in the source. The files which paths
+    resolve outside the destination directory are rejected (see
+    transfer.escapes_root)."""
+    stats = TransferStats()
+    to_delete: List[Dict[str, Any]] = []
+    dst_root = dst_fs._strip_protocol(dst_dir).rstrip("/")
+
+    src_files = iter_sorted_files(src_fs, src_dir, jobs)
+    if dst_fs.try_info(dst_root, refresh=True) is not None:
+        dst_files = iter_sorted_files(dst_fs, dst_root, jobs)
+    else:
+        dst_files = iter([])
+
+    def changed_files() -> Iterator[Tuple[Dict[str, Any], str]]:
+        for relpath, src_info, dst_info in merge(src_files, dst_files):
+            if src_info is None:
+                if delete:
+                    to_delete.append(dst_info)
+            elif transfer.escapes_root("/".join(relpath)):
+                stats.rejected.append(src_info["name"])
+            elif dst_info is None or is_changed(src_fs, src_info, dst_fs, dst_info):
+                yield src_info, posixpath.join(dst_root, *relpath)
+            else:
+                stats.add(None)
+
+    created_dirs = set()
+    created_dirs_lock = threading.Lock()
+
+    def copy(item: Tuple[Dict[str, Any], str]) -> int:
+        src_info, dst_path = item
+        parent = posixpath.dirname(dst_path)
+        with created_dirs_lock:
+            create_parent = parent not in created_dirs
+            created_dirs.add(parent)
+        if create_parent:
+            dst_fs.makedirs(parent, exist_ok=True)
+        size = src_info.get("size")
+        transfer.copy_file(src_fs, src_info["name"], dst_fs, dst_path, size)
+        return size or 0
+
+    for size in parallel_map(copy, changed_files(), jobs):
+        stats.add(size)
+
+    deletion_stats = None
+    if delete:
+        deletion_stats = deletion.delete(dst_fs, to_delete, jobs)
+    return stats, deletion_stats
+
+
+def merge(
+    src_files: Iterator[FileEntry], dst_files: Iterator[FileEntry]
+) -> Iterator[Tuple[RelPath, Optional[Dict[str, Any]], Optional[Dict[str, Any]]]]:
+    """Merge two sorted listings. Yields the relative paths with the details
+    of the files in the source and in the destination, or None if a file is
+    missing on either side."""
+    src_entry = next(src_files, None)
+    dst_entry = next(dst_files, None)
+    while src_entry is not None or dst_entry is not None:
+        if dst_entry is None or (src_entry is not None and src_entry[0] < dst_entry[0]):
+            yield src_entry[0], src_entry[1], None
+            src_entry = next(src_files, None)
+        elif src_entry is None or dst_entry[0] < src_entry[0]:
+            yield dst_entry[0], None, dst_entry[1]
+            dst_entry = next(dst_files, None)
+        else:
+            yield src_entry[0], src_entry[1], dst_entry[1]
+            src_entry = next(src_files, None)
+            dst_entry = next(dst_files, None)
+
+
+def is_changed(
+    src_fs: FileSystemProxy,
+    src_info: Dict[str, Any],
+    dst_fs: FileSystemProxy,
+    dst_info: Dict[str, Any],
+) -> bool:
+    """Whether a file in the destination differs from the file in the source.
+    Checksums of the content are compared if both file systems use the same
+    protocol and report one of the same algorithm (see
+    checksum.server_checksum, which ignores the ETags that are not checksums
+    of the content, e.g., of the files uploaded in multiple parts).
+    Otherwise, a file differs if its size is different, or if the source file
+    was modified after the destination file."""
+    if src_info.get("size") != dst_info.get("size"):
+        return True
+
+    if src_fs._protocols() == dst_fs._protocols():
+        for algorithm in checksum.ALGORITHMS:
+            src_checksum = checksum.server_checksum(src_info, algorithm)
+            dst_checksum = checksum.server_checksum(dst_info, algorithm)
+            if src_checksum is not None and dst_checksum is not None:
+                return src_checksum != dst_checksum
+
+    src_mtime = get_mtime(src_info)
+    dst_mtime = get_mtime(dst_info)
+    if src_mtime is None or dst_mtime is None:
+        return False
+    # timestamps allow to compare the naive (local) and the aware datetimes
+    return src_mtime.timestamp() > dst_mtime.timestamp()
+
+
+def iter_sorted_files(fs: FileSystemProxy, root: str, jobs: int) -> Iterator[FileEntry]:
+    """Yield the files under a directory, sorted by their relative paths.
+    Directories are walked depth-first, one listing at a time, including on
+    the file systems that can list all the content of a path at once (e.g.,
+    S3), which would need to hold and sort the whole listing in memory. The
+    next directories to walk are listed ahead, concurrently, in up to `jobs`
+    requests at a time, and at most 2 * `jobs` listings are held ahead of the
+    walk, which bounds the memory usage."""
+    root = fs._strip_protocol(root).rstrip("/")
+
+    def list_dir(path: str) -> List[Dict[str, Any]]:
+        entries = [
+            entry
+            for entry in fs.ls(path, detail=True, refresh=True)
+            if entry["name"].rstrip("/") != path.rstrip("/")
+        ]
+        return sorted(entries, key=lambda entry: _basename(entry["name"]))
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        listings = _Listings(executor, list_dir, 2 * jobs)
+        try:
+            yield from _walk_sorted(listings, root, ())
+        finally:
+            listings.cancel()
+
+
+class _Listings:
+    """Listings of the directories, fetched ahead of the walk in an executor.
+    At most `limit` listings are pending or fetched and not walked yet."""
+
+    def __init__(self, executor: ThreadPoolExecutor, list_dir, limit: int):
+        self._executor = executor
+        self._list_dir = list_dir
+        self._limit = limit
+        self._pending: Dict[str, Future] = {}
+
+    def prefetch(self, paths: List[str], start: int = 0):
+        """List the directories ahead, in order from `start`, unless the limit
+        is reached"""
+        end = start + self._limit
+        for path in paths[start:end]:
+            if len(self._pending) >= self._limit:
+                return
+            if path not in self._pending:
+                self._pending[path] = self._executor.submit(self._list_dir, path)
+
+    def get(self, path: str) -> List[Dict[str, Any]]:
+        """Get the listing of a directory, fetched ahead or fetched now"""
+        future = self._pending.pop(path, None)
+        if future is None:
+            return self._list_dir(path)
+        return future.result()
+
+    def cancel(self):
+        for future in self._pending.values():
+            future.cancel()
+
+
+def _walk_sorted(
+    listings: _Listings, path: str, relpath: RelPath
+) -> Iterator[FileEntry]:
+    entries = listings.get(path)
+    subdirs = [entry["name"] for entry in entries if entry.get("type") == "directory"]
+    # list the subdirectories ahead, while the files are being yielded
+    listings.prefetch(subdirs)
+    walked_subdirs = 0
+    for entry in entries:
+        entry_relpath = relpath + (_basename(entry["name"]),)
+        if entry.get("type") == "directory":
+            # the walk of the previous subdirectory may have made room for
+            # the next ones
+            listings.prefetch(subdirs, walked_subdirs)
+            walked_subdirs += 1
+            yield from _walk_sorted(listings, entry["name"], entry_relpath)
+        else:
+            yield entry_relpath, entry
+
+
+def _basename(path: str) -> str:
+    return posixpath.basename(path.rstrip("/"))
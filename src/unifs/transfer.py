@@ -0,0 +1,647 @@
+"""
+Bulk data transfers between the native local file system and the file system
+in use, or between any two file systems. Transfers are executed concurrently,
+file by file, and may record their progress to a checkpoint, so that they can
+be resumed if interrupted.
+"""
+
+import hashlib
+import inspect
+import os
+import posixpath
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+from . import checksum
+from .checkpoint import Checkpoint, local_fingerprint, remote_fingerprint
+from .exceptions import FatalError
+from .file_system import (
+    DEFAULT_BLOCK_SIZE,
+    FileSystemProxy,
+    is_native,
+    iter_blocks,
+    iter_tree,
+)
+from .util import humanize_bytes, parallel_map, read_ahead
+
+# Minimal size of a segment in a segmented download, so that small files are
+# not split into many tiny ranged reads
+MIN_SEGMENT_SIZE = 8 * 1024 * 1024
+
+# Number of blocks read ahead when streaming a file between two file systems,
+# which bounds the memory used by a copy
+READ_AHEAD_BLOCKS = 4
+
+# Number of times a file is transferred before giving up, if its checksum
+# doesn't match the checksum reported by the file system
+VERIFY_ATTEMPTS = 3
+
+# Options of put_file that set the size of the parts of a multipart upload,
+# and the number of the parts uploaded concurrently (e.g., in s3fs, adlfs),
+# passed if the implementation accepts them (see _put_file_options)
+PUT_FILE_PART_SIZE_OPTION = "chunksize"
+PUT_FILE_CONCURRENCY_OPTION = "max_concurrency"
+
+# Checksum computed while uploading a file, to compare with the checksum
+# reported by the file system afterwards (e.g., an ETag of S3, md5Hash of GCS)
+UPLOAD_CHECKSUM_ALGORITHM = "md5"
+
+
+class ChecksumMismatchError(FatalError):
+    """A file transferred VERIFY_ATTEMPTS times never matched the checksum
+    reported by the file system"""
+
+    def __init__(self, path: str):
+        super().__init__(f"Checksum mismatch: {path}")
+        self.path = path
+
+
+@dataclass
+class TransferStats:
+    """Aggregated statistics of a transfer"""
+
+    files: int = 0
+    bytes: int = 0
+    skipped: int = 0
+    unverified: int = 0
+    failed: List[str] = field(default_factory=list)  # checksum mismatches
+    # files which paths resolve outside the destination (see escapes_root)
+    rejected: List[str] = field(default_factory=list)
+    started: float = field(default_factory=time.monotonic)
+
+    def add(self, size: Optional[int]):
+        """Count a transferred file, or a skipped one if the size is None"""
+        if size is None:
+            self.skipped += 1
+        else:
+            self.files += 1
+            self.bytes += size
+
+    def summary(self, verb: str) -> str:
+        """Human-readable summary, e.g. 'Downloaded 3 files (1.5KB) in ...'"""
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        rate = humanize_bytes(self.bytes / elapsed)
+        summary = (
+            f"{verb} {self.files} files ({humanize_bytes(self.bytes)}) "
+            f"in {elapsed:.1f}s ({rate}/s)"
+        )
+        if self.skipped:
+            summary += f", skipped {self.skipped} files transferred previously"
+        if self.unverified:
+            summary += (
+                f", {self.unverified} files not verified (the file system "
+                "reports no checksum that can be computed)"
+            )
+        if self.failed:
+            summary += f", {len(self.failed)} files failed the verification"
+        if self.rejected:
+            summary += (
+                f", rejected {len(self.rejected)} files with paths outside "
+                "the destination"
+            )
+        return summary
+
+    def raise_if_failed(self):
+        """Fail after a transfer if some files failed the verification, or
+        were rejected. Raised once all the other files are transferred (e.g.,
+        within a checkpoint, so that their progress is kept)."""
+        if self.failed:
+            raise FatalError(f"Checksum mismatch: {', '.join(self.failed)}")
+        if self.rejected:
+            paths = ", ".join(self.rejected)
+            raise FatalError(
+                f"Paths outside the destination (not transferred): {paths}"
+            )
+
+
+def escapes_root(relpath: str) -> bool:
+    """Whether a path relative to a directory resolves outside of it. Object
+    stores don't resolve the ".." in the keys (e.g., "dir/../../file" is a
+    valid key under "dir"), and such files must not be transferred, or a
+    hostile bucket could overwrite any file of the user."""
+    depth = 0
+    for part in relpath.split("/"):
+        if part == "..":
+            depth -= 1
+            if depth < 0:
+                return True
+        elif part not in ("", "."):
+            depth += 1
+    return False
+
+
+def local_file_path(remote_path: str, local_path: str) -> str:
+    """Local path of a file to download: same as `local_path`, unless it is
+    a directory, in which case the file is downloaded into it"""
+    if os.path.isdir(local_path):
+        return os.path.join(local_path, posixpath.basename(remote_path.rstrip("/")))
+    return local_path
+
+
+def download_file(
+    fs: FileSystemProxy,
+    remote_path: str,
+    local_path: str,
+    checkpoint: Checkpoint,
+    verify: bool = False,
+) -> TransferStats:
+    """Download a single file. Continues a partial download recorded in the
+    checkpoint. With `verify`, see `_download_file`."""
+    stats = TransferStats()
+    file_info = fs.info(remote_path, refresh=True)
+    key = posixpath.basename(remote_path)
+    size = _download_file(
+        fs, remote_path, local_path, file_info, checkpoint, key, verify
+    )
+    _add_verified(stats, size, file_info, verify)
+    return stats
+
+
+def download_tree(
+    fs: FileSystemProxy,
+    remote_dir: str,
+    local_dir: str,
+    jobs: int,
+    checkpoint: Checkpoint,
+    verify: bool = False,
+) -> TransferStats:
+    """Download the content of a remote directory to a local directory, with
+    up to `jobs` concurrent downloads. Local directories are created before
+    any file is downloaded. Skips the files already downloaded, and continues
+    partial downloads recorded in the checkpoint. The files which paths
+    resolve outside the local directory are rejected (see escapes_root).
+    With `verify`, see `_download_file`."""
+    stats = TransferStats()
+    root = fs._strip_protocol(remote_dir).rstrip("/")
+
+    files = []
+    os.makedirs(local_dir, exist_ok=True)
+    for path, file_info in sorted(fs.find(root, withdirs=True, detail=True).items()):
+        relpath = posixpath.relpath(path, root)
+        if escapes_root(relpath):
+            if file_info.get("type") != "directory":
+                stats.rejected.append(path)
+            continue
+        local_path = _local_path(local_dir, relpath)
+        if file_info.get("type") == "directory":
+            os.makedirs(local_path, exist_ok=True)
+        else:
+            # not all file systems list directories explicitly
+            os.makedirs(os.path.dirname(local_path), exist_ok=True)
+            files.append((relpath, path, local_path, file_info))
+
+    def download(
+        item: Tuple[str, str, str, Dict[str, Any]]
+    ) -> Union[int, None, ChecksumMismatchError]:
+        relpath, path, local_path, file_info = item
+        try:
+            return _download_file(
+                fs, path, local_path, file_info, checkpoint, relpath, verify
+            )
+        except ChecksumMismatchError as err:
+            # the other files are still downloaded, and this one is not
+            # marked as done in the checkpoint
+            return err
+
+    for (_, _, _, file_info), size in zip(files, parallel_map(download, files, jobs)):
+        if isinstance(size, ChecksumMismatchError):
+            stats.failed.append(size.path)
+        else:
+            _add_verified(stats, size, file_info, verify)
+
+    return stats
+
+
+def _download_file(
+    fs: FileSystemProxy,
+    remote_path: str,
+    local_path: str,
+    file_info: Dict[str, Any],
+    checkpoint: Checkpoint,
+    key: str,
+    verify: bool = False,
+) -> Optional[int]:
+    """Download a file block by block, recording the progress to the
+    checkpoint. Returns the size of the file, or None if it was downloaded
+    previously. With `verify`, the blocks are hashed as they are downloaded,
+    and the file is downloaded again if the checksum doesn't match the one
+    reported by the file system (if any)."""
+    fingerprint = remote_fingerprint(file_info)
+    if checkpoint.begin(key, fingerprint):
+        return None
+
+    if not checkpoint.persistent and not verify:
+        # nothing to record, and the file system may download a file faster
+        # than the ranged reads
+        fs.get_file(remote_path, local_path)
+        checkpoint.mark_done(key)
+        return _local_size(local_path)
+
+    expected = _reported_checksum(file_info) if verify else None
+    size = file_info.get("size")
+    for _ in range(VERIFY_ATTEMPTS):
+        offset = checkpoint.resume_offset(key)
+        if offset > 0 and _local_size(local_path) < offset:
+            checkpoint.reset(key, fingerprint)
+            offset = 0
+
+        hasher = None
+        if expected is not None:
+            hasher = checksum.new_hasher(expected[0])
+            if offset > 0:
+                # the part downloaded previously is only available locally
+                _hash_local(hasher, local_path, offset)
+
+        with open(local_path, "r+b" if offset > 0 else "wb") as f:
+            f.truncate(offset)
+            f.seek(offset)
+            for block in iter_blocks(fs, remote_path, offset, size):
+                f.write(block)
+                f.flush()
+                if hasher is not None:
+                    hasher.update(block)
+                checkpoint.add_range(key, offset, offset + len(block))
+                offset += len(block)
+
+        if hasher is None or hasher.hexdigest() == expected[1]:
+            checkpoint.mark_done(key)
+            return offset
+        checkpoint.reset(key, fingerprint)
+
+    raise ChecksumMismatchError(remote_path)
+
+
+def _reported_checksum(file_info: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+    """Algorithm and value of a checksum reported by the file system in the
+    file details, if any, and if it can be computed"""
+    for algorithm in checksum.ALGORITHMS:
+        value = checksum.server_checksum(file_info, algorithm)
+        if value is not None and checksum.is_available(algorithm):
+            return algorithm, value
+    return None
+
+
+def _hash_local(hasher, local_path: str, end: int):
+    """Hash the first `end` bytes of a local file"""
+    with open(local_path, "rb") as f:
+        while f.tell() < end:
+            block = f.read(min(DEFAULT_BLOCK_SIZE, end - f.tell()))
+            if not block:
+                break
+            hasher.update(block)
+
+
+def _add_verified(
+    stats: TransferStats, size: Optional[int], file_info: Dict[str, Any], verify: bool
+):
+    """Count a downloaded file, and whether it could be verified"""
+    stats.add(size)
+    if verify and size is not None and _reported_checksum(file_info) is None:
+        stats.unverified += 1
+
+
+def download_segmented(
+    fs: FileSystemProxy,
+    remote_path: str,
+    local_path: str,
+    segments: int,
+    checkpoint: Checkpoint,
+) -> TransferStats:
+    """Download a single file by fetching up to `segments` byte ranges of it
+    concurrently. The local file is preallocated and each segment is written
+    in place. Segments are never smaller than MIN_SEGMENT_SIZE. Continues the
+    segments partially downloaded previously, as recorded in the
+    checkpoint."""
+    stats = TransferStats()
+    file_info = fs.info(remote_path, refresh=True)
+    size = file_info["size"]
+    key = posixpath.basename(remote_path)
+
+    fingerprint = remote_fingerprint(file_info)
+    if checkpoint.begin(key, fingerprint):
+        stats.add(None)
+        return stats
+
+    if _local_size(local_path) != size:
+        checkpoint.reset(key, fingerprint)
+        with open(local_path, "wb") as f:
+            f.truncate(size)
+
+    segment_size = max(MIN_SEGMENT_SIZE, -(-size // segments))  # ceil division
+    ranges = [
+        (start, min(start + segment_size, size))
+        for start in range(0, size, segment_size)
+    ]
+
+    def download(segment: Tuple[int, int]):
+        start, end = segment
+        offset = checkpoint.resume_offset(key, start)
+        with open(local_path, "r+b") as f:
+            for block in iter_blocks(fs, remote_path, offset, end):
+                _write_at(f, offset, block)
+                checkpoint.add_range(key, offset, offset + len(block))
+                offset += len(block)
+
+    for _ in parallel_map(download, ranges, len(ranges) or 1):
+        pass
+
+    checkpoint.mark_done(key)
+    stats.add(size)
+    return stats
+
+
+def _write_at(f, offset: int, data: bytes):
+    """Positional write to a local file"""
+    if hasattr(os, "pwrite"):
+        os.pwrite(f.fileno(), data, offset)
+    else:
+        f.seek(offset)
+        f.write(data)
+
+
+def _local_size(local_path: str) -> int:
+    """Size of a local file, or -1 if it doesn't exist"""
+    try:
+        return os.path.getsize(local_path)
+    except OSError:
+        return -1
+
+
+def upload_tree(
+    fs: FileSystemProxy,
+    local_dir: str,
+    remote_dir: str,
+    jobs: int,
+    part_size: int,
+    checkpoint: Checkpoint,
+    verify: bool = False,
+) -> TransferStats:
+    """Upload the content of a local directory to a remote directory, with up
+    to `jobs` concurrent uploads. Remote directories are created before any
+    file is uploaded. Files larger than `part_size` are uploaded in parts of
+    that size (see `_upload_file`). Skips the files uploaded
+    previously, as recorded in the checkpoint. With `verify`, see
+    `upload_file`."""
+    stats = TransferStats()
+    root = remote_dir.rstrip("/")
+
+    files = []
+    fs.makedirs(root, exist_ok=True)
+    for relpath, entry in _scan_local(local_dir):
+        remote_path = posixpath.join(root, relpath)
+        if entry.is_dir():
+            fs.makedirs(remote_path, exist_ok=True)
+        else:
+            files.append((relpath, entry.path, remote_path, entry.stat()))
+
+    # start with the largest files, so that they don't end up uploaded alone
+    # (sequentially) while all other files are done
+    files.sort(key=lambda item: item[3].st_size, reverse=True)
+
+    def upload(
+        item: Tuple[str, str, str, os.stat_result]
+    ) -> Union[bool, None, ChecksumMismatchError]:
+        relpath, local_path, remote_path, stat = item
+        # partial uploads can't be resumed: files are written to the remote
+        # file systems as a whole
+        if checkpoint.begin(relpath, local_fingerprint(stat)):
+            return None
+        try:
+            verified = _upload_file(
+                fs, local_path, remote_path, part_size, verify, jobs
+            )
+        except ChecksumMismatchError as err:
+            return err
+        checkpoint.mark_done(relpath)
+        return verified
+
+    for (_, _, _, stat), verified in zip(files, parallel_map(upload, files, jobs)):
+        if isinstance(verified, ChecksumMismatchError):
+            stats.failed.append(verified.path)
+            continue
+        stats.add(None if verified is None else stat.st_size)
+        if verify and verified is False:
+            stats.unverified += 1
+
+    return stats
+
+
+def upload_file(
+    fs: FileSystemProxy,
+    local_path: str,
+    remote_path: str,
+    part_size: int,
+    checkpoint: Checkpoint,
+    verify: bool = False,
+    jobs: int = 1,
+) -> TransferStats:
+    """Upload a single file, unless it was uploaded previously, as recorded in
+    the checkpoint. Files larger than `part_size` are uploaded in parts of
+    that size, up to `jobs` parts at a time, if the file system supports it
+    (see `_upload_file`). With `verify`, see `_upload_file`."""
+    stats = TransferStats()
+    key = os.path.basename(local_path)
+    stat = os.stat(local_path)
+    if checkpoint.begin(key, local_fingerprint(stat)):
+        stats.add(None)
+        return stats
+    verified = _upload_file(fs, local_path, remote_path, part_size, verify, jobs)
+    checkpoint.mark_done(key)
+    stats.add(stat.st_size)
+    if verify and not verified:
+        stats.unverified += 1
+    return stats
+
+
+def _upload_file(
+    fs: FileSystemProxy,
+    local_path: str,
+    remote_path: str,
+    part_size: int,
+    verify: bool = False,
+    part_jobs: int = 1,
+) -> bool:
+    """Upload a single file. Files larger than `part_size` are uploaded in
+    parts of that size by put_file of the file system, with up to `part_jobs`
+    parts uploaded concurrently, if it accepts these options (see
+    `_put_file_options`). Otherwise, the file is written in blocks of
+    `part_size`, which the file systems that support multipart uploads (e.g.,
+    GCS) upload as separate parts of the same file, one after another.
+
+    With `verify`, the content is hashed as it is uploaded, and the file is
+    uploaded again if the checksum doesn't match the one the file system
+    reports afterwards. A file uploaded in multiple parts to S3 has an ETag
+    computed from the MD5s of the parts, which is verified if the file is
+    made of the same parts as hashed here. Returns whether the file is
+    verified."""
+    options = _put_file_options(fs, part_size, part_jobs)
+    if not verify:
+        if os.path.getsize(local_path) <= part_size:
+            fs.put_file(local_path, remote_path)
+        elif options is not None:
+            fs.put_file(local_path, remote_path, **options)
+        else:
+            _upload_in_parts(fs, local_path, remote_path, part_size)
+        return False
+
+    for _ in range(VERIFY_ATTEMPTS):
+        hasher = checksum.new_hasher(UPLOAD_CHECKSUM_ALGORITHM)
+        part_digests: List[bytes] = []
+        if options is not None:
+            # the file system reads the file itself: the parts are hashed
+            # ahead, the same way it splits them
+            with open(local_path, "rb") as local_file:
+                for block in iter(lambda: local_file.read(part_size), b""):
+                    _hash_part(block, hasher, part_digests)
+            fs.put_file(local_path, remote_path, **options)
+        else:
+            _upload_in_parts(
+                fs, local_path, remote_path, part_size, hasher, part_digests
+            )
+        file_info = fs.info(remote_path, refresh=True)
+        expected = checksum.server_checksum(file_info, UPLOAD_CHECKSUM_ALGORITHM)
+        actual = hasher.hexdigest()
+        if expected is None:
+            expected = checksum.server_multipart_etag(file_info)
+            actual = checksum.multipart_etag(part_digests)
+            # the parts may have been split differently by the file system
+            if expected is None or not expected.endswith(f"-{len(part_digests)}"):
+                return False
+        if actual == expected:
+            return True
+
+    raise ChecksumMismatchError(remote_path)
+
+
+def _put_file_options(
+    fs: FileSystemProxy, part_size: int, part_jobs: int
+) -> Optional[Dict[str, int]]:
+    """Options of put_file that set the part size and the number of parts
+    uploaded concurrently, among the ones the implementation accepts, or None
+    if it accepts no part size"""
+    try:
+        parameters = inspect.signature(fs._fs.put_file).parameters
+    except (TypeError, ValueError):
+        return None
+    if PUT_FILE_PART_SIZE_OPTION not in parameters:
+        return None
+    options = {PUT_FILE_PART_SIZE_OPTION: part_size}
+    if PUT_FILE_CONCURRENCY_OPTION in parameters:
+        options[PUT_FILE_CONCURRENCY_OPTION] = part_jobs
+    return options
+
+
+def _upload_in_parts(
+    fs: FileSystemProxy,
+    local_path: str,
+    remote_path: str,
+    part_size: int,
+    hasher=None,
+    part_digests: Optional[List[bytes]] = None,
+):
+    """Upload a file by writing it in blocks of part_size, hash the blocks
+    with the hasher, if any, and collect the MD5 digests of the blocks, if a
+    list is given"""
+    with open(local_path, "rb") as local_file:
+        with fs.open(remote_path, "wb", block_size=part_size) as remote_file:
+            for block in iter(lambda: local_file.read(part_size), b""):
+                remote_file.write(block)
+                _hash_part(block, hasher, part_digests)
+
+
+def _hash_part(block: bytes, hasher=None, part_digests: Optional[List[bytes]] = None):
+    if hasher is not None:
+        hasher.update(block)
+    if part_digests is not None:
+        part_digests.append(hashlib.md5(block).digest())
+
+
+def _scan_local(local_dir: str, relpath: str = "") -> Iterator[Tuple[str, os.DirEntry]]:
+    """Recursively scan a local directory. Yields directories before their
+    content, with the paths relative to the scanned directory."""
+    with os.scandir(os.path.join(local_dir, relpath)) as entries:
+        for entry in sorted(entries, key=lambda e: e.name):
+            entry_relpath = posixpath.join(relpath, entry.name)
+            yield entry_relpath, entry
+            if entry.is_dir(follow_symlinks=False):
+                yield from _scan_local(local_dir, entry_relpath)
+
+
+def copy_file(
+    src_fs: FileSystemProxy,
+    src_path: str,
+    dst_fs: FileSystemProxy,
+    dst_path: str,
+    size: Optional[int] = None,
+):
+    """Copy a single file, within a file system or between two file systems.
+    The parent directory of the destination must exist. Between two remote
+    file systems, the content is streamed from one to the other through
+    memory, with the next blocks read while the current one is written. The
+    destination file is only committed once the whole content is written, and
+    is discarded if the copy fails (e.g., a multipart upload is aborted)."""
+    if src_fs is dst_fs:
+        src_fs.cp_file(src_path, dst_path)
+    elif is_native(src_fs):
+        dst_fs.put_file(src_path, dst_path)
+    elif is_native(dst_fs):
+        src_fs.get_file(src_path, dst_path)
+    else:
+        blocks = iter_blocks(src_fs, src_path, end=size)
+        dst_file = dst_fs.open(dst_path, "wb", autocommit=False)
+        try:
+            with dst_file:
+                for block in read_ahead(blocks, READ_AHEAD_BLOCKS):
+                    dst_file.write(block)
+        except BaseException:
+            dst_file.discard()
+            raise
+        dst_file.commit()
+
+
+def copy_tree(
+    src_fs: FileSystemProxy,
+    src_dir: str,
+    dst_fs: FileSystemProxy,
+    dst_dir: str,
+    jobs: int,
+) -> TransferStats:
+    """Copy the content of a directory to another file system, with up to
+    `jobs` concurrent copies. Files are copied as the source directories are
+    listed. The files which paths resolve outside the destination directory
+    are rejected (see escapes_root)."""
+    stats = TransferStats()
+    src_root = src_fs._strip_protocol(src_dir).rstrip("/")
+    src_root_length = len(src_root)
+    dst_root = dst_dir.rstrip("/")
+
+    def files() -> Iterator[Tuple[str, str, Optional[int]]]:
+        dst_fs.makedirs(dst_root, exist_ok=True)
+        # directories are listed before their content
+        for file_info in iter_tree(src_fs, src_root, refresh=True):
+            relpath = file_info["name"][src_root_length:].strip("/")
+            if escapes_root(relpath):
+                if file_info.get("type") != "directory":
+                    stats.rejected.append(file_info["name"])
+                continue
+            dst_path = posixpath.join(dst_root, relpath)
+            if file_info.get("type") == "directory":
+                dst_fs.makedirs(dst_path, exist_ok=True)
+            else:
+                yield file_info["name"], dst_path, file_info.get("size")
+
+    def copy(item: Tuple[str, str, Optional[int]]) -> int:
+        src_path, dst_path, size = item
+        copy_file(src_fs, src_path, dst_fs, dst_path, size)
+        return size or 0
+
+    for size in parallel_map(copy, files(), jobs):
+        stats.add(size)
+
+    return stats
+
+
+def _local_path(local_dir: str, relpath: str) -> str:
+    """Convert a relative path in a file system to a native local path"""
+    return os.path.normpath(os.path.join(local_dir, *relpath.split("/")))
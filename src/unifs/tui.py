@@ -1,3 +1,4 @@
+import os
 import sys
 from functools import wraps
 from typing import Any, Iterable, Optional
@@ -40,12 +41,16 @@ def errorhandler(fn):
     """A decorator that enables generic error handling behavior on a click
     command function. Prints RecoverableErrors to the user, logs unexpected
     errors to a file, then prints a message to the user and exites with a
-    non-zero exit code."""
+    non-zero exit code. Exits silently if the downstream pipe is closed."""
 
     @wraps(fn)
     def wrapper(*args, **kwargs):
         try:
             return fn(*args, **kwargs)
+        except BrokenPipeError:
+            # downstream pipe is closed (e.g., `unifs cat FILE | head`)
+            _silence_stdout()
+            sys.exit(1)
         except RecoverableError as err:
             click.echo(str(err))
             sys.exit(0)
@@ -58,3 +63,14 @@ def errorhandler(fn):
             sys.exit(2)
 
     return wrapper
+
+
+def _silence_stdout():
+    """Redirect stdout to devnull, so that Python doesn't fail again when
+    flushing stdout at exit, after the downstream pipe is closed."""
+    try:
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+    except (OSError, ValueError):
+        # stdout may not be backed by a file descriptor (e.g., in tests)
+        pass
@@ -1,9 +1,15 @@
+import queue
 import sys
+import threading
+from collections import deque
+from concurrent.futures import Executor, ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, Optional, TypeVar
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Type, TypeVar
 
 K = TypeVar("K")
 V = TypeVar("V")
+T = TypeVar("T")
+R = TypeVar("R")
 
 
 def humanize_bytes(size):
@@ -42,3 +48,75 @@ def dtfromisoformat(s: str) -> datetime:
         if s[-1] == "Z" or s[-1] == "z":
             s = s[:-1]
     return datetime.fromisoformat(s)
+
+
+def parallel_map(
+    fn: Callable[[T], R],
+    items: Iterable[T],
+    jobs: int,
+    executor_class: Type[Executor] = ThreadPoolExecutor,
+) -> Iterator[R]:
+    """Same as map(), but calls the function concurrently in a pool of `jobs`
+    threads (or processes, with a ProcessPoolExecutor), and yields the
+    results in order. Items are consumed lazily and the number of pending
+    calls is bounded, so that the items may be a long iterator. Pending calls
+    are cancelled if any call raises an error, or if the iteration stops
+    early."""
+    with executor_class(max_workers=jobs) as executor:
+        pending = deque()
+        try:
+            for item in items:
+                pending.append(executor.submit(fn, item))
+                if len(pending) >= 2 * jobs:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+class _Failure:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def read_ahead(items: Iterable[T], size: int) -> Iterator[T]:
+    """Iterate over the items in a background thread, up to `size` items ahead
+    of the consumer. Allows to fetch the next items (e.g., read the next
+    blocks of a file) while the current one is being processed. Errors are
+    raised to the consumer. The background thread stops if the iteration
+    stops early."""
+    pending: "queue.Queue[Any]" = queue.Queue(maxsize=size)
+    stopped = threading.Event()
+    done = object()
+
+    def put(item) -> bool:
+        while not stopped.is_set():
+            try:
+                pending.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put(item):
+                    return
+            put(done)
+        except BaseException as err:
+            put(_Failure(err))
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            item = pending.get()
+            if item is done:
+                return
+            elif isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        stopped.set()
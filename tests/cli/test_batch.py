@@ -0,0 +1,118 @@
+import json
+import traceback
+
+from click.testing import CliRunner
+
+from unifs.cli import batch
+
+
+def invoke(*args, expected_exit_code: int = 0, **kwargs):
+    runner = CliRunner()
+    result = runner.invoke(batch.batch, args, **kwargs)
+    if result.exception is not None:
+        e = result.exception
+        traceback.print_exception(type(e), e, e.__traceback__)
+    assert result.exit_code == expected_exit_code
+    return result
+
+
+def results(output):
+    return [json.loads(line) for line in output.splitlines()]
+
+
+def test_batch(test_fs):
+    script = "\n".join(
+        [
+            "# prepare a directory",
+            "mkdir -p /batch/out",
+            "cp /text.txt /batch/out/a.txt",
+            "mv /batch/out/a.txt '/batch/out/b c.txt'",
+            "",
+            "touch /batch/out/new.txt",
+            "cp /table.csv /batch/table.csv",
+            "rm -f /batch/table.csv",
+        ]
+    )
+    result = invoke("-", input=script)
+    assert results(result.stdout) == [
+        {"line": 2, "command": "mkdir -p /batch/out", "status": "ok"},
+        {"line": 3, "command": "cp /text.txt /batch/out/a.txt", "status": "ok"},
+        {
+            "line": 4,
+            "command": "mv /batch/out/a.txt '/batch/out/b c.txt'",
+            "status": "ok",
+        },
+        {"line": 6, "command": "touch /batch/out/new.txt", "status": "ok"},
+        {"line": 7, "command": "cp /table.csv /batch/table.csv", "status": "ok"},
+        {"line": 8, "command": "rm -f /batch/table.csv", "status": "ok"},
+    ]
+    assert sorted(test_fs.ls("/batch/out", detail=False)) == [
+        "/batch/out/b c.txt",
+        "/batch/out/new.txt",
+    ]
+    assert test_fs.cat("/batch/out/b c.txt") == b"text file"
+    assert not test_fs.exists("/batch/table.csv")
+
+
+def test_batch_from_file(test_fs, tmp_path):
+    script = tmp_path / "script.txt"
+    script.write_text("cp /text.txt /batch-file.txt\n")
+    result = invoke(str(script))
+    assert results(result.stdout)[0]["status"] == "ok"
+    assert test_fs.cat("/batch-file.txt") == b"text file"
+
+
+def test_batch_failed_command(test_fs):
+    script = "cp /no-such-file.txt /batch-fail.txt\ncp /text.txt /batch-fail.txt\n"
+    result = invoke("-", input=script, expected_exit_code=1)
+    failed, succeeded = results(result.stdout)
+    assert failed["status"] == "error"
+    assert "not found" in failed["error"].lower()
+    assert succeeded["status"] == "ok"
+    assert "1 of 2 commands failed" in result.stderr
+
+
+def test_batch_copy_between_file_systems(test_fs, tmp_path):
+    """The summary of cp -r is not printed to the results"""
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "file.txt").write_bytes(b"foo")
+    script = f"cp -r local:{tmp_path / 'src'} /batch-copy\n"
+    result = invoke("-", input=script)
+    assert results(result.stdout) == [
+        {"line": 1, "command": script.strip(), "status": "ok"}
+    ]
+    assert test_fs.cat("/batch-copy/file.txt") == b"foo"
+
+
+def test_batch_invalid_script_is_not_executed(test_fs):
+    for script, error in [
+        ("touch /batch-invalid.txt\nls /\n", "Line 2: 'ls' can't be used"),
+        ("touch /batch-invalid.txt\nrm /text.txt\n", "Line 2: rm can only be used"),
+        ("touch /batch-invalid.txt\ncp /text.txt\n", "Line 2: Missing argument"),
+        ("touch /batch-invalid.txt\ncp 'a\n", "Line 2: No closing quotation"),
+    ]:
+        result = invoke("-", input=script, expected_exit_code=1)
+        assert error in result.stdout
+        assert not test_fs.exists("/batch-invalid.txt")
+
+
+def test_schedule_dependencies():
+    lines = list(
+        batch._parse_script(
+            [
+                "mkdir -p /sched/a",
+                "touch /sched/b",
+                "cp /sched/a/x /sched/c",
+                "rm -r -f /sched/a/*",
+                "touch /sched/d",
+            ]
+        )
+    )
+    scheduled = list(batch._schedule(lines))
+    assert [[other.number for other in line.depends_on] for line in scheduled] == [
+        [],
+        [],
+        [1],
+        [1, 3],
+        [],
+    ]
@@ -1,8 +1,12 @@
+import hashlib
 import os
 import traceback
 
+import pytest
 from click.testing import CliRunner
 
+from unifs import deletion
+from unifs.checkpoint import Checkpoint, checkpoint_path, local_fingerprint
 from unifs.cli import fs
 
 
@@ -51,14 +55,22 @@ def test_list_glob(test_fs):
 
 
 def test_list_glob_long(test_fs):
-    output = invoke(fs.ls, "-l", "/**/*.txt", input="y\n")
-    assert "Continue?" in output
+    output = invoke(fs.ls, "-l", "/**/*.txt")
+    assert "Continue?" not in output
     assert "fil        19B 2023-01-14 19:25:00 /dir/file-in-dir.txt" in output
     assert "fil        17B 2023-01-14 19:25:00 /special/text-in-dir.txt" in output
 
-    output = invoke(fs.ls, "-l", "/**/*.txt", input="n\n")
-    assert "Continue?" in output
-    assert "file-in-dir.txt" not in output
+
+def test_list_glob_long_without_details(test_fs, monkeypatch):
+    """Details are requested for every match if glob doesn't return them"""
+    for i in range(50):
+        test_fs.pipe_file(f"/globlong/{i:02}.txt", b"foo")
+    glob = test_fs._fs.glob
+    monkeypatch.setattr(test_fs._fs, "glob", lambda path: glob(path))
+    output = invoke(fs.ls, "-l", "/globlong/*.txt")
+    assert output.splitlines() == [
+        f"fil         3B 2023-01-14 19:25:00 /globlong/{i:02}.txt" for i in range(50)
+    ]
 
 
 def test_ll(test_fs):
@@ -93,6 +105,143 @@ def test_cat(test_fs):
     assert b"\x03" not in output.encode("ascii")
 
 
+def test_list_limit(test_fs):
+    output = invoke(fs.ls, "--limit", "2", "/")
+    assert len(output.splitlines()) == 2
+
+    output = invoke(fs.ll, "--limit", "1", "/**/*.txt")
+    assert len(output.splitlines()) == 1
+
+
+def test_list_requests(test_fs, monkeypatch):
+    """ls lists a directory or a file in a single request"""
+    calls = []
+
+    def spy(name):
+        method = getattr(test_fs._fs, name)
+
+        def wrapper(*args, **kwargs):
+            calls.append(name)
+            return method(*args, **kwargs)
+
+        return wrapper
+
+    for name in ("ls", "info", "isdir", "isfile"):
+        monkeypatch.setattr(test_fs._fs, name, spy(name))
+
+    invoke(fs.ls, "-l", "/dir")
+    assert calls == ["ls"]
+
+    calls.clear()
+    invoke(fs.ls, "-l", "/text.txt")
+    assert calls == ["ls"]
+
+
+def test_find(test_fs):
+    test_fs.pipe_file("/find/a.txt", b"a")
+    test_fs.pipe_file("/find/b.csv", b"b" * 2048)
+    test_fs.pipe_file("/find/sub/c.txt", b"c" * 10)
+    test_fs.pipe_file("/find/sub/deeper/d.txt", b"")
+
+    def find(*args):
+        return sorted(invoke(fs.find, "/find", *args).splitlines())
+
+    assert find() == [
+        "/find/a.txt",
+        "/find/b.csv",
+        "/find/sub/",
+        "/find/sub/c.txt",
+        "/find/sub/deeper/",
+        "/find/sub/deeper/d.txt",
+    ]
+    assert find("-name", "*.txt") == [
+        "/find/a.txt",
+        "/find/sub/c.txt",
+        "/find/sub/deeper/d.txt",
+    ]
+    assert find("-type", "d") == ["/find/sub/", "/find/sub/deeper/"]
+    assert find("-maxdepth", "1") == ["/find/a.txt", "/find/b.csv", "/find/sub/"]
+    assert find("-type", "f", "-size", "+1") == ["/find/b.csv", "/find/sub/c.txt"]
+    assert find("-type", "f", "-size", "-1K") == [
+        "/find/a.txt",
+        "/find/sub/c.txt",
+        "/find/sub/deeper/d.txt",
+    ]
+    assert find("-size", "2K") == ["/find/b.csv"]
+    assert find("-name", "*.txt", "-mtime", "+30") == [
+        "/find/a.txt",
+        "/find/sub/c.txt",
+        "/find/sub/deeper/d.txt",
+    ]
+    assert find("-mtime", "-1") == []
+
+    assert invoke(fs.find, "/find/a.txt").strip() == "/find/a.txt"
+    assert "expected [+|-]N" in invoke(fs.find, "-size", "x", expected_exit_code=2)
+
+
+def test_du(test_fs):
+    test_fs.pipe_file("/du/a.txt", b"a" * 1024)
+    test_fs.pipe_file("/du/sub/b.txt", b"b" * 512)
+    test_fs.pipe_file("/du/sub/deeper/c.txt", b"c" * 512)
+    test_fs.makedirs("/du/empty", exist_ok=True)
+
+    output = invoke(fs.du, "/du")
+    assert output.splitlines() == [
+        "        0B        0 /du/empty",
+        "      512B        1 /du/sub/deeper",
+        "     1024B        2 /du/sub",
+        "     2.0KB        3 /du",
+    ]
+
+    output = invoke(fs.du, "-d", "1", "/du/")
+    assert output.splitlines() == [
+        "        0B        0 /du/empty",
+        "     1024B        2 /du/sub",
+        "     2.0KB        3 /du",
+    ]
+
+    output = invoke(fs.du, "-s", "/du")
+    assert output.splitlines() == ["     2.0KB        3 /du"]
+
+    output = invoke(fs.du, "/du/a.txt")
+    assert output.splitlines() == ["     1024B        1 /du/a.txt"]
+
+
+def test_cat_streams_blocks(test_fs, monkeypatch):
+    monkeypatch.setattr(fs, "CAT_BLOCK_SIZE", 3)
+    output = invoke(fs.cat, "/dir/file-in-dir.txt")
+    assert "file in a directory" == output.strip()
+
+
+def test_cat_head_tail_requests(test_fs, monkeypatch):
+    """cat, head and tail issue a single metadata request, then read the
+    content"""
+    calls = []
+
+    def spy(name):
+        method = getattr(test_fs._fs, name)
+
+        def wrapper(*args, **kwargs):
+            calls.append(name)
+            return method(*args, **kwargs)
+
+        return wrapper
+
+    for name in ("info", "cat_file", "isfile", "size", "head", "tail", "cat"):
+        monkeypatch.setattr(test_fs._fs, name, spy(name))
+
+    invoke(fs.cat, "/text.txt")
+    assert calls == ["info", "cat_file"]
+
+    calls.clear()
+    invoke(fs.head, "/text.txt")
+    assert calls == ["info", "cat_file"]
+
+    calls.clear()
+    invoke(fs.tail, "/text.txt")
+    assert calls == ["info", "cat_file"]
+
+
 def test_head(test_fs):
     output = invoke(fs.head, "/non-existing.txt")
     assert "No such file" == output.strip()
@@ -100,6 +249,9 @@ def test_head(test_fs):
     output = invoke(fs.head, "/special/bigfile.txt", "--bytes=3")
     assert "foo" == output.strip()
 
+    output = invoke(fs.head, "/special/file.bin", input="n\n")
+    assert "Continue?" in output
+
 
 def test_tail(test_fs):
     output = invoke(fs.tail, "/non-existing.txt")
@@ -163,6 +315,31 @@ def test_cp_glob(test_fs):
     assert test_fs.isfile("/copy-results/tocopy2/file2.txt")
 
 
+def test_cp_between_file_systems(test_fs, tmp_path):
+    test_fs.pipe_file("/cp-src/a.txt", b"file a")
+    test_fs.pipe_file("/cp-src/sub/b.txt", b"file b")
+    os.makedirs(tmp_path / "cp-dst-folder")
+
+    invoke(fs.cp, "/cp-src/a.txt", f"local:{tmp_path}/cp-dst.txt")
+    assert open(tmp_path / "cp-dst.txt", "rb").read() == b"file a"
+
+    invoke(fs.cp, "memory:/cp-src/a.txt", f"local:{tmp_path}/cp-dst-folder")
+    assert open(tmp_path / "cp-dst-folder" / "a.txt", "rb").read() == b"file a"
+
+    invoke(fs.cp, f"local:{tmp_path}/cp-dst.txt", "memory:/cp-back.txt")
+    assert test_fs.cat("/cp-back.txt") == b"file a"
+
+    output = invoke(fs.cp, "-r", "/cp-src", f"local:{tmp_path}/cp-dst-tree")
+    assert "Copied 2 files (12B)" in output
+    assert open(tmp_path / "cp-dst-tree" / "a.txt", "rb").read() == b"file a"
+    assert open(tmp_path / "cp-dst-tree" / "sub" / "b.txt", "rb").read() == b"file b"
+
+    output = invoke(fs.cp, "/cp-src", f"local:{tmp_path}/foo", expected_exit_code=1)
+    assert "is a directory" in output
+    output = invoke(fs.cp, "/cp-src/*", f"local:{tmp_path}/foo", expected_exit_code=1)
+    assert "Globs can only be used" in output
+
+
 def test_mv_single_file(test_fs):
     test_fs.pipe_file("/file.txt", b"foo")
     invoke(fs.mv, "/file.txt", "renamed.txt")
@@ -256,6 +433,59 @@ def test_rm_dir(test_fs):
     assert not test_fs.isdir("/toremove")
 
 
+def test_rm_glob_names(test_fs):
+    test_fs.pipe_file("/rm-globs/x[1].txt", b"foo")
+    test_fs.pipe_file("/rm-globs/x1.txt", b"foo")
+    invoke(fs.rm, "/rm-globs/x*", input="y\nn\n")
+    assert test_fs.isfile("/rm-globs/x1.txt")
+    assert not test_fs.exists("/rm-globs/x[1].txt")
+
+
+def test_rm_recursive_force_in_batches(test_fs, monkeypatch):
+    monkeypatch.setattr(deletion, "DELETE_BATCH_SIZE", 2)
+    for i in range(5):
+        test_fs.pipe_file(f"/rm-batches/sub/file{i}.txt", b"foo")
+
+    output = invoke(fs.rm, "-r", "-f", "/rm-batches")
+    assert "Removed 4 of 7 files and directories" in output
+    assert not test_fs.exists("/rm-batches")
+
+    output = invoke(fs.rm, "-r", "-f", "/rm-batches", expected_exit_code=1)
+    assert "not found" in output.lower()
+
+
+def test_rm_interactive_requests(test_fs, monkeypatch):
+    """Interactive rm doesn't request the details of every path, and removes
+    the confirmed paths at once"""
+    for i in range(3):
+        test_fs.pipe_file(f"/rm-interactive/file{i}.txt", b"foo")
+
+    calls = []
+
+    def spy(name):
+        method = getattr(test_fs._fs, name)
+
+        def wrapper(*args, **kwargs):
+            calls.append((name, args[0]))
+            return method(*args, **kwargs)
+
+        return wrapper
+
+    for name in ("info", "isdir", "rm", "rmdir"):
+        monkeypatch.setattr(test_fs._fs, name, spy(name))
+
+    output = invoke(fs.rm, "-r", "/rm-interactive", input="y\nn\ny\nn\n")
+    assert "Remove /rm-interactive/file2.txt?" in output
+    assert "Remove /rm-interactive?" in output
+    # (the requests issued by the rm of the file system itself are ignored)
+    rm_calls = [call for call in calls if call[0] == "rm"]
+    assert rm_calls == [
+        ("rm", ["/rm-interactive/file2.txt", "/rm-interactive/file0.txt"])
+    ]
+    assert calls[: calls.index(rm_calls[0])] == [("info", "/rm-interactive")]
+    assert test_fs.isfile("/rm-interactive/file1.txt")
+
+
 def test_rm_glob_files(test_fs):
     def given_some_files():
         test_fs.touch("/file1.txt", truncate=False)
@@ -327,6 +557,56 @@ def test_get_single_file(test_fs, tmp_path):
     assert "File not found: /dir" == output.strip()
 
 
+def test_get_recursive(test_fs, tmp_path):
+    test_fs.pipe_file("/toget/file.txt", b"foo")
+    test_fs.pipe_file("/toget/subdir/file-in-subdir.txt", b"barbaz")
+    test_fs.makedirs("/toget/empty-dir", exist_ok=True)
+
+    output = invoke(fs.get, "-r", "-j", "2", "/toget", str(tmp_path / "copy"))
+    assert "Downloaded 2 files (9B)" in output
+    assert open(tmp_path / "copy" / "file.txt", "rb").read() == b"foo"
+    assert open(tmp_path / "copy" / "subdir" / "file-in-subdir.txt", "rb").read() == (
+        b"barbaz"
+    )
+    assert os.path.isdir(tmp_path / "copy" / "empty-dir")
+
+    output = invoke(fs.get, "-r", "/text.txt", str(tmp_path), expected_exit_code=1)
+    assert "Directory not found: /text.txt" == output.strip()
+
+
+def test_get_recursive_escaping_paths(test_fs, tmp_path):
+    test_fs.pipe_file("/toget-escaping/file.txt", b"foo")
+    test_fs.pipe_file("/toget-escaping/../../escaped.txt", b"bar")
+    args = ["-r", "/toget-escaping", str(tmp_path / "copy")]
+    output = invoke(fs.get, *args, expected_exit_code=1)
+    assert "Paths outside the destination (not transferred): " in output
+    assert (tmp_path / "copy" / "file.txt").exists()
+
+
+def test_get_recursive_resume(test_fs, tmp_path):
+    test_fs.pipe_file("/toresume/file1.txt", b"foo")
+    test_fs.pipe_file("/toresume/file2.txt", b"bar")
+    invoke(fs.get, "-r", "/toresume", str(tmp_path / "copy"))
+    # the progress is only recorded with --resume:
+    assert not os.path.exists(
+        checkpoint_path("memory:/toresume", str(tmp_path / "copy"))
+    )
+
+    output = invoke(fs.get, "-r", "--resume", "/toresume", str(tmp_path / "copy"))
+    assert "Downloaded 2 files" in output
+
+
+def test_get_segments(test_fs, tmp_path):
+    output = invoke(fs.get, "--segments", "4", "/special/bigfile.txt", str(tmp_path))
+    assert "Downloaded 1 files (10.0KB)" in output
+    assert open(tmp_path / "bigfile.txt", "rb").read() == b"foobarbazx" * 1024
+
+    output = invoke(
+        fs.get, "-r", "--segments", "4", "/dir", str(tmp_path), expected_exit_code=1
+    )
+    assert "--segments can only be used to download a single file" in output
+
+
 def test_put_single_file(test_fs, tmp_path):
     with open(tmp_path / "file.txt", "wb") as f:
         f.write(b"foo")
@@ -344,6 +624,84 @@ def test_put_single_file(test_fs, tmp_path):
     assert f"File not found: {tmp_path}" == output.strip()
 
 
+def test_put_single_file_resume(test_fs, tmp_path):
+    local_path = str(tmp_path / "file.txt")
+    with open(local_path, "wb") as f:
+        f.write(b"foo")
+
+    invoke(fs.put, "--resume", local_path, "/toresume-put/file.txt")
+    assert test_fs.cat("/toresume-put/file.txt") == b"foo"
+
+    # a file uploaded previously is skipped:
+    destination = "memory:/toresume-put/file.txt"
+    manifest_path = checkpoint_path(local_path, destination)
+    with pytest.raises(KeyboardInterrupt):
+        with Checkpoint(manifest_path, local_path, destination, False) as checkpoint:
+            checkpoint.begin("file.txt", local_fingerprint(os.stat(local_path)))
+            checkpoint.mark_done("file.txt")
+            raise KeyboardInterrupt()
+    test_fs.rm("/toresume-put/file.txt")
+    output = invoke(fs.put, "--resume", local_path, "/toresume-put/file.txt")
+    assert f"Skipped {local_path}: uploaded previously" in output
+    assert not test_fs.exists("/toresume-put/file.txt")
+
+
+def test_put_recursive(test_fs, tmp_path):
+    os.makedirs(tmp_path / "toput" / "subdir")
+    os.makedirs(tmp_path / "toput" / "empty-dir")
+    with open(tmp_path / "toput" / "file.txt", "wb") as f:
+        f.write(b"foo")
+    with open(tmp_path / "toput" / "subdir" / "file-in-subdir.txt", "wb") as f:
+        f.write(b"barbaz")
+
+    output = invoke(fs.put, "-r", "-j", "2", str(tmp_path / "toput"), "/put-result")
+    assert "Uploaded 2 files (9B)" in output
+    assert test_fs.cat("/put-result/file.txt") == b"foo"
+    assert test_fs.cat("/put-result/subdir/file-in-subdir.txt") == b"barbaz"
+    assert test_fs.isdir("/put-result/empty-dir")
+
+    output = invoke(fs.put, "-r", str(tmp_path / "nope"), "/", expected_exit_code=1)
+    assert f"Directory not found: {tmp_path / 'nope'}" == output.strip()
+
+
+def test_sync(test_fs, tmp_path):
+    test_fs.pipe_file("/cli-sync/a.txt", b"a")
+    test_fs.pipe_file("/cli-sync/sub/b.txt", b"b")
+
+    output = invoke(fs.sync, "/cli-sync", f"local:{tmp_path}/dst")
+    assert "Copied 2 files" in output
+    assert (tmp_path / "dst" / "sub" / "b.txt").read_bytes() == b"b"
+
+    (tmp_path / "dst" / "extra.txt").write_bytes(b"extra")
+    output = invoke(fs.sync, "--delete", "/cli-sync", f"local:{tmp_path}/dst")
+    assert "Copied 0 files" in output
+    assert "skipped 2 files" in output
+    assert "Removed 1 of 1" in output
+    assert not (tmp_path / "dst" / "extra.txt").exists()
+
+    output = invoke(fs.sync, "/no-such-dir", "/dst", expected_exit_code=1)
+    assert "Directory not found: /no-such-dir" in output
+
+
+def test_hash(test_fs):
+    test_fs.pipe_file("/cli-hash/a.txt", b"a")
+    test_fs.pipe_file("/cli-hash/sub/b.txt", b"b")
+    md5_a = hashlib.md5(b"a").hexdigest()
+    md5_b = hashlib.md5(b"b").hexdigest()
+
+    output = invoke(fs.hash_, "/cli-hash/a.txt")
+    assert output == f"{md5_a}  /cli-hash/a.txt\n"
+
+    output = invoke(fs.hash_, "-r", "-j", "2", "/cli-hash")
+    assert output == f"{md5_a}  /cli-hash/a.txt\n{md5_b}  /cli-hash/sub/b.txt\n"
+
+    output = invoke(fs.hash_, "--algo", "sha256", "/cli-hash/a.txt")
+    assert output.startswith(hashlib.sha256(b"a").hexdigest())
+
+    output = invoke(fs.hash_, "/cli-hash", expected_exit_code=1)
+    assert "is a directory" in output
+
+
 def test_mkdir(test_fs):
     invoke(fs.mkdir, "/newdir-1")
     assert test_fs.isdir("/newdir-1")
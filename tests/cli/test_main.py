@@ -1,9 +1,13 @@
+import json
 import os
+import subprocess
+import sys
+from dataclasses import replace
 
 import pytest
 from click.testing import CliRunner
 
-from unifs import config
+from unifs import config, file_system
 from unifs.cli import main
 
 
@@ -45,3 +49,106 @@ def test_main_no_terms_prompt_second_time(clear_config):
     result = runner.invoke(main.cli, ["conf", "path"])
     assert result.exit_code == 0
     assert "Do you agree?" not in result.output
+
+
+def test_main_lazy_commands():
+    """Simple commands don't import the file system implementations"""
+    script = (
+        "import sys\n"
+        "from unifs.cli.main import cli\n"
+        "cli.main(['conf', 'path'], standalone_mode=False)\n"
+        "print(sorted(m for m in sys.modules if m.split('.')[0] == 'fsspec'))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script], capture_output=True, text=True, check=True
+    )
+    assert result.stdout.splitlines()[-1] == "[]"
+
+
+def test_main_list_commands():
+    runner = CliRunner()
+    result = runner.invoke(main.cli, ["--help"])
+    assert result.exit_code == 0
+    for name in main.COMMANDS:
+        assert f"  {name} " in result.output
+
+
+def test_main_warm_up(test_config, test_config_path, monkeypatch):
+    monkeypatch.setattr(file_system, "_fs_cache", {})
+    assert main.warm_up() is None
+
+    config.save(replace(test_config, warmup=True), test_config_path)
+    config.get.cache_clear()
+    thread = main.warm_up()
+    thread.join()
+    assert "memory" in file_system._fs_cache
+
+    # the command gets the instance created in the background
+    fs = file_system._fs_cache["memory"]
+    runner = CliRunner()
+    result = runner.invoke(main.cli, ["ls", "/"])
+    assert result.exit_code == 0
+    assert file_system.get_current() is fs
+
+
+def test_fs_cache_invalidated(test_config, test_config_path):
+    fs = file_system.get("memory")
+    assert file_system.get("memory") is fs
+
+    # e.g., the daemon reloads the configuration before every command
+    conf = replace(test_config, cache=replace(test_config.cache, enabled=True))
+    config.save(conf, test_config_path)
+    config.get.cache_clear()
+    assert file_system.get("memory") is not fs
+    assert file_system.get("memory")._cache is not None
+
+
+def test_main_stats(test_fs):
+    runner = CliRunner()
+    args = ["--stats", "--stats-format", "json", "cat", "/text.txt"]
+    result = runner.invoke(main.cli, args)
+    assert result.exit_code == 0
+    assert result.stdout == "text file\n"
+    stats = json.loads(result.stderr)
+    assert stats["cat_file"]["bytes_read"] == 9
+
+    result = runner.invoke(main.cli, ["--stats", "cat", "/text.txt"])
+    assert result.stderr.startswith("METHOD")
+
+
+def test_main_trace(test_fs, tmp_path, monkeypatch):
+    trace_path = tmp_path / "trace.json"
+    monkeypatch.setenv("UNIFS_TRACE", str(trace_path))
+
+    runner = CliRunner()
+    result = runner.invoke(main.cli, ["cat", "/text.txt"])
+    assert result.exit_code == 0
+
+    lines = trace_path.read_text().splitlines()
+    assert lines[0] == "["
+    assert '"name": "cat_file"' in lines[-1]
+
+
+def test_main_profile(test_fs, tmp_path):
+    output_path = tmp_path / "profile.pstats"
+
+    runner = CliRunner()
+    args = ["--profile", "--profile-output", str(output_path), "cat", "/text.txt"]
+    result = runner.invoke(main.cli, args)
+    assert result.exit_code == 0
+    assert result.stdout == "text file\n"
+    assert result.stderr.startswith("Phases (wall-clock time):")
+    assert "config load: " in result.stderr
+    assert output_path.exists()
+
+
+def test_main_profile_warm_up(test_config, test_config_path, monkeypatch):
+    monkeypatch.setattr(file_system, "_fs_cache", {})
+    config.save(replace(test_config, warmup=True), test_config_path)
+    config.get.cache_clear()
+
+    runner = CliRunner()
+    result = runner.invoke(main.cli, ["--profile", "ls", "/"])
+    assert result.exit_code == 0
+    # the file system is created in the background, while profiling
+    assert "file system construction: " in result.stderr
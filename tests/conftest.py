@@ -60,9 +60,9 @@ class TestFileSystem(MemoryFileSystem):
         res["mtime"] = datetime(2023, 1, 14, 19, 25, 0)
         return res
 
-    def ls(self, *args, detail: bool = False, **kwargs):
+    def ls(self, path, detail: bool = False, **kwargs):
         """Overrides mtime to simplify tests"""
-        res = super().ls(*args, detail=detail, **kwargs)
+        res = super().ls(path, detail=detail, **kwargs)
         if detail:
             for file_info in res:
                 file_info["mtime"] = datetime(2023, 1, 14, 19, 25, 0)
@@ -98,6 +98,7 @@ def test_config(test_config_path):
         },
     )
     config.save(conf, test_config_path)
+    config.get.cache_clear()  # e.g., if the previous test changed the config
     return conf
 
 
@@ -0,0 +1,61 @@
+import time
+from datetime import datetime
+
+import pytest
+
+from unifs.cache import MetadataCache, _ancestors
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return MetadataCache(str(tmp_path / "cache.db"), ttl=60, max_entries=3)
+
+
+def test_get_put(cache):
+    assert cache.get("fs", "ls", "/dir") is None
+
+    listing = [{"name": "/dir/file", "mtime": datetime(2023, 1, 14)}]
+    cache.put("fs", "ls", "/dir", listing)
+    assert cache.get("fs", "ls", "/dir") == listing
+    assert cache.get("fs", "info", "/dir") is None
+    assert cache.get("another-fs", "ls", "/dir") is None
+
+
+def test_ttl(cache, monkeypatch):
+    cache.put("fs", "info", "/file", {"name": "/file"})
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    assert cache.get("fs", "info", "/file") is None
+
+
+def test_lru_eviction(cache):
+    cache.put("fs", "info", "/1", 1)
+    cache.put("fs", "info", "/2", 2)
+    cache.put("fs", "info", "/3", 3)
+    time.sleep(0.01)
+    assert cache.get("fs", "info", "/1") == 1
+    cache.put("fs", "info", "/4", 4)
+    assert cache.get("fs", "info", "/1") == 1
+    assert cache.get("fs", "info", "/2") is None
+    assert cache.get("fs", "info", "/3") == 3
+    assert cache.get("fs", "info", "/4") == 4
+
+
+def test_invalidate(tmp_path):
+    cache = MetadataCache(str(tmp_path / "cache.db"), ttl=60, max_entries=100)
+    for path in ["/", "/dir", "/dir/sub", "/dir/sub/file", "/dirx", "/other"]:
+        cache.put("fs", "info", path, path)
+
+    cache.invalidate("fs", "/dir/sub")
+    assert cache.get("fs", "info", "/") is None
+    assert cache.get("fs", "info", "/dir") is None
+    assert cache.get("fs", "info", "/dir/sub") is None
+    assert cache.get("fs", "info", "/dir/sub/file") is None
+    assert cache.get("fs", "info", "/dirx") == "/dirx"
+    assert cache.get("fs", "info", "/other") == "/other"
+
+
+def test_ancestors():
+    assert _ancestors("/foo/bar") == ["/foo", "/"]
+    assert _ancestors("bucket/key") == ["bucket", "", "/"]
+    assert _ancestors("") == []
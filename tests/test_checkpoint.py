@@ -0,0 +1,94 @@
+import os
+from datetime import datetime
+
+import pytest
+
+from unifs import config
+from unifs.checkpoint import Checkpoint, checkpoint_path, remote_fingerprint
+
+FINGERPRINT = {"size": 10, "mtime": None, "etag": "abc"}
+
+
+def test_checkpoint_path(test_config):
+    path = checkpoint_path("src:/dir", "/local/dir")
+    config_dir = os.path.dirname(config.site_config_file_path())
+    assert os.path.dirname(path) == os.path.join(config_dir, "checkpoints")
+    assert path == checkpoint_path("src:/dir", "/local/dir")
+    assert path != checkpoint_path("/local/dir", "src:/dir")
+
+
+def test_remote_fingerprint():
+    file_info = {"size": 3, "mtime": datetime(2023, 1, 14), "ETag": "abc"}
+    assert remote_fingerprint(file_info) == {
+        "size": 3,
+        "mtime": "2023-01-14T00:00:00",
+        "etag": "abc",
+    }
+    assert remote_fingerprint({}) == {"size": None, "mtime": None, "etag": None}
+
+
+def test_checkpoint_progress():
+    checkpoint = Checkpoint(None, "src", "dst", resume=False)
+    assert not checkpoint.begin("file", FINGERPRINT)
+    assert checkpoint.resume_offset("file") == 0
+
+    checkpoint.add_range("file", 0, 3)
+    checkpoint.add_range("file", 6, 8)
+    checkpoint.add_range("file", 3, 5)
+    assert checkpoint.resume_offset("file") == 5
+    assert checkpoint.resume_offset("file", 6) == 8
+    assert checkpoint.resume_offset("file", 9) == 9
+
+    assert not checkpoint.begin("file", FINGERPRINT)
+    checkpoint.mark_done("file")
+    assert checkpoint.begin("file", FINGERPRINT)
+
+    # the progress is discarded if the file has changed:
+    assert not checkpoint.begin("file", {**FINGERPRINT, "size": 11})
+    assert checkpoint.resume_offset("file") == 0
+
+
+def test_checkpoint_resume(tmp_path):
+    path = str(tmp_path / "checkpoint")
+
+    with pytest.raises(KeyboardInterrupt):
+        with Checkpoint(path, "src", "dst", resume=False) as checkpoint:
+            checkpoint.begin("done", FINGERPRINT)
+            checkpoint.mark_done("done")
+            checkpoint.begin("partial", FINGERPRINT)
+            checkpoint.add_range("partial", 0, 4)
+            raise KeyboardInterrupt()
+    assert os.path.isfile(path)
+
+    # an incomplete record, if interrupted while writing it, is ignored:
+    with open(path, "a") as f:
+        f.write('{"key": "partial", "ran')
+
+    with Checkpoint(path, "src", "dst", resume=True) as checkpoint:
+        assert checkpoint.begin("done", FINGERPRINT)
+        assert not checkpoint.begin("partial", FINGERPRINT)
+        assert checkpoint.resume_offset("partial") == 4
+    assert not os.path.exists(path)
+
+
+def test_checkpoint_start_over(tmp_path):
+    path = str(tmp_path / "checkpoint")
+
+    with pytest.raises(KeyboardInterrupt):
+        with Checkpoint(path, "src", "dst", resume=False) as checkpoint:
+            checkpoint.begin("done", FINGERPRINT)
+            checkpoint.mark_done("done")
+            raise KeyboardInterrupt()
+
+    # not resuming:
+    with Checkpoint(path, "src", "dst", resume=False) as checkpoint:
+        assert not checkpoint.begin("done", FINGERPRINT)
+
+    # resuming, but a different transfer:
+    with pytest.raises(KeyboardInterrupt):
+        with Checkpoint(path, "src", "dst", resume=False) as checkpoint:
+            checkpoint.begin("done", FINGERPRINT)
+            checkpoint.mark_done("done")
+            raise KeyboardInterrupt()
+    with Checkpoint(path, "src", "another-dst", resume=True) as checkpoint:
+        assert not checkpoint.begin("done", FINGERPRINT)
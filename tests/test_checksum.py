@@ -0,0 +1,62 @@
+import hashlib
+
+import pytest
+
+from unifs import checksum
+
+
+def test_server_checksum():
+    md5 = hashlib.md5(b"foo").hexdigest()
+
+    assert checksum.server_checksum({"ETag": f'"{md5}"'}, "md5") == md5
+    assert checksum.server_checksum({"ETag": f'"{md5}-2"'}, "md5") is None
+    assert (
+        checksum.server_checksum({"md5Hash": "rL0Y20zC+Fzt72VPzMSk2A=="}, "md5") == md5
+    )
+    assert checksum.server_checksum({"crc32c": "z8SuHQ=="}, "crc32c") == "cfc4ae1d"
+    assert checksum.server_checksum({"ETag": f'"{md5}"'}, "sha256") is None
+    assert checksum.server_checksum({"size": 3}, "md5") is None
+
+    # ETags of the objects encrypted with SSE-KMS or SSE-C are not MD5s:
+    sse_s3 = {"ETag": f'"{md5}"', "ServerSideEncryption": "AES256"}
+    assert checksum.server_checksum(sse_s3, "md5") == md5
+    sse_kms = {"ETag": f'"{md5}"', "ServerSideEncryption": "aws:kms"}
+    assert checksum.server_checksum(sse_kms, "md5") is None
+    sse_c = {"ETag": f'"{md5}"', "SSECustomerAlgorithm": "AES256"}
+    assert checksum.server_checksum(sse_c, "md5") is None
+    assert (
+        checksum.server_checksum(
+            {**sse_kms, "ContentMD5": "rL0Y20zC+Fzt72VPzMSk2A=="}, "md5"
+        )
+        == md5
+    )
+
+
+def test_checksums(test_fs):
+    for i in range(3):
+        test_fs.pipe_file(f"/checksums/file{i}.txt", f"content {i}".encode())
+    files = [test_fs.info(f"/checksums/file{i}.txt") for i in range(3)]
+    files[1]["md5"] = "0" * 32  # reported by the file system
+
+    result = list(checksum.checksums(test_fs, files, "md5", jobs=2))
+
+    assert result == [
+        ("/checksums/file0.txt", hashlib.md5(b"content 0").hexdigest()),
+        ("/checksums/file1.txt", "0" * 32),
+        ("/checksums/file2.txt", hashlib.md5(b"content 2").hexdigest()),
+    ]
+
+
+def test_crc32c():
+    pytest.importorskip("google_crc32c")
+    hasher = checksum.new_hasher("crc32c")
+    hasher.update(b"foo")
+    assert hasher.hexdigest() == "cfc4ae1d"
+
+
+def test_multipart_etag():
+    digests = [hashlib.md5(b"foo").digest(), hashlib.md5(b"bar").digest()]
+    etag = checksum.multipart_etag(digests)
+    assert etag == hashlib.md5(b"".join(digests)).hexdigest() + "-2"
+    assert checksum.server_multipart_etag({"ETag": f'"{etag}"'}) == etag
+    assert checksum.server_multipart_etag({"ETag": etag[:32]}) is None
@@ -0,0 +1,133 @@
+import io
+import json
+import os
+import socket
+import threading
+import time
+
+import pytest
+from click.testing import CliRunner
+
+from unifs import daemon
+from unifs.cli import daemon as daemon_cli
+
+
+@pytest.fixture
+def running_daemon():
+    thread = threading.Thread(target=daemon.serve, daemon=True)
+    thread.start()
+    while not daemon.is_running():
+        time.sleep(0.01)
+    yield
+    daemon.stop()
+    thread.join()
+
+
+def forward(*argv, stdin=b""):
+    stdout, stderr = io.BytesIO(), io.BytesIO()
+    exit_code = daemon.forward(list(argv), io.BytesIO(stdin), stdout, stderr)
+    return exit_code, stdout.getvalue(), stderr.getvalue()
+
+
+def test_forward(running_daemon, test_fs):
+    exit_code, stdout, _ = forward("cat", "/text.txt")
+    assert exit_code == 0
+    assert stdout == b"text file\n"
+
+    exit_code, stdout, _ = forward("cat", "/special/file.bin", stdin=b"y\n")
+    assert exit_code == 0
+    assert b"Continue?" in stdout
+    assert b"\x03" in stdout
+
+    exit_code, stdout, _ = forward("get", "/dir", "/tmp")
+    assert exit_code == 1
+    assert stdout == b"File not found: /dir\n"
+
+    exit_code, _, stderr = forward("no-such-command")
+    assert exit_code == 2
+    assert b"No such command" in stderr
+
+
+def test_forward_keeps_file_systems(running_daemon, test_fs):
+    forward("touch", "/touched-in-daemon.txt")
+    assert test_fs.isfile("/touched-in-daemon.txt")
+
+
+def test_forward_env(running_daemon, test_fs, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("UNIFS_TRACE", "trace.json")
+    assert forward("ls", "/")[0] == 0
+    assert (tmp_path / "trace.json").is_file()
+
+    # the environment of the daemon itself doesn't apply to the commands:
+    monkeypatch.setattr(daemon, "_forwarded_env", lambda: {})
+    monkeypatch.setenv("UNIFS_TRACE", "daemon-trace.json")
+    assert forward("ls", "/")[0] == 0
+    assert not (tmp_path / "daemon-trace.json").exists()
+    assert os.environ["UNIFS_TRACE"] == "daemon-trace.json"
+
+
+def test_interrupt_on_disconnect(running_daemon, test_fs, monkeypatch):
+    started, interrupted = threading.Event(), threading.Event()
+    info = test_fs._fs.info
+
+    def slow_info(*args, **kwargs):
+        if not interrupted.is_set():
+            started.set()
+            try:
+                while True:
+                    time.sleep(0.01)
+            except KeyboardInterrupt:
+                interrupted.set()
+                raise
+        return info(*args, **kwargs)
+
+    monkeypatch.setattr(test_fs._fs, "info", slow_info)
+    sock = daemon._connect()
+    header = {"argv": ["cat", "/text.txt"], "cwd": os.getcwd()}
+    sock.sendall(json.dumps(header).encode("utf-8") + b"\n")
+    sock.shutdown(socket.SHUT_WR)  # the end of the standard input
+    assert started.wait(5)
+    time.sleep(0.2)
+    assert not interrupted.is_set(), "only closing the connection interrupts"
+
+    sock.close()
+    assert interrupted.wait(5)
+    # the next commands are executed:
+    assert forward("cat", "/text.txt")[:2] == (0, b"text file\n")
+
+
+def test_forward_not_running():
+    assert not daemon.is_running()
+    assert forward("ls") == (None, b"", b"")
+
+
+def test_forward_daemon_commands(running_daemon):
+    assert forward("daemon", "status") == (None, b"", b"")
+
+
+def test_forward_disabled(running_daemon, monkeypatch):
+    monkeypatch.setenv(daemon.NO_DAEMON_ENV_VAR, "1")
+    assert forward("ls") == (None, b"", b"")
+
+
+def test_cli_status(running_daemon):
+    runner = CliRunner()
+    result = runner.invoke(daemon_cli.daemon, ["status"])
+    assert result.exit_code == 0
+    assert "The daemon is running" in result.output
+
+    result = runner.invoke(daemon_cli.daemon, ["start"])
+    assert result.exit_code == 0
+    assert "already running" in result.output
+
+
+def test_cli_not_running():
+    runner = CliRunner()
+    result = runner.invoke(daemon_cli.daemon, ["status"])
+    assert result.exit_code == 0
+    assert "The daemon is not running" in result.output
+
+    result = runner.invoke(daemon_cli.daemon, ["stop"])
+    assert result.exit_code == 0
+    assert "The daemon is not running" in result.output
@@ -0,0 +1,126 @@
+from unifs import deletion, file_system
+
+
+def given_tree(fs, root):
+    for i in range(5):
+        fs.pipe_file(f"{root}/file{i}.txt", b"foo")
+    fs.pipe_file(f"{root}/sub/file.txt", b"foo")
+    fs.pipe_file(f"{root}/sub/deeper/file.txt", b"foo")
+
+
+def test_expand(test_fs):
+    given_tree(test_fs, "/expand")
+
+    entries = deletion.expand(test_fs, "/expand/sub", recursive=False)
+    assert [(e["name"], e["type"]) for e in entries] == [("/expand/sub", "directory")]
+
+    entries = deletion.expand(test_fs, "/expand/sub", recursive=True)
+    assert sorted(e["name"] for e in entries) == [
+        "/expand/sub",
+        "/expand/sub/deeper",
+        "/expand/sub/deeper/file.txt",
+        "/expand/sub/file.txt",
+    ]
+
+    entries = deletion.expand(test_fs, "/expand/file[12].txt", recursive=True)
+    assert [e["name"] for e in entries] == ["/expand/file1.txt", "/expand/file2.txt"]
+
+
+def test_delete_in_batches(test_fs, monkeypatch):
+    given_tree(test_fs, "/delete")
+
+    batches = []
+    rm = test_fs._fs.rm
+    monkeypatch.setattr(
+        test_fs._fs, "rm", lambda paths: batches.append(paths) or rm(paths)
+    )
+
+    progress = []
+    entries = deletion.expand(test_fs, "/delete", recursive=True)
+    stats = deletion.delete(
+        test_fs,
+        entries,
+        jobs=2,
+        batch_size=3,
+        on_progress=lambda stats: progress.append(stats.deleted),
+    )
+
+    assert sorted(len(batch) for batch in batches) == [1, 3, 3]
+    assert progress == [3, 6, 7]
+    assert (stats.total, stats.deleted, stats.failed) == (10, 10, 0)
+    assert not test_fs.exists("/delete")
+
+
+def test_delete_failures(test_fs, monkeypatch):
+    given_tree(test_fs, "/delete-fail")
+
+    rm = test_fs._fs.rm
+
+    def failing_rm(paths):
+        if "/delete-fail/sub/file.txt" in paths:
+            raise PermissionError("Access denied")
+        rm(paths)
+
+    monkeypatch.setattr(test_fs._fs, "rm", failing_rm)
+
+    entries = deletion.expand(test_fs, "/delete-fail", recursive=True)
+    stats = deletion.delete(test_fs, entries, jobs=2, batch_size=1)
+
+    # the directories that are not empty can't be removed
+    assert (stats.total, stats.deleted, stats.failed) == (10, 7, 3)
+    assert stats.errors[0] == "Access denied"
+    assert test_fs.isfile("/delete-fail/sub/file.txt")
+    assert not test_fs.exists("/delete-fail/sub/deeper")
+
+
+def test_delete_glob_names(test_fs):
+    """Names with the glob special characters are not expanded as globs"""
+    for name in ["x[1].txt", "x1.txt", "y.txt", "z?.txt", "z1.txt"]:
+        test_fs.pipe_file(f"/delete-globs/{name}", b"foo")
+
+    entries = [
+        test_fs.info(f"/delete-globs/{name}")
+        for name in ["x[1].txt", "y.txt", "z?.txt"]
+    ]
+    stats = deletion.delete(test_fs, entries)
+
+    assert (stats.total, stats.deleted, stats.failed) == (3, 3, 0)
+    assert sorted(test_fs.ls("/delete-globs")) == [
+        "/delete-globs/x1.txt",
+        "/delete-globs/z1.txt",
+    ]
+
+
+def test_delete_streamed(test_fs, monkeypatch):
+    """Files are deleted as they are listed, and the directories that only
+    exist as the prefixes of the files are not removed"""
+    given_tree(test_fs, "/delete-streamed")
+    rmdir_calls = []
+    rmdir = test_fs._fs.rmdir
+    monkeypatch.setattr(
+        test_fs._fs, "rmdir", lambda path: rmdir_calls.append(path) or rmdir(path)
+    )
+
+    listed = []
+
+    def entries():
+        for entry in deletion.expand(test_fs, "/delete-streamed", recursive=True):
+            listed.append(entry["name"])
+            if entry["name"] == "/delete-streamed/sub":
+                entry = {**entry, file_system.SYNTHESIZED_KEY: True}
+            yield entry
+
+    progress = []
+    stats = deletion.delete(
+        test_fs,
+        entries(),
+        jobs=1,
+        batch_size=2,
+        on_progress=lambda stats: progress.append((stats.deleted, stats.total)),
+    )
+
+    assert (stats.total, stats.deleted, stats.failed, stats.batches) == (10, 10, 0, 4)
+    # the first batches are deleted before everything is listed
+    assert progress[0][1] < 10
+    assert "/delete-streamed/sub" not in rmdir_calls
+    assert not test_fs.exists("/delete-streamed/sub/file.txt")
@@ -1,9 +1,21 @@
 from datetime import datetime
 
+import fsspec
+import fsspec.asyn
 import pytest
 
+from unifs import file_system
+from unifs.cache import MetadataCache
 from unifs.exceptions import FatalError
-from unifs.file_system import FileSystemProxy, get_current, get_mtime
+from unifs.file_system import (
+    FileSystemProxy,
+    get_current,
+    get_mtime,
+    get_native,
+    iter_blocks,
+    iter_tree,
+    resolve,
+)
 
 
 def test_file_system_proxy(test_fs):
@@ -59,6 +71,243 @@ def test_file_system_proxy(test_fs):
     assert err.value is proxied_exception
 
 
+def test_file_system_proxy_try_info(test_fs):
+    assert test_fs.try_info("/text.txt")["size"] == 9
+    assert test_fs.try_info("/non-existing.txt") is None
+
+    test_fs._fs.set_raise_next(OSError("random OS error"))
+    with pytest.raises(FatalError) as err:
+        test_fs.try_info("/text.txt")
+    assert str(err.value) == "random OS error"
+
+
+def test_file_system_proxy_ls_or_info(test_fs, tmp_path):
+    entries = test_fs.ls_or_info("/dir")
+    assert [e["name"] for e in entries] == ["/dir/file-in-dir.txt"]
+    entries = test_fs.ls_or_info("/text.txt")
+    assert [(e["name"], e["size"]) for e in entries] == [("/text.txt", 9)]
+    with pytest.raises(FatalError):
+        test_fs.ls_or_info("/non-existing.txt")
+
+    # local file system can't list a file, and falls back to its details
+    (tmp_path / "file.txt").write_bytes(b"foo")
+    local = FileSystemProxy(fsspec.filesystem("file"))
+    entries = local.ls_or_info(str(tmp_path))
+    assert str(tmp_path / "file.txt") in [e["name"] for e in entries]
+    entries = local.ls_or_info(str(tmp_path / "file.txt"))
+    assert [(e["name"], e["size"]) for e in entries] == [
+        (str(tmp_path / "file.txt"), 3)
+    ]
+    with pytest.raises(FatalError):
+        local.ls_or_info(str(tmp_path / "non-existing.txt"))
+
+
+def test_file_system_proxy_iter_ls_or_info(test_fs, tmp_path, monkeypatch):
+    # lists all at once if there is no lazy lister for the file system
+    entries = test_fs.iter_ls_or_info("/dir")
+    assert [e["name"] for e in entries] == ["/dir/file-in-dir.txt"]
+
+    for i in range(5):
+        (tmp_path / f"{i}.txt").write_bytes(b"foo")
+    local = FileSystemProxy(fsspec.filesystem("file"))
+    listed = []
+    info = local._fs.info
+    monkeypatch.setattr(local._fs, "info", lambda p: listed.append(p) or info(p))
+
+    entries = local.iter_ls_or_info(str(tmp_path))
+    next(entries)
+    assert len(listed) == 1, "the content should be listed lazily"
+    entries.close()
+
+    entries = list(local.iter_ls_or_info(str(tmp_path / "0.txt")))
+    assert [(e["name"], e["size"]) for e in entries] == [(str(tmp_path / "0.txt"), 3)]
+
+    with pytest.raises(FatalError):
+        next(local.iter_ls_or_info(str(tmp_path / "non-existing.txt")))
+
+
+class FakeS3FileSystem(fsspec.AbstractFileSystem):
+    """Lists the keys of a single bucket as s3fs does, page by page"""
+
+    protocol = "s3"
+
+    def __init__(self, keys, **kwargs):
+        super().__init__(**kwargs)
+        self.keys = keys
+        self.loop = fsspec.asyn.get_loop()
+        self.listed = []
+        self.listed_dirs = []
+
+    def split_path(self, path):
+        bucket, _, key = path.partition("/")
+        return bucket, key, None
+
+    async def _iterdir(self, bucket, prefix="", delimiter="/"):
+        for key in self.keys:
+            nested = delimiter and delimiter in key.replace(prefix, "", 1)
+            if key.startswith(prefix) and not nested:
+                self.listed.append(key)
+                yield {"name": f"{bucket}/{key}", "size": 3, "type": "file"}
+
+    def ls(self, path, detail=True, **kwargs):
+        """Lists a "directory" with a delimiter, as s3fs does"""
+        bucket, key, _ = self.split_path(self._strip_protocol(path).rstrip("/"))
+        self.listed_dirs.append(key)
+        entries = {}
+        for child in self.keys:
+            if child.startswith(f"{key}/"):
+                name, nested, _ = child.replace(f"{key}/", "", 1).partition("/")
+                entry_type = "directory" if nested else "file"
+                entries[name] = {
+                    "name": f"{bucket}/{key}/{name}",
+                    "size": 0 if nested else 3,
+                    "type": entry_type,
+                }
+        if not entries:
+            raise FileNotFoundError(path)
+        return list(entries.values())
+
+
+def test_s3_lister(monkeypatch):
+    monkeypatch.setattr(file_system, "LISTING_PAGE_SIZE", 2)
+    keys = [f"dir/{i}.txt" for i in range(5)]
+    s3 = FileSystemProxy(FakeS3FileSystem(keys, skip_instance_cache=True))
+
+    entries = s3.iter_ls_or_info("s3://bucket/dir")
+    assert next(entries)["name"] == "bucket/dir/0.txt"
+    assert len(s3._fs.listed) == 2, "the content should be listed page by page"
+    entries.close()
+
+    entries = s3.iter_ls_or_info("bucket/dir/")
+    assert [e["name"] for e in entries] == [f"bucket/{key}" for key in keys]
+
+    with pytest.raises(FatalError):
+        next(s3.iter_ls_or_info("bucket/no-such-dir"))
+
+
+def test_iter_tree_prefix_listing(monkeypatch):
+    monkeypatch.setattr(file_system, "LISTING_PAGE_SIZE", 2)
+    keys = ["tree/3.txt", "tree/a/1.txt", "tree/a/4.txt", "tree/a/b/2.txt", "tree/c/"]
+    s3 = FileSystemProxy(FakeS3FileSystem(keys, skip_instance_cache=True))
+
+    entries = iter_tree(s3, "s3://bucket/tree")
+    assert next(entries)["name"] == "bucket/tree/3.txt"
+    assert len(s3._fs.listed) == 2, "the content should be listed page by page"
+    synthesized = file_system.SYNTHESIZED_KEY
+    assert [(e["name"], e["type"], e.get(synthesized, False)) for e in entries] == [
+        ("bucket/tree/a", "directory", True),
+        ("bucket/tree/a/1.txt", "file", False),
+        ("bucket/tree/a/4.txt", "file", False),
+        ("bucket/tree/a/b", "directory", True),
+        ("bucket/tree/a/b/2.txt", "file", False),
+        ("bucket/tree/c", "directory", False),  # a directory marker
+    ]
+
+    # with maxdepth, only the directories up to maxdepth are listed:
+    s3._fs.listed.clear()
+    entries = iter_tree(s3, "bucket/tree", maxdepth=1)
+    assert [e["name"] for e in entries] == [
+        "bucket/tree/3.txt",
+        "bucket/tree/a",
+        "bucket/tree/c",
+    ]
+    assert s3._fs.listed == [] and s3._fs.listed_dirs == ["tree"]
+    entries = iter_tree(s3, "bucket/tree", maxdepth=2)
+    assert sorted(e["name"] for e in entries)[:4] == [
+        "bucket/tree/3.txt",
+        "bucket/tree/a",
+        "bucket/tree/a/1.txt",
+        "bucket/tree/a/4.txt",
+    ]
+    assert sorted(s3._fs.listed_dirs) == ["tree", "tree", "tree/a", "tree/c"]
+    assert list(iter_tree(s3, "bucket/no-such-dir")) == []
+
+
+def test_iter_glob(test_fs, tmp_path):
+    for name in ["a.txt", "b.txt", "c.csv"]:
+        (tmp_path / name).write_bytes(b"foo")
+    local = get_native()
+
+    matches = file_system.iter_glob(local, f"{tmp_path}/*.txt")
+    assert sorted(e["name"] for e in matches) == [
+        str(tmp_path / "a.txt"),
+        str(tmp_path / "b.txt"),
+    ]
+    assert list(file_system.iter_glob(local, f"{tmp_path}/no-such-dir/*.txt")) == []
+
+    # globs that match the names in many directories are not listed lazily
+    assert file_system.iter_glob(local, f"{tmp_path}/*/*.txt") is None
+    assert file_system.iter_glob(test_fs, "/dir/*.txt") is None
+
+
+def test_file_system_proxy_cache(test_fs, tmp_path):
+    cache = MetadataCache(str(tmp_path / "cache.db"), ttl=60, max_entries=100)
+    proxy = FileSystemProxy(test_fs._fs, "memory", cache)
+    proxy.makedirs("/cached", exist_ok=True)
+    proxy.pipe_file("/cached/file.txt", b"foo")
+
+    assert proxy.info("/cached/file.txt")["size"] == 3
+    assert proxy.ls("/cached", detail=False) == ["/cached/file.txt"]
+    assert proxy.ls("/cached", False) == ["/cached/file.txt"]
+
+    # cached values are returned, even if the file system is modified directly:
+    test_fs.pipe_file("/cached/file.txt", b"foobar")
+    test_fs.pipe_file("/cached/another.txt", b"")
+    assert proxy.info("/cached/file.txt")["size"] == 3
+    assert proxy.try_info("/cached/file.txt")["size"] == 3
+    assert proxy.ls("/cached", detail=False) == ["/cached/file.txt"]
+
+    # .. unless refreshed (e.g., to read the content of a file):
+    assert proxy.info("/cached/file.txt", refresh=True)["size"] == 6
+    assert proxy.info("/cached/file.txt")["size"] == 6
+    test_fs.pipe_file("/cached/file.txt", b"foo")
+
+    # .. and the modifications through the proxy invalidate the cache:
+    proxy.pipe_file("/cached/file.txt", b"foobar")
+    assert proxy.info("/cached/file.txt")["size"] == 6
+    assert sorted(proxy.ls("/cached", detail=False)) == [
+        "/cached/another.txt",
+        "/cached/file.txt",
+    ]
+
+    proxy.rm("/cached/*.txt")
+    assert proxy.ls("/cached", detail=False) == []
+    assert proxy.try_info("/cached/file.txt") is None
+
+
+def test_iter_blocks(test_fs):
+    blocks = list(iter_blocks(test_fs, "/dir/file-in-dir.txt", block_size=5))
+    assert blocks == [b"file ", b"in a ", b"direc", b"tory"]
+
+    blocks = list(iter_blocks(test_fs, "/dir/file-in-dir.txt", 5, 12, block_size=5))
+    assert blocks == [b"in a ", b"di"]
+
+
+def test_iter_tree(test_fs, monkeypatch):
+    test_fs.pipe_file("/tree/a.txt", b"a")
+    test_fs.pipe_file("/tree/sub/b.txt", b"b")
+    test_fs.pipe_file("/tree/sub/deeper/c.txt", b"c")
+
+    def names(*args, **kwargs):
+        return sorted(e["name"] for e in iter_tree(test_fs, *args, **kwargs))
+
+    expected = [
+        "/tree/a.txt",
+        "/tree/sub",
+        "/tree/sub/b.txt",
+        "/tree/sub/deeper",
+        "/tree/sub/deeper/c.txt",
+    ]
+    assert names("/tree") == expected
+    assert names("/tree", jobs=1) == expected
+    assert names("/tree", maxdepth=2) == expected[:4]
+    assert names("/tree/a.txt") == ["/tree/a.txt"]
+
+    # file systems that list all the content of a path at once
+    monkeypatch.setattr(file_system, "FLAT_LISTING_PROTOCOLS", {"memory"})
+    assert names("/tree") == expected
+
+
 def test_get_current():
     fs = get_current()
     assert isinstance(fs, FileSystemProxy)
@@ -67,6 +316,20 @@ def test_get_current():
     assert fs is fs_same
 
 
+def test_resolve():
+    fs, path = resolve("/foo/bar")
+    assert fs is get_current() and path == "/foo/bar"
+
+    fs, path = resolve("memalt:/foo/bar")
+    assert fs._name == "memalt" and path == "/foo/bar"
+
+    fs, path = resolve("local:/foo/bar")
+    assert fs is get_native() and path == "/foo/bar"
+
+    fs, path = resolve("unknown:/foo/bar")
+    assert fs is get_current() and path == "unknown:/foo/bar"
+
+
 def test_get_mtime():
     now = datetime.now()
     assert get_mtime({}) is None
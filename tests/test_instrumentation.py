@@ -0,0 +1,79 @@
+import pytest
+
+from unifs import instrumentation
+from unifs.cache import MetadataCache
+from unifs.exceptions import FatalError
+from unifs.file_system import FileSystemProxy
+
+
+@pytest.fixture
+def call_stats():
+    stats = instrumentation.CallStats()
+    instrumentation.add_recorder(stats)
+    yield stats
+    instrumentation.remove_recorder(stats)
+
+
+def test_call_stats(test_fs, call_stats):
+    test_fs.pipe_file("/instrumented/file.txt", b"foo")
+    assert test_fs.cat_file("/instrumented/file.txt") == b"foo"
+    assert test_fs.cat_file("/instrumented/file.txt", start=1) == b"oo"
+    with pytest.raises(FatalError):
+        test_fs.info("/instrumented/nosuchfile.txt")
+
+    stats = call_stats.to_dict()
+    assert stats["pipe_file"]["calls"] == 1
+    assert stats["pipe_file"]["bytes_written"] == 3
+    assert stats["cat_file"]["calls"] == 2
+    assert stats["cat_file"]["bytes_read"] == 5
+    assert stats["cat_file"]["p50_ms"] <= stats["cat_file"]["max_ms"]
+    assert (stats["info"]["calls"], stats["info"]["errors"]) == (1, 1)
+    assert stats["info"]["bytes_read"] is None, "bytes are not counted for info"
+
+
+def test_call_stats_files(test_fs, call_stats, tmp_path):
+    with test_fs.open("/instrumented/opened.txt", "wb") as f:
+        f.write(b"foo")
+        f.write(b"bar")
+    with test_fs.open("/instrumented/opened.txt", "rb") as f:
+        assert f.read(2) == b"fo"
+        assert f.read() == b"obar"
+    test_fs.get_file("/instrumented/opened.txt", str(tmp_path / "local.txt"))
+    test_fs.put_file(str(tmp_path / "local.txt"), "/instrumented/put.txt")
+
+    stats = call_stats.to_dict()
+    assert stats["open"]["calls"] == 2
+    assert (stats["open"]["bytes_read"], stats["open"]["bytes_written"]) == (6, 6)
+    assert stats["get_file"]["bytes_read"] == 6
+    assert stats["put_file"]["bytes_written"] == 6
+
+
+def test_call_stats_cache_hits(test_fs, call_stats, tmp_path):
+    cache = MetadataCache(str(tmp_path / "cache.db"), ttl=60, max_entries=100)
+    proxy = FileSystemProxy(test_fs._fs, "memory", cache)
+    test_fs.pipe_file("/instrumented/cached.txt", b"foo")
+    for _ in range(3):
+        proxy.info("/instrumented/cached.txt")
+    proxy.info("/instrumented/cached.txt", refresh=True)
+
+    assert call_stats.to_dict()["info"]["calls"] == 2
+
+
+def test_instrumented_iter(call_stats):
+    items = instrumentation.instrumented_iter("ls", ["/dir"], lambda: iter([1, 2, 3]))
+    assert list(items) == [1, 2, 3]
+    assert call_stats.to_dict()["ls"]["calls"] == 1
+
+
+def test_not_instrumented_without_recorders():
+    def fn():
+        pass
+
+    assert instrumentation.instrumented(fn) is fn
+
+
+def test_percentile():
+    stats = instrumentation.MethodStats(durations=[0.4, 0.1, 0.3, 0.2])
+    assert stats.percentile(50) == 0.2
+    assert stats.percentile(95) == 0.4
+    assert stats.percentile(0) == 0.1
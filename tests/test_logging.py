@@ -1,4 +1,7 @@
-from unifs.logging import _log_exception
+import json
+
+from unifs.instrumentation import Call
+from unifs.logging import TraceWriter, _log_exception
 
 
 def test_log_exception(tmp_path):
@@ -15,3 +18,29 @@ def test_log_exception(tmp_path):
     assert "comment" in content
     assert "Exception" in content
     assert "test" in content
+
+
+def test_trace_writer(tmp_path):
+    trace_path = str(tmp_path / "trace.json")
+
+    trace = TraceWriter(trace_path)
+    trace(Call("cat_file", ["/a.txt"], 1, 10.0, 0.5, bytes_read=3))
+    trace(Call("info", ["/b.txt"], 2, 10.25, 0.001, error="FileNotFoundError"))
+    trace.close()
+
+    with open(trace_path) as f:
+        content = f.read()
+
+    # JSON array format, where the closing bracket may be missing
+    events = json.loads(content.rstrip(",\n") + "]")
+    assert events[0]["name"] == "cat_file"
+    assert (events[0]["ts"], events[0]["dur"]) == (10000000, 500000)
+    assert events[0]["args"] == {
+        "paths": ["/a.txt"],
+        "bytes_read": 3,
+        "bytes_written": 0,
+        "outcome": "ok",
+    }
+    assert events[1]["tid"] == 2
+    assert events[1]["args"]["outcome"] == "FileNotFoundError"
+    assert "bytes_read" not in events[1]["args"], "bytes are not counted for info"
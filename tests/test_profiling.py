@@ -0,0 +1,26 @@
+import pstats
+
+from unifs import profiling
+from unifs.instrumentation import Call
+
+
+def test_phase_without_profiling():
+    with profiling.phase("config load"):
+        pass
+    assert profiling.stop() == ""
+
+
+def test_profile(tmp_path):
+    output_path = str(tmp_path / "profile.pstats")
+
+    profile = profiling.start()
+    with profiling.phase("config load"):
+        sorted(range(1000))
+    profile(Call("ls", ["/"], 1, 0.0, 0.25))
+    profile(Call("info", ["/"], 2, 0.0, 0.25))
+    report = profiling.stop(output_path)
+
+    assert "config load: " in report
+    assert f"{profiling.BACKEND_PHASE}: 500.0ms" in report
+    assert "Ordered by: cumulative time" in report
+    assert pstats.Stats(output_path).total_calls > 0
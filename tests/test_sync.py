@@ -0,0 +1,137 @@
+import os
+from datetime import datetime
+
+from unifs import file_system, sync
+
+
+def test_merge():
+    src = iter([(("a",), "src-a"), (("b", "c"), "src-bc"), (("d",), "src-d")])
+    dst = iter([(("b", "c"), "dst-bc"), (("b.txt",), "dst-b.txt"), (("d",), "dst-d")])
+    assert list(sync.merge(src, dst)) == [
+        (("a",), "src-a", None),
+        (("b", "c"), "src-bc", "dst-bc"),
+        (("b.txt",), None, "dst-b.txt"),
+        (("d",), "src-d", "dst-d"),
+    ]
+
+
+def test_iter_sorted_files(test_fs):
+    for path in ["/sorted/b.txt", "/sorted/a/z.txt", "/sorted/a.txt", "/sorted/c/d/e"]:
+        test_fs.pipe_file(path, b"")
+    relpaths = [relpath for relpath, _ in sync.iter_sorted_files(test_fs, "/sorted", 2)]
+    assert relpaths == [("a", "z.txt"), ("a.txt",), ("b.txt",), ("c", "d", "e")]
+
+
+def test_iter_sorted_files_bounded(test_fs, monkeypatch):
+    for i in range(10):
+        test_fs.pipe_file(f"/sorted-many/dir{i}/sub/file.txt", b"")
+    prefetch = sync._Listings.prefetch
+    pending = []
+
+    def recording_prefetch(self, paths, start=0):
+        prefetch(self, paths, start)
+        pending.append(len(self._pending))
+
+    monkeypatch.setattr(sync._Listings, "prefetch", recording_prefetch)
+    relpaths = [
+        relpath for relpath, _ in sync.iter_sorted_files(test_fs, "/sorted-many", 1)
+    ]
+    assert relpaths == [(f"dir{i}", "sub", "file.txt") for i in range(10)]
+    assert max(pending) == 2
+
+
+def test_sync_tree(test_fs, tmp_path):
+    local = file_system.get_native()
+    test_fs.pipe_file("/sync-src/same.txt", b"same")
+    test_fs.pipe_file("/sync-src/changed.txt", b"changed")
+    test_fs.pipe_file("/sync-src/sub/new.txt", b"new")
+    os.makedirs(tmp_path / "dst" / "sub")
+    (tmp_path / "dst" / "same.txt").write_bytes(b"same")
+    (tmp_path / "dst" / "changed.txt").write_bytes(b"old")
+    (tmp_path / "dst" / "sub" / "extra.txt").write_bytes(b"extra")
+
+    # the destination files are newer than the source files (see conftest)
+    stats, deletion_stats = sync.sync_tree(
+        test_fs, "/sync-src", local, str(tmp_path / "dst"), jobs=2, delete=True
+    )
+    assert (stats.files, stats.bytes, stats.skipped) == (2, 10, 1)
+    assert deletion_stats.deleted == 1
+    assert (tmp_path / "dst" / "changed.txt").read_bytes() == b"changed"
+    assert (tmp_path / "dst" / "sub" / "new.txt").read_bytes() == b"new"
+    assert not (tmp_path / "dst" / "sub" / "extra.txt").exists()
+
+    # nothing to copy the second time
+    stats, deletion_stats = sync.sync_tree(
+        test_fs, "/sync-src", local, str(tmp_path / "dst"), jobs=2
+    )
+    assert (stats.files, stats.skipped) == (0, 3)
+    assert deletion_stats is None
+
+
+def test_sync_tree_newer_source(test_fs, tmp_path):
+    local = file_system.get_native()
+    os.makedirs(tmp_path / "src")
+    (tmp_path / "src" / "file.txt").write_bytes(b"new")
+    old = datetime(2020, 1, 1).timestamp()
+    test_fs.pipe_file("/sync-dst/file.txt", b"old")
+
+    # the source file is newer than the destination file (see conftest)
+    stats, _ = sync.sync_tree(local, str(tmp_path / "src"), test_fs, "/sync-dst", 2)
+    assert stats.files == 1
+    assert test_fs.cat("/sync-dst/file.txt") == b"new"
+
+    # .. but not if it is older
+    os.utime(tmp_path / "src" / "file.txt", (old, old))
+    test_fs.pipe_file("/sync-dst/file.txt", b"dst")
+    stats, _ = sync.sync_tree(local, str(tmp_path / "src"), test_fs, "/sync-dst", 2)
+    assert stats.files == 0
+
+
+def test_sync_tree_delete_glob_names(test_fs, tmp_path):
+    local = file_system.get_native()
+    os.makedirs(tmp_path / "src")
+    (tmp_path / "src" / "x1.txt").write_bytes(b"x1")
+    test_fs.pipe_file("/sync-globs/x1.txt", b"x1")
+    test_fs.pipe_file("/sync-globs/x[1].txt", b"stale")
+
+    _, deletion_stats = sync.sync_tree(
+        local, str(tmp_path / "src"), test_fs, "/sync-globs", jobs=2, delete=True
+    )
+    assert (deletion_stats.deleted, deletion_stats.failed) == (1, 0)
+    assert test_fs.cat("/sync-globs/x1.txt") == b"x1"
+    assert not test_fs.exists("/sync-globs/x[1].txt")
+
+
+def test_sync_tree_escaping_paths(test_fs, tmp_path):
+    local = file_system.get_native()
+    test_fs.pipe_file("/sync-escaping/file.txt", b"foo")
+    test_fs.pipe_file("/sync-escaping/../../escaped.txt", b"bar")
+    dst_dir = tmp_path / "sub" / "out"
+
+    stats, _ = sync.sync_tree(test_fs, "/sync-escaping", local, str(dst_dir), 2)
+    assert stats.files == 1
+    assert stats.rejected == ["/sync-escaping/../../escaped.txt"]
+    assert sorted(p.name for p in tmp_path.rglob("*.txt")) == ["file.txt"]
+
+
+def test_is_changed_checksums(test_fs):
+    old = datetime(2020, 1, 1).timestamp()
+    new = datetime(2021, 1, 1).timestamp()
+    src = {"name": "/a", "size": 3, "mtime": old}
+    dst = {"name": "/b", "size": 3, "mtime": new}
+    md5_a, md5_b = "a" * 32, "b" * 32
+
+    def is_changed(src_details, dst_details):
+        return sync.is_changed(
+            test_fs, {**src, **src_details}, test_fs, {**dst, **dst_details}
+        )
+
+    assert not is_changed({"ETag": f'"{md5_a}"'}, {"md5": md5_a})
+    assert is_changed({"ETag": f'"{md5_a}"'}, {"ETag": f'"{md5_b}"'})
+    # ETags of the files uploaded in different parts are not compared, and
+    # the destination is newer:
+    assert not is_changed({"ETag": f'"{md5_a}-2"'}, {"ETag": f'"{md5_b}-3"'})
+    assert not is_changed(
+        {"ETag": f'"{md5_a}"', "ServerSideEncryption": "aws:kms"},
+        {"ETag": f'"{md5_b}"'},
+    )
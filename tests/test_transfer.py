@@ -0,0 +1,379 @@
+import hashlib
+import os
+import sys
+from typing import Any, Dict
+
+import pytest
+from fsspec.implementations.memory import MemoryFile, MemoryFileSystem
+
+from unifs import checksum, file_system, transfer
+from unifs.checkpoint import Checkpoint, checkpoint_path
+from unifs.exceptions import FatalError
+from unifs.file_system import FileSystemProxy, iter_blocks
+
+
+def no_checkpoint():
+    return Checkpoint(None, "source", "destination", resume=False)
+
+
+def test_upload_tree_in_parts(test_fs, tmp_path):
+    os.makedirs(tmp_path / "toput")
+    with open(tmp_path / "toput" / "small.txt", "wb") as f:
+        f.write(b"foo")
+    with open(tmp_path / "toput" / "large.txt", "wb") as f:
+        f.write(b"0123456789" * 10)
+
+    stats = transfer.upload_tree(
+        test_fs, str(tmp_path / "toput"), "/parts", 2, 16, no_checkpoint()
+    )
+    assert stats.files == 2
+    assert stats.bytes == 103
+    assert test_fs.cat("/parts/small.txt") == b"foo"
+    assert test_fs.cat("/parts/large.txt") == b"0123456789" * 10
+
+
+def test_upload_file_concurrent_parts(test_fs, tmp_path, monkeypatch):
+    """File systems that upload the parts concurrently upload the file"""
+    local_path = str(tmp_path / "large.txt")
+    with open(local_path, "wb") as f:
+        f.write(b"0123456789" * 10)
+    calls = []
+    put_file = test_fs._fs.put_file
+
+    def concurrent_put_file(lpath, rpath, chunksize=None, max_concurrency=None):
+        calls.append((rpath, chunksize, max_concurrency))
+        put_file(lpath, rpath)
+
+    monkeypatch.setattr(test_fs._fs, "put_file", concurrent_put_file)
+    transfer.upload_file(test_fs, local_path, "/concurrent.txt", 16, no_checkpoint())
+    transfer.upload_file(
+        test_fs, local_path, "/concurrent.txt", 16, no_checkpoint(), jobs=4
+    )
+    transfer.upload_file(test_fs, local_path, "/small.txt", 1024, no_checkpoint())
+
+    assert calls == [
+        ("/concurrent.txt", 16, 1),
+        ("/concurrent.txt", 16, 4),
+        ("/small.txt", None, None),
+    ]
+    assert test_fs.cat("/concurrent.txt") == b"0123456789" * 10
+
+    # the parts are hashed ahead to verify the upload:
+    info_calls = with_md5(test_fs, monkeypatch, wrong_times=1)
+    stats = transfer.upload_file(
+        test_fs, local_path, "/verified.txt", 16, no_checkpoint(), True, 4
+    )
+    assert (stats.files, stats.unverified) == (1, 0)
+    assert info_calls == ["/verified.txt", "/verified.txt"]
+    assert calls[-1] == ("/verified.txt", 16, 4)
+
+
+def test_download_segmented(test_fs, tmp_path, monkeypatch):
+    monkeypatch.setattr(transfer, "MIN_SEGMENT_SIZE", 1000)
+    local_path = str(tmp_path / "bigfile.txt")
+
+    stats = transfer.download_segmented(
+        test_fs, "/special/bigfile.txt", local_path, 4, no_checkpoint()
+    )
+    assert stats.bytes == 10240
+    assert open(local_path, "rb").read() == b"foobarbazx" * 1024
+
+    # segments never get smaller than the minimal segment size:
+    monkeypatch.setattr(transfer, "MIN_SEGMENT_SIZE", 4000)
+    transfer.download_segmented(
+        test_fs, "/special/bigfile.txt", local_path, 10, no_checkpoint()
+    )
+    assert open(local_path, "rb").read() == b"foobarbazx" * 1024
+
+    transfer.download_segmented(
+        test_fs, "/special/file.bin", local_path, 4, no_checkpoint()
+    )
+    assert open(local_path, "rb").read() == b"\x03"
+
+
+def test_download_file_resume(test_fs, tmp_path, monkeypatch):
+    monkeypatch.setattr(transfer, "iter_blocks", fail_after_two_blocks)
+    local_path = str(tmp_path / "bigfile.txt")
+    manifest_path = checkpoint_path("src", local_path)
+
+    with pytest.raises(IOError):
+        with Checkpoint(manifest_path, "src", "dst", resume=False) as checkpoint:
+            transfer.download_file(
+                test_fs, "/special/bigfile.txt", local_path, checkpoint
+            )
+    assert os.path.getsize(local_path) == 2000
+    assert os.path.isfile(manifest_path)
+
+    # resumes from the last downloaded block:
+    read_offsets = []
+    monkeypatch.setattr(transfer, "iter_blocks", record_start(read_offsets))
+    with Checkpoint(manifest_path, "src", "dst", resume=True) as checkpoint:
+        stats = transfer.download_file(
+            test_fs, "/special/bigfile.txt", local_path, checkpoint
+        )
+    assert read_offsets == [2000]
+    assert stats.bytes == 10240
+    assert open(local_path, "rb").read() == b"foobarbazx" * 1024
+    assert not os.path.exists(manifest_path)
+
+
+def test_download_tree_resume(test_fs, tmp_path):
+    test_fs.pipe_file("/toresume/file1.txt", b"foo")
+    test_fs.pipe_file("/toresume/file2.txt", b"bar")
+    manifest_path = checkpoint_path("src", str(tmp_path))
+
+    with pytest.raises(KeyboardInterrupt):
+        with Checkpoint(manifest_path, "src", "dst", resume=False) as checkpoint:
+            transfer.download_tree(test_fs, "/toresume", str(tmp_path), 1, checkpoint)
+            raise KeyboardInterrupt()
+
+    # skips the files downloaded previously, unless they have changed:
+    test_fs.pipe_file("/toresume/file2.txt", b"barbaz")
+    with Checkpoint(manifest_path, "src", "dst", resume=True) as checkpoint:
+        stats = transfer.download_tree(
+            test_fs, "/toresume", str(tmp_path), 1, checkpoint
+        )
+    assert stats.files == 1
+    assert stats.skipped == 1
+    assert open(tmp_path / "file2.txt", "rb").read() == b"barbaz"
+
+
+def test_escapes_root():
+    assert not transfer.escapes_root("dir/file.txt")
+    assert not transfer.escapes_root("dir/../file.txt")
+    assert not transfer.escapes_root("./dir//file.txt")
+    assert transfer.escapes_root("../file.txt")
+    assert transfer.escapes_root("dir/../../file.txt")
+
+
+def test_download_tree_escaping_paths(test_fs, tmp_path):
+    """Keys with ".." are not downloaded outside the local directory"""
+    test_fs.pipe_file("/escaping/file.txt", b"foo")
+    test_fs.pipe_file("/escaping/../../escaped.txt", b"bar")
+    local_dir = tmp_path / "sub" / "out"
+
+    with Checkpoint(None, "src", "dst", resume=False) as checkpoint:
+        stats = transfer.download_tree(
+            test_fs, "/escaping", str(local_dir), 1, checkpoint
+        )
+    assert stats.files == 1
+    assert stats.rejected == ["/escaping/../../escaped.txt"]
+    assert "rejected 1 files" in stats.summary("Downloaded")
+    assert sorted(p.name for p in tmp_path.rglob("*.txt")) == ["file.txt"]
+
+
+def test_copy_tree_escaping_paths(test_fs, tmp_path):
+    local = file_system.get_native()
+    test_fs.pipe_file("/escaping-copy/file.txt", b"foo")
+    test_fs.pipe_file("/escaping-copy/../../escaped.txt", b"bar")
+    dst_dir = tmp_path / "sub" / "out"
+
+    stats = transfer.copy_tree(test_fs, "/escaping-copy", local, str(dst_dir), 1)
+    assert stats.files == 1
+    assert stats.rejected == ["/escaping-copy/../../escaped.txt"]
+    assert sorted(p.name for p in tmp_path.rglob("*.txt")) == ["file.txt"]
+
+
+def fail_after_two_blocks(fs, path, start=0, end=None):
+    yield from iter_blocks(fs, path, start, start + 2000, 1000)
+    raise IOError("connection lost")
+
+
+def record_start(read_offsets):
+    def recording_iter_blocks(fs, path, start=0, end=None):
+        read_offsets.append(start)
+        yield from iter_blocks(fs, path, start, end)
+
+    return recording_iter_blocks
+
+
+def with_md5(fs, monkeypatch, wrong_times=0):
+    """Make the file system report the MD5 of the files, wrong for the first
+    `wrong_times` calls"""
+    info = fs._fs.info
+    calls = []
+
+    def info_with_md5(path, **kwargs):
+        details = dict(info(path, **kwargs))
+        if details.get("type") == "file":
+            calls.append(path)
+            content = b"corrupted" if len(calls) <= wrong_times else fs._fs.cat(path)
+            details["md5"] = hashlib.md5(content).hexdigest()
+        return details
+
+    monkeypatch.setattr(fs._fs, "info", info_with_md5)
+    return calls
+
+
+def test_download_file_verify(test_fs, tmp_path, monkeypatch):
+    test_fs.pipe_file("/verify/file.txt", b"foo")
+    with_md5(test_fs, monkeypatch)
+    local_path = str(tmp_path / "file.txt")
+
+    # the first download is corrupted, and is retried:
+    read_offsets = []
+    corrupted = []
+
+    def corrupt_once(fs, path, start=0, end=None):
+        read_offsets.append(start)
+        if not corrupted:
+            corrupted.append(path)
+            yield b"bar"
+        else:
+            yield from iter_blocks(fs, path, start, end)
+
+    monkeypatch.setattr(transfer, "iter_blocks", corrupt_once)
+    stats = transfer.download_file(
+        test_fs, "/verify/file.txt", local_path, no_checkpoint(), verify=True
+    )
+    assert read_offsets == [0, 0]
+    assert stats.unverified == 0
+    assert open(local_path, "rb").read() == b"foo"
+
+    monkeypatch.setattr(transfer, "iter_blocks", lambda *args, **kwargs: [b"bar"])
+    with pytest.raises(FatalError, match="Checksum mismatch"):
+        transfer.download_file(
+            test_fs, "/verify/file.txt", local_path, no_checkpoint(), verify=True
+        )
+
+
+def test_download_tree_verify_without_checksums(test_fs, tmp_path):
+    test_fs.pipe_file("/verify-none/file.txt", b"foo")
+
+    stats = transfer.download_tree(
+        test_fs, "/verify-none", str(tmp_path), 1, no_checkpoint(), verify=True
+    )
+    assert (stats.files, stats.unverified) == (1, 1)
+    assert "1 files not verified" in stats.summary("Downloaded")
+
+
+def test_upload_tree_verify(test_fs, tmp_path, monkeypatch):
+    os.makedirs(tmp_path / "toverify")
+    with open(tmp_path / "toverify" / "file.txt", "wb") as f:
+        f.write(b"foo")
+
+    # the first upload doesn't match the checksum, and is retried:
+    info_calls = with_md5(test_fs, monkeypatch, wrong_times=1)
+    stats = transfer.upload_tree(
+        test_fs,
+        str(tmp_path / "toverify"),
+        "/verified",
+        1,
+        16,
+        no_checkpoint(),
+        verify=True,
+    )
+    assert info_calls == ["/verified/file.txt", "/verified/file.txt"]
+    assert (stats.files, stats.unverified) == (1, 0)
+    assert test_fs.cat("/verified/file.txt") == b"foo"
+
+    with_md5(test_fs, monkeypatch, wrong_times=transfer.VERIFY_ATTEMPTS)
+    with pytest.raises(FatalError, match="Checksum mismatch"):
+        transfer.upload_file(
+            test_fs,
+            str(tmp_path / "toverify" / "file.txt"),
+            "/verified/x",
+            16,
+            no_checkpoint(),
+            verify=True,
+        )
+
+
+def test_download_tree_verify_mismatch(test_fs, tmp_path, monkeypatch):
+    test_fs.pipe_file("/verify-mismatch/bad.txt", b"foo")
+    test_fs.pipe_file("/verify-mismatch/good.txt", b"bar")
+    ls = test_fs._fs.ls
+
+    def ls_with_md5(path, detail=True, **kwargs):
+        entries = [dict(entry) for entry in ls(path, detail=True, **kwargs)]
+        for entry in entries:
+            if entry["type"] == "file":
+                bad = "bad" in entry["name"]
+                content = b"corrupted" if bad else test_fs._fs.cat(entry["name"])
+                entry["md5"] = hashlib.md5(content).hexdigest()
+        return entries
+
+    monkeypatch.setattr(test_fs._fs, "ls", ls_with_md5)
+
+    # the other files are downloaded:
+    stats = transfer.download_tree(
+        test_fs, "/verify-mismatch", str(tmp_path), 2, no_checkpoint(), verify=True
+    )
+    assert stats.failed == ["/verify-mismatch/bad.txt"]
+    assert stats.files == 1
+    assert open(tmp_path / "good.txt", "rb").read() == b"bar"
+    assert "1 files failed the verification" in stats.summary("Downloaded")
+
+
+def test_download_file_verify_unavailable_algorithm(test_fs, tmp_path, monkeypatch):
+    test_fs.pipe_file("/verify-crc32c/file.txt", b"foo")
+    monkeypatch.setitem(sys.modules, "google_crc32c", None)  # not installed
+    info = test_fs._fs.info
+    monkeypatch.setattr(
+        test_fs._fs, "info", lambda path, **kw: {**info(path, **kw), "crc32c": "AA=="}
+    )
+
+    stats = transfer.download_file(
+        test_fs,
+        "/verify-crc32c/file.txt",
+        str(tmp_path / "file.txt"),
+        no_checkpoint(),
+        verify=True,
+    )
+    assert (stats.files, stats.unverified) == (1, 1)
+
+
+def test_upload_file_verify_multipart(test_fs, tmp_path, monkeypatch):
+    local_path = str(tmp_path / "multipart.txt")
+    with open(local_path, "wb") as f:
+        f.write(b"0123456789" * 4)  # 3 parts of 16 bytes
+    info = test_fs._fs.info
+
+    def info_with_etag(path, **kwargs):
+        content = test_fs._fs.cat(path)
+        parts = [content[start:][:16] for start in range(0, len(content), 16)]
+        etag = checksum.multipart_etag([hashlib.md5(p).digest() for p in parts])
+        return {**info(path, **kwargs), "ETag": f'"{etag}"'}
+
+    monkeypatch.setattr(test_fs._fs, "info", info_with_etag)
+    stats = transfer.upload_file(
+        test_fs, local_path, "/verify-multipart.txt", 16, no_checkpoint(), True
+    )
+    assert (stats.files, stats.unverified) == (1, 0)
+
+    # parts of a different size can't be verified:
+    stats = transfer.upload_file(
+        test_fs, local_path, "/verify-multipart.txt", 32, no_checkpoint(), True
+    )
+    assert (stats.files, stats.unverified) == (1, 1)
+
+
+class SeparateMemoryFileSystem(MemoryFileSystem):
+    """An in-memory file system that doesn't share its files with the
+    MemoryFileSystem of the tests, and that only commits the files written
+    without autocommit when they are committed, as the remote file systems
+    do"""
+
+    store: Dict[str, Any] = {}
+    pseudo_dirs = [""]
+
+    def _open(self, path, mode="rb", autocommit=True, **kwargs):
+        if mode == "wb" and not autocommit:
+            return MemoryFile(self, self._strip_protocol(path))
+        return super()._open(path, mode, autocommit=autocommit, **kwargs)
+
+
+def test_copy_file_streamed(test_fs, monkeypatch):
+    monkeypatch.setattr(transfer, "iter_blocks", fail_after_two_blocks)
+    other_fs = FileSystemProxy(SeparateMemoryFileSystem(skip_instance_cache=True))
+
+    # a failed copy doesn't leave a truncated file:
+    with pytest.raises(IOError):
+        transfer.copy_file(test_fs, "/special/bigfile.txt", other_fs, "/big.txt")
+    assert not other_fs.exists("/big.txt")
+    assert not test_fs.exists("/big.txt")
+
+    monkeypatch.setattr(transfer, "iter_blocks", iter_blocks)
+    transfer.copy_file(test_fs, "/special/bigfile.txt", other_fs, "/big.txt", 10240)
+    assert other_fs.cat("/big.txt") == b"foobarbazx" * 1024
+    assert not test_fs.exists("/big.txt")
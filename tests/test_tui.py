@@ -58,3 +58,13 @@ def test_errorhandler():
     with open(_log_file_path(), "r") as log_file:
         log_content = log_file.read()
         assert "expect the unexpected" in log_content
+
+    @click.command()
+    @errorhandler
+    def raises_broken_pipe_error():
+        raise BrokenPipeError()
+
+    runner = CliRunner()
+    result = runner.invoke(raises_broken_pipe_error)
+    assert result.exit_code == 1
+    assert result.output == ""
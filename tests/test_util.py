@@ -1,3 +1,4 @@
+import time
 from datetime import datetime
 
 import pytest
@@ -7,6 +8,8 @@ from unifs.util import (
     get_first_match,
     humanize_bytes,
     is_binary_string,
+    parallel_map,
+    read_ahead,
 )
 
 
@@ -44,3 +47,49 @@ def test_dtfromisoformat():
     assert dtfromisoformat("2023-01-14 19:25:00Z") == datetime(2023, 1, 14, 19, 25, 0)
     with pytest.raises(ValueError):
         assert dtfromisoformat("broken")
+
+
+def test_parallel_map():
+    assert list(parallel_map(lambda x: x * 2, range(100), 4)) == list(range(0, 200, 2))
+    assert list(parallel_map(lambda x: x, [], 4)) == []
+
+    # consumes items lazily:
+    results = parallel_map(lambda x: x, iter(range(10**12)), 2)
+    assert [next(results) for _ in range(3)] == [0, 1, 2]
+    results.close()
+
+    def fail_on_3(x):
+        if x == 3:
+            raise ValueError("three")
+        return x
+
+    with pytest.raises(ValueError):
+        list(parallel_map(fail_on_3, range(10), 2))
+
+
+def test_read_ahead():
+    assert list(read_ahead(range(100), 3)) == list(range(100))
+    assert list(read_ahead([], 3)) == []
+
+    # reads at most the given number of items ahead:
+    consumed = []
+
+    def items():
+        for i in range(100):
+            consumed.append(i)
+            yield i
+
+    results = read_ahead(items(), 3)
+    assert next(results) == 0
+    time.sleep(0.1)
+    assert len(consumed) <= 5
+    results.close()
+
+    def fail_on_3():
+        yield from range(3)
+        raise ValueError("three")
+
+    results = read_ahead(fail_on_3(), 2)
+    assert [next(results) for _ in range(3)] == [0, 1, 2]
+    with pytest.raises(ValueError):
+        next(results)